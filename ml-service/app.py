@@ -1,26 +1,69 @@
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Union, Optional, List
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from service.recommender import get_recommendations, add_feedback_to_buffer
-from service import recommender
+from service.recommender import get_recommendations, get_recommendations_batch, add_feedback_to_buffer
+from service import metrics, recommender
+from service.geo_index import driver_geo_index, parse_coords
+from service.driver_registry import driver_registry, driver_key
+from service.request_log import request_context
 
 load_dotenv()
 
 app = FastAPI(title="Driver Recommendation Service")
 
 
+# Id de corrélation : repris du header X-Request-ID (Express) ou généré, renvoyé
+# dans la réponse ; toutes les lignes de log de la requête le portent.
+@app.middleware("http")
+async def correlation_id(request: Request, call_next):
+    with request_context(request.headers.get("X-Request-ID")) as request_id:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 class RecommendationRequest(BaseModel):
     passenger_id:       Union[int, str]
     preferences:        Dict[str, Any]       = {}
     trajet:             Dict[str, Any]        = {}
-    drivers:            List[Dict[str, Any]]  = []
+    # Ancien contrat : toute la flotte dans le body. Sinon le registre est utilisé,
+    # restreint à driver_ids si fourni.
+    drivers:            Optional[List[Dict[str, Any]]]  = None
+    driver_ids:         Optional[List[Union[int, str]]] = None
     interaction_counts: Dict[str, int]        = {}
     top_n:              int                   = 5
 
 
+class BatchPassenger(BaseModel):
+    passenger_id:       Union[int, str]
+    preferences:        Dict[str, Any] = {}
+    interaction_counts: Dict[str, int] = {}
+    top_n:              int            = 5
+
+
+# Plusieurs passagers en attente contre la même flotte et le même trajet
+class BatchRecommendationRequest(BaseModel):
+    passengers: List[BatchPassenger]
+    trajet:     Dict[str, Any]                  = {}
+    drivers:    Optional[List[Dict[str, Any]]]  = None
+    driver_ids: Optional[List[Union[int, str]]] = None
+
+
+class DriverSyncRequest(BaseModel):
+    drivers: List[Dict[str, Any]]
+    replace: bool = True          # True : les drivers absents du lot sont retirés
+
+
+class DriverDeltaRequest(BaseModel):
+    upsert: List[Dict[str, Any]]  = []
+    remove: List[Union[int, str]] = []
+
+
 # [FIX] Nouveau format : { rating, scores } au lieu de { rideId, driverId, rating }.
 # L'ancien format cherchait un fichier log intermédiaire qui n'existe plus.
 # Les scores arrivent directement depuis Express (lus en DB dans feedbackController).
@@ -29,6 +72,12 @@ class FeedbackRequest(BaseModel):
     scores: Dict[str, float]     # { lightfm, pref, dist, work, rating }
 
 
+# Position live d'un driver → index géo persistant (pas de rebuild par requête)
+class DriverLocationRequest(BaseModel):
+    latitude:  float
+    longitude: float
+
+
 @app.post("/recommend")
 async def recommend(data: RecommendationRequest):
     passenger_id    = f"P{data.passenger_id}"
@@ -39,11 +88,38 @@ async def recommend(data: RecommendationRequest):
         drivers            = data.drivers,
         interaction_counts = data.interaction_counts,
         top_n              = data.top_n,
+        driver_ids         = data.driver_ids,
+    )
+    return {
+        "success":          True,
+        "count":            len(recommendations),
+        "search_radius_km": getattr(recommendations, "search_radius_km", None),
+        "recommendations":  recommendations,
+    }
+
+
+@app.post("/recommend/batch")
+async def recommend_batch(data: BatchRecommendationRequest):
+    if not data.passengers:
+        raise HTTPException(status_code=422, detail="passengers vide")
+    results = await get_recommendations_batch(
+        passengers = [p.dict() for p in data.passengers],
+        trajet     = data.trajet,
+        drivers    = data.drivers,
+        driver_ids = data.driver_ids,
     )
     return {
-        "success":         True,
-        "count":           len(recommendations),
-        "recommendations": recommendations,
+        "success": True,
+        "count":   len(results),
+        "results": [
+            {
+                "passenger_id":     p.passenger_id,
+                "count":            len(recs),
+                "search_radius_km": getattr(recs, "search_radius_km", None),
+                "recommendations":  recs,
+            }
+            for p, recs in zip(data.passengers, results)
+        ],
     }
 
 
@@ -63,7 +139,8 @@ async def feedback(data: FeedbackRequest):
 
     # [FIX] add_feedback_to_buffer attend (scores, real_rating) — signature correcte.
     # L'ancienne version appelait (ride_id, driver_id, rating) ce qui crashait silencieusement.
-    add_feedback_to_buffer(
+    await asyncio.to_thread(
+        add_feedback_to_buffer,
         scores      = data.scores,
         real_rating = data.rating,
     )
@@ -75,15 +152,91 @@ async def feedback(data: FeedbackRequest):
     }
 
 
+@app.get("/weights")
+async def weights():
+    """Poids actifs + état du worker d'optimisation (runs, feedbacks en attente)."""
+    return recommender.weights_status()
+
+
+@app.post("/drivers/sync")
+async def sync_drivers(data: DriverSyncRequest):
+    """Bulk : charge (ou remplace) la flotte du registre. Chaque driver doit avoir un 'id'."""
+    if any("id" not in d for d in data.drivers):
+        raise HTTPException(status_code=422, detail="chaque driver doit avoir un id")
+    synced = driver_registry.sync(data.drivers, replace=data.replace)
+    return {"success": True, "synced": synced, "total": len(driver_registry)}
+
+
+@app.post("/drivers/delta")
+async def drivers_delta(data: DriverDeltaRequest):
+    """Deltas : drivers créés / modifiés (upsert) et supprimés / dé-vérifiés (remove)."""
+    if any("id" not in d for d in data.upsert):
+        raise HTTPException(status_code=422, detail="chaque driver doit avoir un id")
+    for driver in data.upsert:
+        driver_registry.upsert(driver)
+    removed = sum(driver_registry.remove(i) for i in data.remove)
+    return {
+        "success":  True,
+        "upserted": len(data.upsert),
+        "removed":  removed,
+        "total":    len(driver_registry),
+    }
+
+
+@app.put("/drivers/{driver_id}/location")
+async def upsert_driver_location(driver_id: str, data: DriverLocationRequest):
+    if parse_coords(data.latitude, data.longitude) is None:
+        raise HTTPException(status_code=422, detail="latitude/longitude invalides")
+    key = driver_key(driver_id)
+    # Driver pas (encore) synchronisé : position gardée en attente par le registre
+    known = driver_registry.update_location(key, data.latitude, data.longitude)
+    return {"success": True, "driver_id": key, "pending": not known, "indexed": len(driver_geo_index)}
+
+
+@app.delete("/drivers/{driver_id}/location")
+async def remove_driver_location(driver_id: str):
+    key     = driver_key(driver_id)
+    removed = driver_registry.has_position(key)
+    driver_registry.update_location(key, None, None)
+    return {"success": True, "driver_id": key, "removed": removed}
+
+
+# RECO_LAZY_INIT=1 : le modèle se charge en arrière-plan, le port écoute tout de suite
+@app.on_event("startup")
+async def warm_up_model():
+    recommender.recommender.start()
+
+
+# Liveness : le process répond, même pendant le chargement du modèle
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 
+# Readiness : 503 tant qu'aucun snapshot validé n'est en service
+@app.get("/ready")
+async def ready():
+    status = recommender.recommender.status()
+    if not recommender.recommender.is_ready():
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+# Format d'exposition Prometheus (histogrammes par étape, compteurs cold-start / replis)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/reload-model")
 async def reload_model():
-    recommender.recommender.reload()
-    return {"status": "ok"}
+    """Chargement en arrière-plan : répond tout de suite avec la version en cours de chargement."""
+    return recommender.recommender.reload()
+
+
+@app.get("/model-version")
+async def model_version():
+    return recommender.recommender.status()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Dict, Optional, Any, List
-from service.recommender import get_recommendations, add_feedback_to_buffer
+from service.recommender import get_recommendations, get_recommendations_batch, add_feedback_to_buffer, weights_status
+from service.geo_index import parse_coords
+from service.driver_registry import driver_registry, driver_key
+from service import metrics
+from service.request_log import get_logger, request_context
+
+logger = get_logger("routes.recommendation")
 
 router = APIRouter()
 
@@ -21,29 +29,126 @@ class RecommendPayload(BaseModel):
     passenger_id:       str
     preferences:        Dict[str, Any]       = {}
     trajet:             TrajetPayload        = TrajetPayload()
-    drivers:            List[Dict[str, Any]] = []
+    drivers:            Optional[List[Dict[str, Any]]] = None   # ancien contrat
+    driver_ids:         Optional[List[str]]            = None   # sinon : registre
     interaction_counts: Dict[str, int]       = {}
     top_n:              int                  = 10
 
 
+class BatchPassengerPayload(BaseModel):
+    passenger_id:       str
+    preferences:        Dict[str, Any] = {}
+    interaction_counts: Dict[str, int] = {}
+    top_n:              int            = 10
+
+
+class BatchRecommendPayload(BaseModel):
+    passengers: List[BatchPassengerPayload]
+    trajet:     TrajetPayload                  = TrajetPayload()
+    drivers:    Optional[List[Dict[str, Any]]] = None
+    driver_ids: Optional[List[str]]            = None
+
+
 @router.post("/recommend")
-async def recommend(payload: RecommendPayload):
-    print(f"🐍 [/recommend] passenger={payload.passenger_id} | "
-          f"drivers={len(payload.drivers)} | top_n={payload.top_n}")
-    trajet_dict = payload.trajet.dict()
-    try:
-        drivers = await get_recommendations(
-            passenger_id       = payload.passenger_id,
-            preferences        = payload.preferences,
-            trajet             = trajet_dict,
-            drivers            = payload.drivers,
-            interaction_counts = payload.interaction_counts,
-            top_n              = payload.top_n,
+async def recommend(payload: RecommendPayload, request: Request):
+    with request_context(request.headers.get("X-Request-ID")):
+        n_drivers = len(payload.drivers) if payload.drivers else f"registre({len(driver_registry)})"
+        logger.info(
+            "/recommend passenger=%s | drivers=%s | top_n=%d", payload.passenger_id, n_drivers, payload.top_n,
         )
-        return {"recommendations": drivers}
-    except Exception as e:
-        print(f"❌ [/recommend] Exception: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        trajet_dict = payload.trajet.dict()
+        try:
+            drivers = await get_recommendations(
+                passenger_id       = payload.passenger_id,
+                preferences        = payload.preferences,
+                trajet             = trajet_dict,
+                drivers            = payload.drivers,
+                interaction_counts = payload.interaction_counts,
+                top_n              = payload.top_n,
+                driver_ids         = payload.driver_ids,
+            )
+            return {
+                "recommendations":  drivers,
+                "search_radius_km": getattr(drivers, "search_radius_km", None),
+            }
+        except Exception as e:
+            logger.exception("/recommend: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/recommend/batch")
+async def recommend_batch(payload: BatchRecommendPayload, request: Request):
+    with request_context(request.headers.get("X-Request-ID")):
+        logger.info("/recommend/batch passagers=%d", len(payload.passengers))
+        try:
+            results = await get_recommendations_batch(
+                passengers = [p.dict() for p in payload.passengers],
+                trajet     = payload.trajet.dict(),
+                drivers    = payload.drivers,
+                driver_ids = payload.driver_ids,
+            )
+            return {"results": [
+                {
+                    "passenger_id":     p.passenger_id,
+                    "recommendations":  recs,
+                    "search_radius_km": getattr(recs, "search_radius_km", None),
+                }
+                for p, recs in zip(payload.passengers, results)
+            ]}
+        except Exception as e:
+            logger.exception("/recommend/batch: %s", e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── REGISTRE DRIVERS ──────────────────────────────────────────────────────────
+class DriverSyncPayload(BaseModel):
+    drivers: List[Dict[str, Any]]
+    replace: bool = True
+
+
+class DriverDeltaPayload(BaseModel):
+    upsert: List[Dict[str, Any]] = []
+    remove: List[str]            = []
+
+
+class DriverLocationPayload(BaseModel):
+    latitude:  float
+    longitude: float
+
+
+@router.post("/drivers/sync")
+async def sync_drivers(payload: DriverSyncPayload):
+    if any("id" not in d for d in payload.drivers):
+        raise HTTPException(status_code=422, detail="chaque driver doit avoir un id")
+    synced = driver_registry.sync(payload.drivers, replace=payload.replace)
+    return {"status": "ok", "synced": synced, "total": len(driver_registry)}
+
+
+@router.post("/drivers/delta")
+async def drivers_delta(payload: DriverDeltaPayload):
+    if any("id" not in d for d in payload.upsert):
+        raise HTTPException(status_code=422, detail="chaque driver doit avoir un id")
+    for driver in payload.upsert:
+        driver_registry.upsert(driver)
+    removed = sum(driver_registry.remove(i) for i in payload.remove)
+    return {"status": "ok", "removed": removed, "total": len(driver_registry)}
+
+
+@router.put("/drivers/{driver_id}/location")
+async def upsert_driver_location(driver_id: str, payload: DriverLocationPayload):
+    if parse_coords(payload.latitude, payload.longitude) is None:
+        raise HTTPException(status_code=422, detail="latitude/longitude invalides")
+    key = driver_key(driver_id)
+    known = driver_registry.update_location(key, payload.latitude, payload.longitude)
+    return {"status": "ok", "driver_id": key, "pending": not known}
+
+
+@router.delete("/drivers/{driver_id}/location")
+async def remove_driver_location(driver_id: str):
+    key     = driver_key(driver_id)
+    removed = driver_registry.has_position(key)
+    driver_registry.update_location(key, None, None)
+    return {"status": "ok", "removed": removed}
 
 
 # ── FEEDBACK DIRECT ───────────────────────────────────────────────────────────
@@ -56,9 +161,10 @@ class FeedbackPayload(BaseModel):
 
 @router.post("/feedback")
 async def feedback(payload: FeedbackPayload):
-    print(f"📩 [/feedback] note={payload.rating} | scores={payload.scores}")
+    logger.info("/feedback note=%s", payload.rating, extra={"scores": payload.scores})
     try:
-        add_feedback_to_buffer(
+        await asyncio.to_thread(
+            add_feedback_to_buffer,
             scores      = payload.scores,
             real_rating = payload.rating,
         )
@@ -67,10 +173,32 @@ async def feedback(payload: FeedbackPayload):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/weights")
+async def weights():
+    return weights_status()
+
+
 # ── RELOAD MODÈLE ─────────────────────────────────────────────────────────────
 from service.recommender import recommender
 
 @router.post("/reload-model")
 async def reload_model():
-    recommender.reload()
-    return {"status": "ok"}
\ No newline at end of file
+    return recommender.reload()
+
+
+@router.get("/model-version")
+async def model_version():
+    return recommender.status()
+
+
+@router.get("/ready")
+async def ready():
+    status = recommender.status()
+    if not recommender.is_ready():
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+BENCHMARK - RETRIEVAL ANN (IVF) VS EXACT : RAPPEL / LATENCE
+============================================================================
+Représentations drivers synthétiques à l'échelle d'une flotte nationale
+(mêmes dimensions que le modèle : 64 composantes + biais, regroupées en
+profils), requêtes = embeddings passager composés.
+Pour chaque nprobe : latence p50 (recherche IVF + rescoring exact de la liste
+courte + top-k, comme retrieval_top_k) et rappel@k contre le top-k exact.
+Deux cas : toute la flotte (repli all_drivers) et une restriction géo
+(fraction --allowed des drivers).
+
+    cd ml-service
+    python scripts/bench_ann.py --drivers 100000 --queries 200 --k 20 --nprobe 1 4 8 16 32
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le dossier ml-service au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.ann_index import IVFIndex
+from service.topk import top_k_indices
+
+
+def make_representations(n: int, dim: int, profiles: int, rng: np.random.Generator):
+    """Drivers groupés autour de `profiles` profils (attributs partagés), biais faibles."""
+    centers = rng.normal(0, 1, (profiles, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, profiles, n)] + rng.normal(0, 0.5, (n, dim)).astype(np.float32)
+    biases  = rng.normal(0, 0.3, n).astype(np.float32)
+    return np.ascontiguousarray(vectors * 0.1), biases, centers
+
+
+def make_queries(count: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    picks = centers[rng.integers(0, len(centers), count)]
+    return ((picks + rng.normal(0, 0.5, picks.shape)) * 0.1).astype(np.float32)
+
+
+def exact_top_k(vectors, biases, query, k, candidates):
+    scores = biases[candidates] + vectors[candidates] @ query
+    return candidates[top_k_indices(scores, k)]
+
+
+def ann_top_k(index, vectors, biases, query, k, nprobe, allowed):
+    shortlist = np.sort(index.search(query, nprobe, allowed, min_results=k))
+    scores    = biases[shortlist] + vectors[shortlist] @ query
+    return shortlist[top_k_indices(scores, k)], len(shortlist)
+
+
+def run_case(label, index, vectors, biases, queries, k, nprobes, candidates, allowed):
+    exact_ms, truths = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        truths.append(set(exact_top_k(vectors, biases, query, k, candidates).tolist()))
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+
+    print(f"\n{label} : {len(candidates)} candidats")
+    print(f"{'méthode':<14} {'p50 (ms)':>9} {'rappel@k':>9} {'liste courte':>13}")
+    print(f"{'exact':<14} {statistics.median(exact_ms):9.3f} {1.0:9.3f} {len(candidates):13d}")
+    for nprobe in nprobes:
+        latencies, recalls, sizes = [], [], []
+        for query, truth in zip(queries, truths):
+            t0 = time.perf_counter()
+            found, size = ann_top_k(index, vectors, biases, query, k, nprobe, allowed)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(len(truth & set(found.tolist())) / len(truth))
+            sizes.append(size)
+        print(f"{'ivf nprobe=' + str(nprobe):<14} {statistics.median(latencies):9.3f} "
+              f"{statistics.mean(recalls):9.3f} {int(statistics.median(sizes)):13d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel / latence du retrieval IVF contre le calcul exact")
+    parser.add_argument("--drivers",  type=int, default=100000)
+    parser.add_argument("--dim",      type=int, default=64)
+    parser.add_argument("--profiles", type=int, default=200, help="profils d'attributs drivers")
+    parser.add_argument("--queries",  type=int, default=200)
+    parser.add_argument("--k",        type=int, default=20)
+    parser.add_argument("--nprobe",   type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--allowed",  type=float, default=0.2, help="fraction de drivers dans la zone géo")
+    parser.add_argument("--seed",     type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors, biases, centers = make_representations(args.drivers, args.dim, args.profiles, rng)
+    queries = make_queries(args.queries, centers, rng)
+
+    t0    = time.perf_counter()
+    index = IVFIndex(vectors, biases, seed=args.seed)
+    print(f"{args.drivers} drivers x {args.dim} | index : {index.nlist} cellules, "
+          f"construit en {(time.perf_counter() - t0) * 1000:.0f} ms | k={args.k}")
+
+    everyone = np.arange(args.drivers)
+    run_case("Flotte entière", index, vectors, biases, queries, args.k, args.nprobe, everyone, None)
+
+    allowed = rng.random(args.drivers) < args.allowed
+    run_case(f"Restriction géo ({args.allowed:.0%})", index, vectors, biases, queries, args.k,
+             args.nprobe, np.flatnonzero(allowed), allowed)
+
+
+if __name__ == "__main__":
+    main()
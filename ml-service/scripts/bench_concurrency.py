@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+BENCHMARK - CONCURRENCE /recommend
+============================================================================
+Lance des get_recommendations concurrents (comme le ferait uvicorn) et mesure
+le débit pour chaque mode d'executor et chaque taille de pool.
+
+    cd ml-service
+    python scripts/bench_concurrency.py --drivers 2000 --requests 200 --workers 1 2 4 8
+"""
+
+import sys
+import os
+import io
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+from pathlib import Path
+
+# Ajouter le dossier ml-service au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service import executor
+from service.recommender import get_recommendations, recommender
+
+CENTER_LAT, CENTER_LNG = 36.7538, 3.0588   # Alger
+
+
+def make_fleet(n: int, seed: int = 42):
+    """Flotte synthétique : ids du modèle d'abord, puis drivers inconnus."""
+    rng   = random.Random(seed)
+    known = [int(k.lstrip("D")) for k in recommender.item_id_map]
+    ids   = known + list(range(100000, 100000 + max(0, n - len(known))))
+    fleet = []
+    for driver_id in ids[:n]:
+        fleet.append({
+            "id": driver_id, "nom": "Bench", "prenom": f"D{driver_id}",
+            "sexe": rng.choice(["M", "F"]), "avgRating": round(rng.uniform(3, 5), 1),
+            "latitude":  CENTER_LAT + rng.uniform(-0.5, 0.5),
+            "longitude": CENTER_LNG + rng.uniform(-0.5, 0.5),
+            **{k: rng.random() < 0.5 for k in (
+                "talkative", "radio_on", "smoking_allowed", "pets_allowed", "car_big",
+                "works_morning", "works_afternoon", "works_evening", "works_night",
+            )},
+        })
+    return fleet
+
+
+def make_request(fleet, rng):
+    passenger = rng.choice(list(recommender.user_id_map))
+    prefs     = {k: rng.choice(["yes", "no", None]) for k in recommender.PREF_COLS}
+    return dict(
+        passenger_id = passenger,
+        preferences  = {k: v for k, v in prefs.items() if v},
+        trajet       = {"startLat": CENTER_LAT, "startLng": CENTER_LNG,
+                        "distanceKm": 40, "heureDepart": "08:00"},
+        drivers      = [dict(d) for d in fleet],
+        top_n        = 10,
+    )
+
+
+async def run_batch(requests, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(req):
+        async with sem:
+            await get_recommendations(**req)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(r) for r in requests))
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit /recommend selon l'executor")
+    parser.add_argument("--drivers",     type=int, default=1000)
+    parser.add_argument("--requests",    type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers",     type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes",       nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    fleet    = make_fleet(args.drivers)
+    rng      = random.Random(0)
+    requests = [make_request(fleet, rng) for _ in range(args.requests)]
+
+    print("=" * 70)
+    print(f"  BENCHMARK CONCURRENCE — {args.drivers} drivers, {args.requests} requêtes, "
+          f"concurrence {args.concurrency}, {os.cpu_count()} CPU")
+    print("=" * 70)
+    print(f"  {'mode':8s} {'workers':>7s} {'total (s)':>10s} {'req/s':>8s} {'speed-up':>9s}")
+
+    baseline = None
+    for mode in args.modes:
+        for workers in ([1] if mode == "inline" else args.workers):
+            executor.configure_executor(mode, workers)
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(run_batch(requests[:workers], workers))        # warm-up (fork / threads)
+                elapsed = asyncio.run(run_batch(requests, args.concurrency))
+            rps      = args.requests / elapsed
+            baseline = baseline or rps
+            print(f"  {mode:8s} {workers:7d} {elapsed:10.2f} {rps:8.1f} {rps / baseline:8.2f}x")
+    executor.shutdown_executor(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+BENCHMARK - COÛT DES LOGS SUR LA LATENCE /recommend
+============================================================================
+Mêmes requêtes (flotte synthétique de bench_concurrency.py), executor inline,
+pour plusieurs configurations de request_log :
+  - sync debug+dump : équivalent des anciens print() (tout écrit, depuis le thread de la requête)
+  - async debug+dump: mêmes lignes, écriture dans le thread QueueListener
+  - info            : réglage par défaut (résumé par requête)
+  - info 10%        : LOG_SAMPLE_RATE=0.1
+  - warning         : anomalies seulement
+Total = latences + vidage de la file (écriture effectivement payée).
+
+    cd ml-service
+    python scripts/bench_logging.py --drivers 1000 --requests 300 [--log-file /tmp/reco.log]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+# Ajouter le dossier ml-service au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench_concurrency import make_fleet, make_request
+from service import executor
+from service.request_log import configure_logging
+from service.recommender import get_recommendations
+
+CONFIGS = (
+    ("sync debug+dump",  dict(level="DEBUG",   ranking_dump=True,  sample_rate=1.0, async_write=False)),
+    ("async debug+dump", dict(level="DEBUG",   ranking_dump=True,  sample_rate=1.0, async_write=True)),
+    ("info",             dict(level="INFO",    ranking_dump=False, sample_rate=1.0, async_write=True)),
+    ("info 10%",         dict(level="INFO",    ranking_dump=False, sample_rate=0.1, async_write=True)),
+    ("warning",          dict(level="WARNING", ranking_dump=False, sample_rate=1.0, async_write=True)),
+)
+
+
+async def timed_requests(requests):
+    latencies = []
+    for req in requests:
+        t0 = time.perf_counter()
+        await get_recommendations(**req)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence /recommend selon la configuration des logs")
+    parser.add_argument("--drivers",  type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds",   type=int, default=3, help="configs alternées à chaque round")
+    parser.add_argument("--format",   choices=("json", "text"), default="json")
+    parser.add_argument("--log-file", default=os.devnull, help="destination des logs (défaut : /dev/null)")
+    args = parser.parse_args()
+
+    executor.configure_executor("inline")
+    fleet    = make_fleet(args.drivers)
+    rng      = random.Random(0)
+    requests = [make_request(fleet, rng) for _ in range(args.requests)]
+
+    latencies = {name: [] for name, _ in CONFIGS}
+    totals    = {name: 0.0 for name, _ in CONFIGS}
+    with open(args.log_file, "a") as stream:
+        asyncio.run(timed_requests(requests[:20]))                     # warm-up
+        for _ in range(args.rounds):
+            for name, options in CONFIGS:
+                configure_logging(fmt=args.format, stream=stream, **options)
+                t0 = time.perf_counter()
+                latencies[name] += asyncio.run(timed_requests(requests))
+                configure_logging(level="WARNING", stream=stream)     # vide la file du listener
+                totals[name] += time.perf_counter() - t0
+    configure_logging()
+
+    print(f"{args.requests} requêtes x {args.rounds} rounds | {args.drivers} drivers | "
+          f"logs -> {args.log_file} ({args.format})")
+    print(f"{'config':<18} {'p50 (ms)':>9} {'p95 (ms)':>9} {'total (s)':>10}")
+    for name, _ in CONFIGS:
+        p95 = statistics.quantiles(latencies[name], n=20)[-1]
+        print(f"{name:<18} {statistics.median(latencies[name]):9.2f} {p95:9.2f} {totals[name]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
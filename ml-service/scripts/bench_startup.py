@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+BENCHMARK - DÉMARRAGE DU ML-SERVICE
+============================================================================
+Mesure, dans un process Python neuf à chaque run (imports à froid), pour
+RECO_LAZY_INIT=0 puis 1 :
+  - import  : `import app` terminé → uvicorn peut ouvrir le port, /health répond ;
+  - ready   : snapshot validé en service → /ready passe à 200.
+
+    cd ml-service
+    python scripts/bench_startup.py --runs 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ML_SERVICE = Path(__file__).parent.parent
+
+# Exécuté dans le sous-process : horodatages relatifs au lancement de l'interpréteur
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter()
+app.recommender.recommender.start()
+app.recommender.recommender.wait()
+t_ready = time.perf_counter()
+print("BENCH " + json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "ready_ms":  (t_ready - t0) * 1000,
+    "ready":     app.recommender.recommender.is_ready(),
+}))
+"""
+
+
+def run_once(lazy: bool) -> dict:
+    env = {**os.environ, "RECO_LAZY_INIT": "1" if lazy else "0"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ML_SERVICE, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    line = next(l for l in out.splitlines() if l.startswith("BENCH "))
+    return json.loads(line[len("BENCH "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps de démarrage selon RECO_LAZY_INIT")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'import (ms)':>12} {'ready (ms)':>12}   médiane sur {args.runs} runs")
+    for lazy in (False, True):
+        runs = [run_once(lazy) for _ in range(args.runs)]
+        if not all(r["ready"] for r in runs):
+            print(f"[WARNING] lazy={lazy}: modèle non validé sur au moins un run")
+        print(f"{'lazy' if lazy else 'eager':<8} "
+              f"{statistics.median(r['import_ms'] for r in runs):12.0f} "
+              f"{statistics.median(r['ready_ms'] for r in runs):12.0f}")
+
+
+if __name__ == "__main__":
+    main()
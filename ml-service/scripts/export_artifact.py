@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+============================================================================
+EXPORT ARTEFACT - PICKLES -> .npy + manifest
+============================================================================
+Convertit les 4 pickles actuels de model_real/ en artefact versionné
+(model_real/artifacts/<version>/, pointé par CURRENT) sans réentraîner, puis
+compare les temps de chargement des deux formats.
+
+    cd ml-service
+    python scripts/export_artifact.py [--models-dir model_real] [--bench 5]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+import joblib
+
+# Ajouter le dossier ml-service au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.model_artifact import export_artifact, load_artifact
+
+
+def _median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export des pickles LightFM en artefact .npy")
+    parser.add_argument("--models-dir", default=str(Path(__file__).parent.parent / "model_real"))
+    parser.add_argument("--bench", type=int, default=5, help="répétitions du benchmark de chargement (0 = aucun)")
+    args = parser.parse_args()
+
+    names = ("lightfm_model_real.pkl", "dataset_real.pkl", "user_features_real.pkl", "item_features_real.pkl")
+    load_pickles = lambda: [joblib.load(Path(args.models_dir) / n) for n in names]
+
+    model, dataset, user_features, item_features = load_pickles()
+    path = export_artifact(model, dataset, user_features, item_features, args.models_dir,
+                           extra={"source": "pickles"})
+    print(f"Artefact écrit : {path}")
+
+    if args.bench > 0:
+        pickle_ms   = _median_ms(load_pickles, args.bench)
+        artifact_ms = _median_ms(lambda: load_artifact(path), args.bench)
+        print(f"Chargement pickles  : {pickle_ms:8.1f} ms (médiane sur {args.bench})")
+        print(f"Chargement artefact : {artifact_ms:8.1f} ms (mmap)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+ann_index.py — INDEX IVF POUR LE RETRIEVAL (produit scalaire maximal)
+
+Avant : retrieval_top_k score tous les candidats géo contre l'embedding
+passager (un produit matrice-vecteur sur n drivers). Suffisant pour les 141
+drivers du dataset, pas pour une flotte nationale — surtout quand le filtre
+géo retombe sur all_drivers.
+
+Maintenant (optionnel, RETRIEVAL_ANN=1) : index IVF construit en NumPy à la
+création du snapshot, donc reconstruit par reload().
+  - vecteur driver  x = [item_repr, item_repr_bias], requête q = [user_emb, 1] :
+    le score LightFM (à la constante du biais passager près) vaut x . q ;
+  - MIPS -> plus proche voisin : x~ = [x, sqrt(M² - |x|²)], q~ = [q, 0]
+    (M = plus grande norme), argmax x . q = argmin |x~ - q~| ;
+  - k-means (Lloyd, sur un échantillon) en nlist ≈ sqrt(n) cellules, listes
+    inversées = ids triés par cellule + offsets ;
+  - search : cellules classées par distance au centroïde, on ouvre les nprobe
+    plus proches puis les suivantes tant que la liste courte compte moins de
+    min_results candidats autorisés (restriction géo = masque booléen, nprobe
+    mis à l'échelle de la fraction autorisée).
+La liste courte est ensuite rescorée exactement par le Recommender : seuls
+les candidats jamais ouverts peuvent manquer (cf. scripts/bench_ann.py).
+"""
+
+import math
+import numpy as np
+from typing import Optional
+
+KMEANS_SAMPLE_PER_LIST = 64       # points d'entraînement par cellule
+ASSIGN_CHUNK           = 8192     # lignes par bloc de distances (mémoire bornée)
+
+
+def _augment(vectors: np.ndarray, biases: np.ndarray) -> np.ndarray:
+    x      = np.hstack((vectors, biases[:, None])).astype(np.float32)
+    norms2 = np.einsum("ij,ij->i", x, x)
+    extra  = np.sqrt(np.maximum(norms2.max() - norms2, 0.0))
+    return np.hstack((x, extra[:, None])).astype(np.float32)
+
+
+def _assign(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Cellule la plus proche de chaque point (|c|² - 2 p.c, par blocs)."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels     = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), ASSIGN_CHUNK):
+        block = points[start:start + ASSIGN_CHUNK]
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+def _kmeans(points: np.ndarray, nlist: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = points[rng.choice(len(points), nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(points, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        sums   = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        empty  = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Cellule vide : réensemencée sur un point au hasard
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Index inversé sur les représentations drivers (indices = index LightFM)."""
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        biases: np.ndarray,
+        nlist: Optional[int] = None,
+        iters: int = 10,
+        seed: int = 0,
+    ):
+        points     = _augment(np.asarray(vectors), np.asarray(biases))
+        n          = len(points)
+        self.n     = n
+        self.nlist = max(1, min(n, nlist or int(round(math.sqrt(n)))))
+
+        rng    = np.random.default_rng(seed)
+        sample = points
+        if n > self.nlist * KMEANS_SAMPLE_PER_LIST:
+            sample = points[rng.choice(n, self.nlist * KMEANS_SAMPLE_PER_LIST, replace=False)]
+        centroids = _kmeans(sample, self.nlist, iters, rng)
+
+        labels       = _assign(points, centroids)
+        self.ids     = np.argsort(labels, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=self.nlist))))
+        # q~ = [q, 1, 0] : la dernière coordonnée des centroïdes ne compte pas
+        self.centroids  = np.ascontiguousarray(centroids[:, :-1])
+        self.half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+
+    def search(
+        self,
+        query: np.ndarray,
+        nprobe: int,
+        allowed: Optional[np.ndarray] = None,
+        min_results: int = 0,
+    ) -> np.ndarray:
+        """
+        Liste courte (indices drivers) des cellules les plus proches de query.
+        allowed : masque booléen (n,) des candidats autorisés. nprobe est alors
+        augmenté en proportion (n / nb autorisés) pour garder une liste courte
+        de même taille, et on continue d'ouvrir des cellules tant qu'il reste
+        moins de min_results candidats.
+        """
+        if allowed is not None:
+            nprobe = math.ceil(nprobe * self.n / max(int(np.count_nonzero(allowed)), 1))
+        q     = np.append(np.asarray(query, dtype=np.float32), np.float32(1.0))
+        order = np.argsort(self.half_norms - self.centroids @ q, kind="stable")
+
+        parts, found = [], 0
+        for probed, cell in enumerate(order):
+            ids = self.ids[self.offsets[cell]:self.offsets[cell + 1]]
+            if allowed is not None:
+                ids = ids[allowed[ids]]
+            parts.append(ids)
+            found += len(ids)
+            if probed + 1 >= nprobe and found >= min_results:
+                break
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
@@ -0,0 +1,252 @@
+"""
+driver_registry.py — REGISTRE DRIVERS CÔTÉ ML-SERVICE
+
+Avant : Express sérialisait toute la flotte (avec tous les attributs) dans
+chaque body /recommend, et FastAPI la re-parsait avec pydantic à chaque appel.
+
+Maintenant :
+  - le registre garde en mémoire un enregistrement par driver, clé 'D{id}'
+    (mêmes ids que item_id_map), alimenté par /drivers/sync (bulk) et
+    /drivers/delta (upserts / suppressions) ;
+  - les positions alimentent directement driver_geo_index : une requête
+    géo ne parcourt que les drivers proches, jamais toute la flotte ;
+    la position live d'un driver pas encore synchronisé reste en attente
+    dans le registre et n'est indexée qu'à son upsert ;
+  - /recommend n'a plus besoin que d'une liste optionnelle de driver_ids
+    éligibles (sans liste → toute la flotte connue).
+
+Le champ `drivers` du payload reste accepté (PayloadDriverPool) pour la
+transition : les deux sources exposent la même interface à get_recommendations.
+Un payload ne modifie jamais l'index du registre (filtre géo sans état).
+"""
+
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from service.geo_index import DriverGeoIndex, driver_geo_index, km_to_chord, parse_coords, to_unit_xyz
+from service.pref_score import driver_pref_mask, driver_pref_masks
+
+# Champs utiles au scoring + à l'affichage côté Express. Le reste est ignoré
+# pour garder des enregistrements compacts.
+DRIVER_FIELDS = (
+    "id", "email", "nom", "prenom", "age", "numTel", "sexe",
+    "avgRating", "isVerified", "latitude", "longitude",
+    "talkative", "radio_on", "smoking_allowed", "pets_allowed", "car_big",
+    "works_morning", "works_afternoon", "works_evening", "works_night",
+)
+
+
+def driver_key(driver_id) -> str:
+    """12, '12' ou 'D12' -> 'D12'."""
+    return f"D{str(driver_id).lstrip('D')}"
+
+
+class DriverRegistry:
+
+    def __init__(self, geo_index: DriverGeoIndex):
+        self.geo_index = geo_index
+        self._lock     = threading.RLock()
+        self._records: Dict[str, Dict] = {}
+        self._seq: Dict[str, int]      = {}   # ordre d'insertion -> tri stable des candidats
+        self._no_geo: Set[str]         = set()
+        self._pref_masks: Dict[str, int] = {}  # attributs encodés à l'upsert (pref_score.py)
+        self._pending: Dict[str, Tuple[float, float]] = {}  # positions live de drivers pas encore synchronisés
+        self._next_seq = 0
+        self.version   = 0     # incrémentée à chaque écriture (clé du cache de réponses)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._records
+
+    # ── ÉCRITURES ─────────────────────────────────────────────────────────────
+    def upsert(self, driver: Dict) -> str:
+        """
+        Fusionne les champs reçus dans l'enregistrement existant : un delta
+        partiel (profil seul) garde la position connue, y compris une
+        position live posée par update_location. Réindexé seulement si le
+        delta porte latitude / longitude (ou si le driver est nouveau). Un
+        nouveau driver sans coordonnées exploitables reprend sa position en
+        attente, s'il en a une.
+        """
+        key    = driver_key(driver["id"])
+        fields = {f: driver.get(f) for f in DRIVER_FIELDS if f in driver}
+        with self._lock:
+            if key not in self._seq:
+                self._seq[key]  = self._next_seq
+                self._next_seq += 1
+            previous = self._records.get(key)
+            record   = {**previous, **fields} if previous is not None else fields
+            pending  = self._pending.pop(key, None)
+            if pending is not None and parse_coords(record.get("latitude"), record.get("longitude")) is None:
+                record["latitude"], record["longitude"] = pending
+            self._records[key]    = record
+            self._pref_masks[key] = driver_pref_mask(record)
+            if previous is None or "latitude" in fields or "longitude" in fields:
+                self._index_position(key, record)
+            self.version += 1
+        return key
+
+    def remove(self, driver_id) -> bool:
+        key = driver_key(driver_id)
+        with self._lock:
+            pending = self._pending.pop(key, None)
+            if self._records.pop(key, None) is None:
+                return pending is not None
+            self._seq.pop(key, None)
+            self._pref_masks.pop(key, None)
+            self._no_geo.discard(key)
+            self.geo_index.remove(key)
+            self.version += 1
+        return True
+
+    def sync(self, drivers: Iterable[Dict], replace: bool = True) -> int:
+        """Bulk : replace=True supprime les drivers absents du lot (et leurs positions en attente)."""
+        with self._lock:
+            keys = {self.upsert(d) for d in drivers}
+            if replace:
+                for key in [k for k in self._records if k not in keys]:
+                    self.remove(key)
+                self._pending.clear()
+        return len(keys)
+
+    def update_location(self, driver_id, lat, lng) -> bool:
+        """
+        Position live. lat/lng None -> driver sans position. Driver inconnu :
+        position gardée en attente jusqu'à son upsert (jamais indexée ni
+        servie avant), et False.
+        """
+        key = driver_key(driver_id)
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                coords = parse_coords(lat, lng)
+                if coords is None:
+                    self._pending.pop(key, None)
+                else:
+                    self._pending[key] = coords
+                return False
+            record["latitude"], record["longitude"] = lat, lng
+            self._index_position(key, record)
+            self.version += 1
+        return True
+
+    def _index_position(self, key: str, record: Dict):
+        coords = parse_coords(record.get("latitude"), record.get("longitude"))
+        if coords is None:
+            self._no_geo.add(key)
+            self.geo_index.remove(key)
+        else:
+            self._no_geo.discard(key)
+            self.geo_index.upsert(key, *coords)
+
+    # ── LECTURES (copies : le pipeline annote les dicts drivers) ──────────────
+    def records(self, keys: Iterable[str]) -> List[Dict]:
+        with self._lock:
+            found = [k for k in keys if k in self._records]
+            found.sort(key=self._seq.__getitem__)
+            return [dict(self._records[k]) for k in found]
+
+    def pref_masks(self, drivers: List[Dict]) -> np.ndarray:
+        """Masques de préférences des drivers (copies issues de records()), dans l'ordre."""
+        with self._lock:
+            masks = [self._pref_masks.get(driver_key(d["id"])) for d in drivers]
+        return np.fromiter(
+            (m if m is not None else driver_pref_mask(d) for m, d in zip(masks, drivers)),
+            dtype=np.int32, count=len(drivers),
+        )
+
+    def all_keys(self) -> List[str]:
+        with self._lock:
+            return list(self._records)
+
+    def no_geo_keys(self) -> Set[str]:
+        with self._lock:
+            return set(self._no_geo)
+
+    def has_position(self, key: str) -> bool:
+        """Position indexée (driver connu) ou en attente (driver pas encore synchronisé)."""
+        with self._lock:
+            return key in self._pending or (key in self._records and key not in self._no_geo)
+
+
+# ── POOLS DE CANDIDATS ────────────────────────────────────────────────────────
+# Interface commune consommée par get_recommendations / cold_start :
+#   len(pool), pool.all(), pool.within_radius(lat, lng, max_km),
+#   pool.pref_masks(drivers) (masques alignés sur une liste issue du pool)
+class RegistryDriverPool:
+    """Vue du registre restreinte (optionnellement) aux driver_ids éligibles."""
+
+    def __init__(self, registry: DriverRegistry, driver_ids: Optional[List] = None):
+        self.registry = registry
+        self.eligible = None if driver_ids is None else {driver_key(i) for i in driver_ids}
+
+    def _allowed(self, key: str) -> bool:
+        return self.eligible is None or key in self.eligible
+
+    def __len__(self) -> int:
+        if self.eligible is None:
+            return len(self.registry)
+        return sum(1 for k in self.eligible if k in self.registry)
+
+    def all(self) -> List[Dict]:
+        keys = self.registry.all_keys() if self.eligible is None else self.eligible
+        return self.registry.records(keys)
+
+    def within_radius(self, lat, lng, max_km) -> List[Dict]:
+        in_radius = self.registry.geo_index.ids_within(lat, lng, max_km)
+        geo    = self.registry.records(k for k in in_radius if self._allowed(k))
+        no_geo = self.registry.records(k for k in self.registry.no_geo_keys() if self._allowed(k))
+        return geo + no_geo
+
+    def pref_masks(self, drivers: List[Dict]) -> np.ndarray:
+        return self.registry.pref_masks(drivers)
+
+
+class PayloadDriverPool:
+    """
+    Drivers envoyés dans le body /recommend (ancien contrat Express).
+    Sans état : le filtre géo travaille sur les positions du payload et
+    n'écrit jamais dans driver_geo_index, réservé au registre.
+    """
+
+    def __init__(self, drivers: List[Dict]):
+        self.drivers = drivers
+
+    def __len__(self) -> int:
+        return len(self.drivers)
+
+    def all(self) -> List[Dict]:
+        return self.drivers
+
+    def pref_masks(self, drivers: List[Dict]) -> np.ndarray:
+        """Payload : pas d'encodage préalable, une passe par appel."""
+        return driver_pref_masks(drivers, len(drivers))
+
+    def within_radius(self, lat, lng, max_km) -> List[Dict]:
+        """
+        Drivers à <= max_km + ceux sans position exploitable. Même critère que
+        l'index (corde sur la sphère unité <= km_to_chord(max_km)), calculé en
+        une passe NumPy sur les positions du payload.
+        """
+        geo_drivers, no_geo_drivers, coords = [], [], []
+        for driver in self.drivers:
+            parsed = parse_coords(driver.get("latitude"), driver.get("longitude"))
+            if parsed is None:
+                no_geo_drivers.append(driver)
+            else:
+                geo_drivers.append(driver)
+                coords.append(parsed)
+        if not geo_drivers:
+            return no_geo_drivers
+        coords = np.array(coords, dtype=np.float64)
+        chords = np.linalg.norm(
+            to_unit_xyz(coords[:, 0], coords[:, 1]) - to_unit_xyz(float(lat), float(lng)), axis=1,
+        )
+        inside = (chords <= km_to_chord(max_km)).tolist()
+        return [d for d, ok in zip(geo_drivers, inside) if ok] + no_geo_drivers
+
+
+driver_registry = DriverRegistry(driver_geo_index)
@@ -0,0 +1,109 @@
+"""
+executor.py — EXÉCUTION HORS EVENT-LOOP DU TRAVAIL DE RECOMMANDATION
+
+get_recommendations ne contient aucun await : exécuté directement sur la boucle
+uvicorn, il sérialise tous les /recommend concurrents. Le calcul bloquant
+(numpy, predict LightFM, index géo, logs) est donc confié à un executor :
+
+  RECO_EXECUTOR=thread   (défaut) ThreadPoolExecutor — état partagé, le GIL
+                         limite le gain aux sections numpy / LightFM.
+  RECO_EXECUTOR=process  ProcessPoolExecutor en fork : les workers héritent du
+                         snapshot modèle en copy-on-write (lecture seule, pas de
+                         re-chargement). Le pool est recyclé à chaque swap de modèle.
+  RECO_EXECUTOR=inline   ancien comportement (directement sur la boucle).
+
+RECO_WORKERS fixe la taille du pool (défaut : nb de CPU, plafonné à 8).
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from service import metrics
+from service.request_log import current_context, run_in_context
+
+EXECUTOR_MODES = ("thread", "process", "inline")
+
+_mode    = os.getenv("RECO_EXECUTOR", "thread").strip().lower()
+_workers = int(os.getenv("RECO_WORKERS", min(8, os.cpu_count() or 2)))
+_executor: Optional[Executor] = None
+_lock = threading.Lock()
+
+
+def executor_mode() -> str:
+    return _mode
+
+
+def executor_workers() -> int:
+    return _workers
+
+
+def configure_executor(mode: str, workers: Optional[int] = None):
+    """Change de mode / taille de pool (benchmarks, tests manuels)."""
+    global _mode, _workers
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"RECO_EXECUTOR inconnu: {mode} (attendu: {', '.join(EXECUTOR_MODES)})")
+    with _lock:
+        _mode = mode
+        if workers is not None:
+            _workers = max(1, int(workers))
+    shutdown_executor()
+
+
+def _create_executor() -> Optional[Executor]:
+    if _mode == "thread":
+        return ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="reco")
+    if _mode == "process":
+        # fork : le modèle déjà chargé est partagé par pages, pas re-unpicklé.
+        # (indisponible sous Windows -> spawn, chaque worker recharge le modèle)
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        return ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context(method))
+    return None
+
+
+def get_executor() -> Optional[Executor]:
+    global _executor
+    with _lock:
+        if _executor is None and _mode != "inline":
+            _executor = _create_executor()
+        return _executor
+
+
+def shutdown_executor(wait: bool = False):
+    global _executor
+    with _lock:
+        old, _executor = _executor, None
+    if old is not None:
+        old.shutdown(wait=wait)
+
+
+def recycle_process_pool(*_):
+    """Appelé après un swap de modèle : les prochains workers forkent le nouveau snapshot."""
+    if _mode == "process":
+        shutdown_executor(wait=False)
+
+
+def _run_in_worker(log_context, fn: Callable, args, kwargs):
+    return metrics.collect(run_in_context, log_context, fn, *args, **kwargs)
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """
+    Exécute fn(*args, **kwargs) dans l'executor configuré (fn picklable en mode process).
+    run_in_executor ne propage pas les contextvars : le contexte de log (request_id,
+    échantillonnage) est passé explicitement au worker, et ses métriques reviennent
+    avec le résultat pour être fusionnées dans le registre du process principal.
+    """
+    executor = get_executor()
+    if executor is None:
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    result, trace = await loop.run_in_executor(
+        executor, functools.partial(_run_in_worker, current_context(), fn, args, kwargs),
+    )
+    metrics.merge(trace)
+    return result
@@ -0,0 +1,226 @@
+"""
+feedback_log.py — JOURNAL DES FEEDBACKS + STATISTIQUES SUFFISANTES
+
+Avant : chaque /feedback réécrivait tout feedback_history.json (O(n) disque) et,
+passé 50 échantillons, SLSQP repartait d'un DataFrame de tout l'historique (O(n)).
+
+Maintenant :
+  - chaque feedback est AJOUTÉ en une ligne JSON à feedback_history.jsonl ;
+  - on maintient X^T X, X^T y, y^T y et n au fil de l'eau. Le problème
+    min_w mean((X w - y)^2) ne dépend que de ces quantités :
+        f(w)  = (w^T XtX w - 2 w^T Xty + yty) / n
+        ∇f(w) = 2 (XtX w - Xty) / n
+    → résoudre SLSQP sur 4 poids est O(1) en taille d'historique ;
+  - toutes les COMPACT_EVERY lignes, les stats sont figées dans
+    feedback_stats.json et le journal est vidé (compaction).
+
+Compaction crash-safe, par rotation :
+  1. le journal est renommé feedback_history.jsonl.<g+1> (les nouveaux
+     feedbacks repartent dans un journal vide) ;
+  2. le snapshot est écrit avec generation = g+1 (il contient ces lignes) ;
+  3. le fichier renommé est supprimé.
+Au chargement, un fichier .<g+1> encore présent alors que le snapshot est en
+génération g n'a pas été intégré : il est rejoué puis la compaction est
+terminée ; un fichier de génération <= g est déjà compté et simplement supprimé.
+(folded_lines : lignes du journal déjà comptées, anciens snapshots.)
+"""
+
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from service.request_log import get_logger
+
+logger = get_logger(__name__)
+
+COMPACT_EVERY = 1000
+
+
+def write_json_atomic(path: str, payload):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class FeedbackLog:
+
+    def __init__(
+        self,
+        log_path: str,
+        stats_path: str,
+        keys: List[str],
+        legacy_path: Optional[str] = None,
+        compact_every: int = COMPACT_EVERY,
+        persist: bool = True,
+    ):
+        self.log_path      = log_path
+        self.stats_path    = stats_path
+        self.legacy_path   = legacy_path
+        self.keys          = list(keys)
+        self.compact_every = compact_every
+        self.persist       = persist
+        self._lock         = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        d = len(self.keys)
+        self.n     = 0
+        self.xtx   = np.zeros((d, d))
+        self.xty   = np.zeros(d)
+        self.yty   = 0.0
+        self._log_lines  = 0     # lignes actuellement dans le journal
+        self._generation = 0     # compactions intégrées au snapshot
+
+    def _rotated_path(self, generation: int) -> str:
+        return f"{self.log_path}.{generation}"
+
+    def __len__(self) -> int:
+        return self.n
+
+    # ── ACCUMULATION ──────────────────────────────────────────────────────────
+    def _sample(self, entry: Dict) -> Optional[Tuple[np.ndarray, float]]:
+        """(x, y) d'un feedback, None s'il lui manque une clé ou la cible."""
+        if not set(self.keys).issubset(entry) or "target" not in entry:
+            return None
+        return np.array([float(entry[k] or 0.0) for k in self.keys]), float(entry["target"])
+
+    def _accumulate(self, entry: Dict) -> bool:
+        sample = self._sample(entry)
+        if sample is None:
+            return False
+        self._add(*sample)
+        return True
+
+    def _add(self, x: np.ndarray, y: float):
+        self.xtx += np.outer(x, x)
+        self.xty += x * y
+        self.yty += y * y
+        self.n   += 1
+
+    def sufficient_stats(self) -> Tuple[np.ndarray, np.ndarray, float, int]:
+        with self._lock:
+            return self.xtx.copy(), self.xty.copy(), self.yty, self.n
+
+    # ── PERSISTANCE ───────────────────────────────────────────────────────────
+    def load(self):
+        with self._lock:
+            self._zero()
+            folded = 0
+            if os.path.exists(self.stats_path):
+                with open(self.stats_path, "r") as f:
+                    snap = json.load(f)
+                if snap.get("keys") == self.keys:
+                    self.n   = int(snap["n"])
+                    self.xtx = np.array(snap["xtx"], dtype=np.float64)
+                    self.xty = np.array(snap["xty"], dtype=np.float64)
+                    self.yty = float(snap["yty"])
+                    folded   = int(snap.get("folded_lines", 0))
+                    self._generation = int(snap.get("generation", 0))
+
+            pending = self._rotated_path(self._generation + 1)
+            if os.path.exists(pending):
+                # Crash entre rotation et snapshot : journal renommé pas encore compté
+                self._replay(pending, folded)
+                folded = 0
+                if self.persist:
+                    self._generation += 1
+                    self._write_snapshot()
+                    os.remove(pending)
+            if self.persist:
+                # Déjà comptés dans le snapshot (crash avant la suppression)
+                self._remove_rotations(self._generation)
+
+            if os.path.exists(self.log_path):
+                self._log_lines = self._replay(self.log_path, folded)
+            elif self.legacy_path and os.path.exists(self.legacy_path) and not os.path.exists(self.stats_path):
+                self._migrate_legacy()
+
+    def _replay(self, path: str, skip: int) -> int:
+        """Rejoue les lignes de path au-delà des `skip` premières ; retourne le nombre de lignes."""
+        count = 0
+        with open(path, "r") as f:
+            for i, line in enumerate(f):
+                count += 1
+                if i < skip or not line.strip():
+                    continue
+                try:
+                    self._accumulate(json.loads(line))
+                except ValueError:
+                    continue          # ligne tronquée (crash pendant l'écriture)
+        return count
+
+    def _remove_rotations(self, up_to: Optional[int]):
+        """Journaux renommés de génération <= up_to (None : tous)."""
+        directory = os.path.dirname(self.log_path) or "."
+        prefix    = os.path.basename(self.log_path) + "."
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):] if name.startswith(prefix) else ""
+            if suffix.isdigit() and (up_to is None or int(suffix) <= up_to):
+                os.remove(os.path.join(directory, name))
+
+    def _migrate_legacy(self):
+        """Ancien feedback_history.json (liste complète) -> journal JSONL, une seule fois."""
+        with open(self.legacy_path, "r") as f:
+            entries = json.load(f)
+        valid = [e for e in entries if self._accumulate(e)]
+        if self.persist:
+            with open(self.log_path, "w") as f:
+                for e in valid:
+                    f.write(json.dumps(e) + "\n")
+        self._log_lines = len(valid)
+        logger.info("Feedbacks migrés vers %s: %d", os.path.basename(self.log_path), len(valid))
+
+    def append(self, entry: Dict) -> int:
+        """
+        Ajoute un feedback (dict keys + target). Retourne le nombre total d'échantillons.
+        Écrit dans le journal AVANT de cumuler : si l'écriture échoue, l'état en
+        mémoire reste celui que load() reconstruira.
+        """
+        with self._lock:
+            sample = self._sample(entry)
+            if sample is None:
+                return self.n
+            if self.persist:
+                line = json.dumps(entry) + "\n"
+                with open(self.log_path, "a") as f:
+                    f.write(line)
+                self._log_lines += 1
+            self._add(*sample)
+            if self.persist and self._log_lines >= self.compact_every:
+                self._compact()
+            return self.n
+
+    def _write_snapshot(self):
+        write_json_atomic(self.stats_path, {
+            "keys": self.keys, "n": self.n,
+            "xtx": self.xtx.tolist(), "xty": self.xty.tolist(), "yty": self.yty,
+            "generation": self._generation, "folded_lines": 0,
+        })
+
+    def _compact(self):
+        rotated = self._rotated_path(self._generation + 1)
+        if os.path.exists(self.log_path):
+            os.replace(self.log_path, rotated)          # 1. rotation (atomique)
+        self._generation += 1
+        self._write_snapshot()                          # 2. snapshot qui contient ces lignes
+        if os.path.exists(rotated):
+            os.remove(rotated)                          # 3. nettoyage
+        self._log_lines = 0
+
+    def compact(self):
+        with self._lock:
+            if self.persist:
+                self._compact()
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+            for path in (self.log_path, self.stats_path, self.legacy_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self._remove_rotations(None)
@@ -0,0 +1,290 @@
+"""
+geo_index.py — INDEX GÉO PERSISTANT DES DRIVERS
+
+Remplace le KDTree reconstruit à chaque /recommend sur des degrés lat/lng bruts
+(rayon max_km / 111.0, faux dès qu'on s'éloigne de l'équateur : à Alger un
+degré de longitude ne fait que ~90 km).
+
+PRINCIPE :
+  Chaque position est projetée sur la sphère unité (coordonnées ECEF x, y, z).
+  La distance euclidienne (corde) y est une fonction monotone de la distance
+  orthodromique : corde = 2 * sin(d / 2R). Un rayon en km devient donc un rayon
+  exact en corde et le cKDTree répond sans approximation, quelle que soit la latitude.
+
+MISES À JOUR INCRÉMENTALES :
+  upsert / remove ne touchent pas l'arbre :
+    - une nouvelle position va dans un petit tampon scanné en force brute ;
+    - l'ancienne entrée de l'arbre est marquée périmée et ignorée aux requêtes.
+  L'arbre n'est reconstruit que lorsque tampon + périmés dépassent
+  REBUILD_RATIO de la flotte — coût amorti, jamais à chaque requête.
+
+CELLULES (ids_within, utilisé par les pools) :
+  Le trafic /recommend part surtout de quelques zones denses d'Alger, et
+  query_radius recalculait à chaque appel la distance de chaque driver trouvé
+  pour ensuite n'en garder que les ids. Les drivers sont aussi rangés dans une
+  grille lat/lng de GEO_CELL_DEG degrés (façon geohash). Une requête parcourt
+  les cellules de la boîte englobant le rayon :
+    - cellule intérieure (ses 4 coins dans le rayon) : tous ses drivers, sans calcul ;
+    - cellule de bordure : test de corde vectorisé sur ses seuls drivers.
+  La liste de chaque cellule (ids + points xyz) est mise en cache à la
+  première lecture et invalidée dès qu'un driver y entre ou en sort.
+  Même critère que l'arbre (corde <= km_to_chord(max_km)) : même résultat.
+  Près des pôles, de l'antiméridien ou pour un très grand rayon : query_radius.
+"""
+
+import math
+import os
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+REBUILD_RATIO   = 0.20
+REBUILD_MIN     = 64
+
+GEO_CELL_DEG   = float(os.getenv("GEO_CELL_DEG", 0.05))   # ~5,5 km de latitude
+MAX_RING_CELLS = 4096                                      # au-delà : query_radius (arbre)
+
+
+def to_unit_xyz(lat, lng) -> np.ndarray:
+    """lat/lng en degrés (scalaires ou tableaux) -> points sur la sphère unité."""
+    lat_r = np.radians(lat)
+    lng_r = np.radians(lng)
+    cos_lat = np.cos(lat_r)
+    return np.stack([cos_lat * np.cos(lng_r), cos_lat * np.sin(lng_r), np.sin(lat_r)], axis=-1)
+
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * math.sin(min(km, math.pi * EARTH_RADIUS_KM) / (2.0 * EARTH_RADIUS_KM))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def cell_of(lat: float, lng: float, cell_deg: float = GEO_CELL_DEG) -> Tuple[int, int]:
+    return math.floor(lat / cell_deg), math.floor(lng / cell_deg)
+
+
+def parse_coords(lat, lng) -> Optional[Tuple[float, float]]:
+    """Même tolérance que l'ancien build_spatial_index : tout ce que float() accepte."""
+    if lat is None or lng is None:
+        return None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (ValueError, TypeError):
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return None
+    return lat, lng
+
+
+class DriverGeoIndex:
+    """Index radius-search des positions drivers, clé = id 'D{id}' (comme item_id_map)."""
+
+    def __init__(
+        self,
+        rebuild_ratio: float = REBUILD_RATIO,
+        rebuild_min: int = REBUILD_MIN,
+        cell_deg: float = GEO_CELL_DEG,
+    ):
+        self.rebuild_ratio = rebuild_ratio
+        self.rebuild_min   = rebuild_min
+        self.cell_deg      = cell_deg
+        self._lock         = threading.RLock()
+
+        self._positions: Dict[str, Tuple[float, float]] = {}
+
+        # Arbre figé au dernier rebuild
+        self._tree: Optional["cKDTree"] = None
+        self._tree_ids: List[str]     = []
+        self._stale: Set[str]         = set()
+
+        # Positions modifiées depuis le dernier rebuild (force brute)
+        self._pending: Dict[str, np.ndarray] = {}
+
+        # Grille : membres de chaque cellule + cache (ids, xyz) par cellule
+        self._cells: Dict[Tuple[int, int], Dict[str, None]] = {}
+        self._cell_cache: Dict[Tuple[int, int], Tuple[List[str], np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._positions
+
+    def position(self, driver_id: str) -> Optional[Tuple[float, float]]:
+        return self._positions.get(driver_id)
+
+    # ── MISES À JOUR ──────────────────────────────────────────────────────────
+    def upsert(self, driver_id: str, lat, lng) -> bool:
+        """Ajoute / déplace un driver. Retourne False si la position est invalide ou inchangée."""
+        coords = parse_coords(lat, lng)
+        if coords is None:
+            return False
+        with self._lock:
+            previous = self._positions.get(driver_id)
+            if previous == coords:
+                return False
+            if previous is not None:
+                self._leave_cell(driver_id, previous)
+            self._positions[driver_id] = coords
+            self._enter_cell(driver_id, coords)
+            self._stale.add(driver_id)
+            self._pending[driver_id] = to_unit_xyz(*coords)
+            self._maybe_rebuild()
+        return True
+
+    def bulk_upsert(self, items: Iterable[Tuple[str, float, float]]) -> int:
+        changed = 0
+        with self._lock:
+            for driver_id, lat, lng in items:
+                changed += self.upsert(driver_id, lat, lng)
+        return changed
+
+    def remove(self, driver_id: str) -> bool:
+        with self._lock:
+            previous = self._positions.pop(driver_id, None)
+            if previous is None:
+                return False
+            self._leave_cell(driver_id, previous)
+            self._stale.add(driver_id)
+            self._pending.pop(driver_id, None)
+            self._maybe_rebuild()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._positions.clear()
+            self._tree, self._tree_ids = None, []
+            self._stale.clear()
+            self._pending.clear()
+            self._cells.clear()
+            self._cell_cache.clear()
+
+    def _enter_cell(self, driver_id: str, coords: Tuple[float, float]):
+        cell = cell_of(*coords, self.cell_deg)
+        self._cells.setdefault(cell, {})[driver_id] = None
+        self._cell_cache.pop(cell, None)
+
+    def _leave_cell(self, driver_id: str, coords: Tuple[float, float]):
+        cell    = cell_of(*coords, self.cell_deg)
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(driver_id, None)
+            if not members:
+                del self._cells[cell]
+        self._cell_cache.pop(cell, None)
+
+    def _maybe_rebuild(self):
+        dirty = len(self._pending) + len(self._stale)
+        if dirty > max(self.rebuild_min, self.rebuild_ratio * len(self._positions)):
+            self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            ids = list(self._positions)
+            if ids:
+                from scipy.spatial import cKDTree     # import lourd : au premier rebuild seulement
+                coords = np.array([self._positions[i] for i in ids], dtype=np.float64)
+                self._tree = cKDTree(to_unit_xyz(coords[:, 0], coords[:, 1]))
+            else:
+                self._tree = None
+            self._tree_ids = ids
+            self._stale.clear()
+            self._pending.clear()
+
+    # ── REQUÊTES ──────────────────────────────────────────────────────────────
+    def query_radius(self, lat: float, lng: float, max_km: float) -> Dict[str, float]:
+        """{driver_id: distance_km} pour tous les drivers à <= max_km (orthodromique)."""
+        center = to_unit_xyz(float(lat), float(lng))
+        chord  = km_to_chord(max_km)
+        found: Dict[str, float] = {}
+
+        with self._lock:
+            if self._tree is not None:
+                idx = self._tree.query_ball_point(center, chord)
+                if idx:
+                    idx   = np.asarray(idx)
+                    dists = chord_to_km(np.linalg.norm(self._tree.data[idx] - center, axis=1))
+                    for i, d in zip(idx.tolist(), dists.tolist()):
+                        driver_id = self._tree_ids[i]
+                        if driver_id not in self._stale:
+                            found[driver_id] = d
+
+            if self._pending:
+                pending_ids = list(self._pending)
+                xyz    = np.stack([self._pending[i] for i in pending_ids])
+                chords = np.linalg.norm(xyz - center, axis=1)
+                for driver_id, c in zip(pending_ids, chords.tolist()):
+                    if c <= chord:
+                        found[driver_id] = float(chord_to_km(np.float64(c)))
+        return found
+
+    def _cell_members(self, cell: Tuple[int, int]) -> Tuple[List[str], np.ndarray]:
+        cached = self._cell_cache.get(cell)
+        if cached is None:
+            ids    = list(self._cells[cell])
+            coords = np.array([self._positions[i] for i in ids], dtype=np.float64)
+            cached = self._cell_cache[cell] = (ids, to_unit_xyz(coords[:, 0], coords[:, 1]))
+        return cached
+
+    def _ring(self, lat: float, lng: float, max_km: float):
+        """(lignes, colonnes) de cellules couvrant le rayon, None -> passer par l'arbre."""
+        angle = max_km / EARTH_RADIUS_KM
+        dlat  = math.degrees(angle)
+        if abs(lat) + dlat >= 90.0:
+            return None
+        sin_dlng = math.sin(min(angle, math.pi / 2)) / math.cos(math.radians(lat))
+        if angle >= math.pi / 2 or sin_dlng >= 1.0:
+            return None
+        dlng = math.degrees(math.asin(sin_dlng))
+        if abs(lng) + dlng >= 180.0:
+            return None
+        rows = range(math.floor((lat - dlat) / self.cell_deg), math.floor((lat + dlat) / self.cell_deg) + 1)
+        cols = range(math.floor((lng - dlng) / self.cell_deg), math.floor((lng + dlng) / self.cell_deg) + 1)
+        if len(rows) * len(cols) > MAX_RING_CELLS:
+            return None
+        return rows, cols
+
+    def ids_within(self, lat: float, lng: float, max_km: float) -> List[str]:
+        """Ids des drivers à <= max_km (même critère que query_radius, sans les distances)."""
+        lat, lng = float(lat), float(lng)
+        ring     = self._ring(lat, lng, max_km)
+        if ring is None:
+            return list(self.query_radius(lat, lng, max_km))
+        rows, cols = ring
+        center     = to_unit_xyz(lat, lng)
+        chord      = km_to_chord(max_km)
+
+        # Corde max de chaque cellule = max sur ses 4 coins (grille des coins, une passe)
+        edge_lat, edge_lng = np.meshgrid(
+            np.arange(rows.start, rows.stop + 1) * self.cell_deg,
+            np.arange(cols.start, cols.stop + 1) * self.cell_deg,
+            indexing="ij",
+        )
+        corners  = np.linalg.norm(to_unit_xyz(edge_lat, edge_lng) - center, axis=-1)
+        far      = np.maximum(np.maximum(corners[:-1, :-1], corners[1:, :-1]),
+                              np.maximum(corners[:-1, 1:], corners[1:, 1:]))
+        interior = far < chord * (1.0 - 1e-9)      # marge : pas d'égalité au bit près
+
+        found: List[str] = []
+        border_ids, border_xyz = [], []
+        with self._lock:
+            for r, row in enumerate(rows):
+                for c, col in enumerate(cols):
+                    if (row, col) not in self._cells:
+                        continue
+                    ids, xyz = self._cell_members((row, col))
+                    if interior[r, c]:
+                        found.extend(ids)
+                    else:
+                        border_ids.extend(ids)
+                        border_xyz.append(xyz)
+        if border_xyz:
+            inside = np.linalg.norm(np.concatenate(border_xyz) - center, axis=1) <= chord
+            found.extend(i for i, ok in zip(border_ids, inside.tolist()) if ok)
+        return found
+
+
+driver_geo_index = DriverGeoIndex()
@@ -0,0 +1,207 @@
+"""
+metrics.py — MÉTRIQUES DU ML-SERVICE (format d'exposition Prometheus)
+
+Avant : aucune visibilité sur la répartition du temps d'un /recommend
+(parsing, filtrage géo, retrieval LightFM, pref top-K, ranking, tri) ni sur
+les chemins pris (cold-start, replis).
+
+Maintenant :
+  - reco_stage_seconds{stage}        : histogramme par étape numérotée ;
+  - reco_request_seconds{endpoint}   : durée bout en bout (attente executor comprise) ;
+  - reco_requests_total{path}        : cold_start / warm ;
+  - reco_candidates{stage}           : nombre de candidats à chaque étape ;
+  - reco_fallback_total{kind}        : replis (géo vide, retrieval vide, ranking collaboratif…) ;
+  - reco_errors_total{endpoint}      : exceptions remontées à l'appelant ;
+  - reco_response_cache_total{result}, reco_response_cache_evictions_total{reason} :
+    cache des réponses /recommend (response_cache.py).
+GET /metrics rend le registre au format texte 0.0.4 (pas de dépendance
+prometheus_client : quelques compteurs et histogrammes suffisent).
+
+Mode process : un worker forké écrirait dans sa copie du registre. Pendant le
+calcul, les mesures sont donc accumulées dans une trace (contextvar) que
+run_blocking rapatrie avec le résultat, puis fusionnée ici par le process
+principal. Hors executor (inline, scripts), elles vont directement au registre.
+"""
+
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+COUNT_BUCKETS   = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+REGISTRY: Dict[str, "_Metric"] = {}
+
+_trace: contextvars.ContextVar = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._lock      = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        REGISTRY[name] = self
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def _record(self, key: Tuple[str, ...], value: float):
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((self.name, key, value))
+        else:
+            self._apply(key, value)
+
+    def _labels(self, key: Tuple[str, ...], **extra) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1.0, **labels):
+        self._record(self._key(labels), value)
+
+    def _apply(self, key, value):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._labels(key)} {_fmt(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        self._record(self._key(labels), value)
+
+    def _apply(self, key, value):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, n = value
+        lines = [
+            f"{self.name}_bucket{self._labels(key, le=_fmt(bound))} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{self._labels(key, le='+Inf')} {n}")
+        lines.append(f"{self.name}_sum{self._labels(key)} {_fmt(total)}")
+        lines.append(f"{self.name}_count{self._labels(key)} {n}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# ── MÉTRIQUES /recommend ──────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "reco_stage_seconds", "Durée de chaque étape de recommend / recommend_batch", ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "reco_request_seconds", "Durée bout en bout de get_recommendations (attente executor comprise)", ["endpoint"],
+)
+REQUESTS = Counter(
+    "reco_requests_total", "Recommandations calculées, par chemin (cold_start / warm)", ["path"],
+)
+CANDIDATES = Histogram(
+    "reco_candidates", "Nombre de candidats à la sortie de chaque étape", ["stage"], buckets=COUNT_BUCKETS,
+)
+FALLBACKS = Counter(
+    "reco_fallback_total", "Chemins de repli empruntés", ["kind"],
+)
+ERRORS = Counter(
+    "reco_errors_total", "Exceptions remontées par get_recommendations", ["endpoint"],
+)
+RESPONSE_CACHE = Counter(
+    "reco_response_cache_total", "Consultations du cache des réponses /recommend (hit / miss)", ["result"],
+)
+RESPONSE_CACHE_EVICTIONS = Counter(
+    "reco_response_cache_evictions_total", "Réponses retirées du cache (ttl / lru / invalidate)", ["reason"],
+)
+
+
+class StageTimer:
+    """Étapes successives : lap(nom) enregistre le temps écoulé depuis le lap précédent."""
+
+    def __init__(self):
+        self._t = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self._t, stage=name)
+        self._t = now
+
+
+@contextlib.contextmanager
+def timed_request(endpoint: str):
+    """reco_request_seconds + reco_errors_total pour un appel get_recommendations*."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint)
+
+
+# ── TRANSPORT (executor) ──────────────────────────────────────────────────────
+def collect(fn: Callable, *args, **kwargs) -> Tuple[object, List[Tuple]]:
+    """Exécute fn en accumulant ses mesures dans une trace picklable : (résultat, trace)."""
+    trace: List[Tuple] = []
+    token = _trace.set(trace)
+    try:
+        return fn(*args, **kwargs), trace
+    finally:
+        _trace.reset(token)
+
+
+def merge(trace: Optional[List[Tuple]]):
+    for name, key, value in trace or ():
+        REGISTRY[name]._apply(key, value)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,157 @@
+"""
+model_artifact.py — FORMAT D'ARTEFACT MODÈLE (.npy + manifest)
+
+Avant : le service dépicklait 4 fichiers (modèle LightFM, Dataset, deux
+matrices de features), chacun en essayant pickle puis joblib, et relisait
+drivers_processed.csv qui ne sert pas au scoring.
+
+Maintenant retrain.py exporte en plus un artefact versionné :
+
+  model_real/artifacts/
+    CURRENT                      <- nom de la version servie (écrit en dernier)
+    20260101-120000/
+      manifest.json              <- version, dimensions, fichiers, dtypes
+      item_embeddings.npy  item_biases.npy  user_embeddings.npy  user_biases.npy
+      item_repr.npy  item_repr_bias.npy  user_repr.npy  user_repr_bias.npy
+      item_features.{indptr,indices,data}.npy  user_features.{...}.npy
+      user_ids.npy  item_ids.npy  user_feature_names.npy  item_feature_names.npy
+
+Le service les ouvre avec np.load(mmap_mode='r') : pas de désérialisation,
+pages partagées entre workers (fork ou processus distincts), et aucune
+dépendance à lightfm pour servir. *_repr sont les représentations composées
+(features @ embeddings) exactement comme get_*_representations.
+"""
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+from typing import Dict, Optional
+
+ARTIFACT_FORMAT = 1
+ARTIFACTS_DIR   = "artifacts"
+CURRENT_FILE    = "CURRENT"
+KEEP_VERSIONS   = 3
+
+
+def _ordered_ids(mapping: Dict) -> np.ndarray:
+    """{id: index} -> tableau ids[index] (chaînes, dtype '<U' mappable)."""
+    ids = [None] * len(mapping)
+    for key, idx in mapping.items():
+        ids[idx] = str(key)
+    return np.array(ids, dtype=str)
+
+
+def _save_csr(directory: str, name: str, mat, files: Dict):
+    mat = mat.tocsr()
+    for part in ("indptr", "indices", "data"):
+        _save_array(directory, f"{name}.{part}", getattr(mat, part), files)
+    files[name] = {"format": "csr", "shape": list(mat.shape)}
+
+
+def _save_array(directory: str, name: str, arr: np.ndarray, files: Dict):
+    arr = np.ascontiguousarray(arr)
+    np.save(os.path.join(directory, f"{name}.npy"), arr, allow_pickle=False)
+    files[name] = {"dtype": str(arr.dtype), "shape": list(arr.shape)}
+
+
+def export_artifact(model, dataset, user_features, item_features, models_dir: str,
+                    version: Optional[str] = None, extra: Optional[Dict] = None,
+                    keep: int = KEEP_VERSIONS) -> str:
+    """Écrit une nouvelle version puis bascule CURRENT dessus (atomique). Retourne son chemin."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    root    = os.path.join(models_dir, ARTIFACTS_DIR)
+    final   = os.path.join(root, version)
+    tmp     = f"{final}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    user_id_map, user_feature_map, item_id_map, item_feature_map = dataset.mapping()
+    item_repr_bias, item_repr = model.get_item_representations(item_features)
+    user_repr_bias, user_repr = model.get_user_representations(user_features)
+
+    files: Dict = {}
+    for name, arr in (
+        ("item_embeddings", model.item_embeddings), ("item_biases", model.item_biases),
+        ("user_embeddings", model.user_embeddings), ("user_biases", model.user_biases),
+        ("item_repr", item_repr.astype(np.float32)), ("item_repr_bias", item_repr_bias.astype(np.float32)),
+        ("user_repr", user_repr.astype(np.float32)), ("user_repr_bias", user_repr_bias.astype(np.float32)),
+        ("user_ids", _ordered_ids(user_id_map)), ("item_ids", _ordered_ids(item_id_map)),
+        ("user_feature_names", _ordered_ids(user_feature_map)),
+        ("item_feature_names", _ordered_ids(item_feature_map)),
+    ):
+        _save_array(tmp, name, arr, files)
+    _save_csr(tmp, "item_features", item_features, files)
+    _save_csr(tmp, "user_features", user_features, files)
+
+    manifest = {
+        "format":        ARTIFACT_FORMAT,
+        "version":       version,
+        "created_at":    time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "no_components": int(model.no_components),
+        "n_users":       len(user_id_map),
+        "n_items":       len(item_id_map),
+        "files":         files,
+        **(extra or {}),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    pointer = os.path.join(root, f"{CURRENT_FILE}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+    _prune(root, keep, version)
+    return final
+
+
+def _prune(root: str, keep: int, current: str):
+    versions = sorted(
+        d for d in os.listdir(root)
+        if os.path.isdir(os.path.join(root, d)) and not d.endswith(".tmp")
+    )
+    for old in versions[:-keep] if keep > 0 else []:
+        if old != current:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+def current_artifact_dir(models_dir: str) -> Optional[str]:
+    """Dossier de la version pointée par CURRENT, ou None (pas encore d'artefact)."""
+    root = os.path.join(models_dir, ARTIFACTS_DIR)
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(root, version)
+    return path if os.path.isfile(os.path.join(path, "manifest.json")) else None
+
+
+def load_artifact(path: str, mmap_mode: Optional[str] = "r") -> Dict:
+    """Manifest + tableaux mappés en mémoire + mappings {id: index} reconstruits."""
+    import scipy.sparse as sp      # importé ici : le ml-service n'en a besoin qu'au chargement
+    with open(os.path.join(path, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"format d'artefact non supporté: {manifest.get('format')}")
+
+    load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+    art  = {"manifest": manifest}
+    for name, meta in manifest["files"].items():
+        if meta.get("format") == "csr":
+            art[name] = sp.csr_matrix(
+                (load(f"{name}.data"), load(f"{name}.indices"), load(f"{name}.indptr")),
+                shape=tuple(meta["shape"]),
+            )
+        elif "." not in name:
+            art[name] = load(name)
+
+    for key in ("user_ids", "item_ids", "user_feature_names", "item_feature_names"):
+        art[key.replace("_ids", "_id_map").replace("_names", "_map")] = {
+            str(v): i for i, v in enumerate(art.pop(key).tolist())
+        }
+    return art
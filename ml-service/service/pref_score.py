@@ -0,0 +1,180 @@
+"""
+pref_score.py — SCORE DE PRÉFÉRENCES PAR MASQUES DE BITS
+
+Avant : calculate_match_score parcourait PREF_RULES pour chaque driver en
+normalisant les chaînes (_pref, _b, _driver_field), et le même driver était
+rescoré pour le pref pooling, le ranking et le cold-start.
+
+Maintenant :
+  - les attributs driver sont encodés une fois en masque 12 bits
+    (driver_pref_mask, calculé par le registre à l'upsert) :
+        bit i      : l'attribut de la règle i vaut "yes"
+        bit 6 + i  : il vaut "no"
+    (ni l'un ni l'autre pour une valeur inattendue : comme avant, ce driver
+    ne satisfait la règle dans aucun sens) ;
+  - les préférences passager sont compilées une fois par requête
+    (compile_preferences) : code base 3 (729 états) + masques des règles
+    dont la valeur voulue est "yes" / "no" ;
+  - score = table[code][match], match = bits des règles satisfaites (64
+    valeurs) calculés en 3 opérations entières sur tout le tableau de masques.
+    Table 729 x 64 remplie ligne par ligne à la demande, chaque case calculée
+    avec l'arithmétique de calculate_match_score : scores identiques au bit près.
+
+calculate_match_score reste la référence (ranking en boucle, tests manuels).
+"""
+
+import functools
+import numpy as np
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+def _b(val) -> str:
+    """Normalise n'importe quelle valeur en 'yes' ou 'no'."""
+    if isinstance(val, bool):
+        return "yes" if val else "no"
+    if val is None:
+        return "no"
+    return str(val).strip().lower()
+
+
+def _pref(val) -> Optional[str]:
+    """
+    Retourne 'yes', 'no', ou None si la préférence n'est pas spécifiée.
+    None = passager indifférent -> aucun impact sur le score.
+    """
+    if val is None:
+        return None
+    s = str(val).strip().lower()
+    if s in ("yes", "oui", "true", "1"):
+        return "yes"
+    if s in ("no", "non", "false", "0"):
+        return "no"
+    return None
+
+
+# Table des règles :
+# (pref_key, driver_key_or_special, want_driver_yes_when_pref_yes, points)
+#   want_driver_yes_when_pref_yes=True  : pref=oui -> on veut driver_field=yes
+#   want_driver_yes_when_pref_yes=False : pref=oui -> on veut driver_field=no
+#     ex: quiet_ride=oui -> talkative doit être no (driver calme)
+PREF_RULES = [
+    ("female_driver_pref", "_female",         True,  3.0),
+    ("smoking_ok",         "smoking_allowed", True,  2.0),
+    ("luggage_large",      "car_big",         True,  2.0),
+    ("pets_ok",            "pets_allowed",    True,  2.0),
+    ("quiet_ride",         "talkative",       False, 1.5),
+    ("radio_ok",           "radio_on",        True,  1.0),
+]
+
+N_RULES  = len(PREF_RULES)
+NO_SHIFT = N_RULES              # bits "no" juste au-dessus des bits "yes"
+
+
+def _driver_field(driver: Dict, key: str) -> str:
+    if key == "_female":
+        return "yes" if str(driver.get("sexe", "")).strip().lower() == "f" else "no"
+    return _b(driver.get(key))
+
+
+def calculate_match_score(driver: Dict, preferences: Dict) -> float:
+    """
+    Score [0, 1].
+    Pref spécifiée et respectée  -> +points
+    Pref spécifiée et violée     -> -points * 0.5 (pénalité modérée, pas d'élimination)
+    Pref absente (None)          -> ignorée
+    """
+    score      = 0.0
+    max_points = 0.0
+
+    for pref_key, driver_key, want_yes_when_pref_yes, points in PREF_RULES:
+        pref_val = _pref(preferences.get(pref_key))
+        if pref_val is None:
+            continue
+
+        max_points += points
+        driver_val  = _driver_field(driver, driver_key)
+
+        if pref_val == "yes":
+            wanted = "yes" if want_yes_when_pref_yes else "no"
+        else:
+            wanted = "no" if want_yes_when_pref_yes else "yes"
+
+        if driver_val == wanted:
+            score += points
+        else:
+            score -= points * 0.5
+
+    if max_points == 0:
+        return 0.5
+
+    normalized = (score + max_points) / (2 * max_points)
+    return max(0.0, min(1.0, normalized))
+
+
+# ── MASQUES DRIVERS ───────────────────────────────────────────────────────────
+def driver_pref_mask(driver: Dict) -> int:
+    mask = 0
+    for i, (_, driver_key, _, _) in enumerate(PREF_RULES):
+        value = _driver_field(driver, driver_key)
+        if value == "yes":
+            mask |= 1 << i
+        elif value == "no":
+            mask |= 1 << (NO_SHIFT + i)
+    return mask
+
+
+def driver_pref_masks(drivers: Iterable[Dict], count: int = -1) -> np.ndarray:
+    return np.fromiter((driver_pref_mask(d) for d in drivers), dtype=np.int32, count=count)
+
+
+# ── PRÉFÉRENCES COMPILÉES ─────────────────────────────────────────────────────
+class CompiledPrefs(NamedTuple):
+    code:     int   # base 3, chiffre i = règle i (0 absente, 1 yes, 2 no)
+    want_yes: int   # règles satisfaites par un attribut driver "yes"
+    want_no:  int   # règles satisfaites par un attribut driver "no"
+    active:   int   # nombre de préférences spécifiées
+
+
+def compile_preferences(preferences: Dict) -> CompiledPrefs:
+    code = want_yes = want_no = active = 0
+    for i, (pref_key, _, want_yes_when_pref_yes, _) in enumerate(PREF_RULES):
+        pref_val = _pref(preferences.get(pref_key))
+        if pref_val is None:
+            continue
+        active += 1
+        code   += (1 if pref_val == "yes" else 2) * 3 ** i
+        if (pref_val == "yes") == want_yes_when_pref_yes:
+            want_yes |= 1 << i
+        else:
+            want_no  |= 1 << i
+    return CompiledPrefs(code, want_yes, want_no, active)
+
+
+@functools.lru_cache(maxsize=None)
+def _score_row(code: int) -> np.ndarray:
+    """Ligne `code` de la table 729 x 64 : score pour chaque combinaison de règles satisfaites."""
+    active = [(code // 3 ** i) % 3 != 0 for i in range(N_RULES)]
+    row    = np.empty(1 << N_RULES, dtype=np.float64)
+    for match in range(1 << N_RULES):
+        score      = 0.0
+        max_points = 0.0
+        for i, (_, _, _, points) in enumerate(PREF_RULES):
+            if not active[i]:
+                continue
+            max_points += points
+            if match >> i & 1:
+                score += points
+            else:
+                score -= points * 0.5
+        if max_points == 0:
+            row[match] = 0.5
+        else:
+            row[match] = max(0.0, min(1.0, (score + max_points) / (2 * max_points)))
+    row.setflags(write=False)
+    return row
+
+
+def pref_scores(masks: np.ndarray, prefs: CompiledPrefs) -> np.ndarray:
+    """Scores de préférence de tous les candidats (masques alignés sur la liste)."""
+    match = (masks & prefs.want_yes) | ((masks >> NO_SHIFT) & prefs.want_no)
+    return _score_row(prefs.code)[match]
@@ -8,42 +8,82 @@ LOGIQUE PRÉFÉRENCES :
   non  → driver idéalement NE DOIT PAS avoir la feature (pref_score élevé si absent)
 """
 
+import asyncio
 import pickle
 import numpy as np
-import pandas as pd
 import math
 import json
 import os
 import threading
-import logging
-from lightfm import LightFM
-from lightfm.data import Dataset
+import itertools
+import time
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from scipy.optimize import minimize
-from scipy.spatial import KDTree
-
-logger = logging.getLogger(__name__)
+from service.ann_index import IVFIndex
+from service.driver_registry import PayloadDriverPool, RegistryDriverPool, driver_key, driver_registry
+from service import metrics
+from service.executor import executor_mode, recycle_process_pool, run_blocking
+from service.feedback_log import FeedbackLog, write_json_atomic
+from service.model_artifact import current_artifact_dir, load_artifact
+from service.pref_score import (
+    _pref, calculate_match_score, compile_preferences, driver_pref_masks, pref_scores,
+)
+from service.request_log import get_logger, ranking_dump_enabled, request_context
+from service.response_cache import fingerprint, response_cache
+from service.topk import top_k_indices, top_k_items
+from service.weights_worker import WeightOptimizerWorker
+
+logger = get_logger(__name__)
 load_dotenv()
 
-BASE_DIR      = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR    = os.path.join(BASE_DIR, "..", "model_real")
-WEIGHTS_PATH  = os.path.join(BASE_DIR, "..", "optimized_weights.json")
-FEEDBACK_PATH = os.path.join(BASE_DIR, "..", "feedback_history.json")
+BASE_DIR            = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR          = os.path.join(BASE_DIR, "..", "model_real")
+WEIGHTS_PATH        = os.path.join(BASE_DIR, "..", "optimized_weights.json")
+FEEDBACK_PATH       = os.path.join(BASE_DIR, "..", "feedback_history.json")   # ancien format, migré au chargement
+FEEDBACK_LOG_PATH   = os.path.join(BASE_DIR, "..", "feedback_history.jsonl")
+FEEDBACK_STATS_PATH = os.path.join(BASE_DIR, "..", "feedback_stats.json")
 
 FORCE_DEFAULT_WEIGHTS = False
 RETRIEVAL_TOP_K       = 20
 PREF_TOP_K            = 15
 
+# Scoring colonnaire NumPy pour l'étape de ranking.
+# VECTORIZED_SCORING=0 dans .env -> retour à l'ancienne boucle Python (rollout).
+# RECO_LAZY_INIT=1 : import du module sans chargement ; modèle + poids chargés
+# en arrière-plan par recommender.start() (startup FastAPI), /ready passe à 200
+# une fois le snapshot validé. 0 (défaut) : chargement à l'import, comme avant.
+LAZY_INIT = os.getenv("RECO_LAZY_INIT", "0").strip().lower() in ("1", "true", "yes", "on")
+
+# MODEL_FORMAT=auto (défaut) : artefact .npy si présent, sinon les 4 pickles
+# MODEL_FORMAT=pickle        : ancien chargement uniquement
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "auto").strip().lower()
+
+VECTORIZED_SCORING = os.getenv("VECTORIZED_SCORING", "1").strip().lower() not in ("0", "false", "no")
+
+# Filtre géo sans candidat : rayon doublé jusqu'à GEO_EXPAND_MIN_CANDIDATES
+# candidats ou GEO_EXPAND_MAX_KM (au-delà : aucune recommandation) au lieu de
+# scorer toute la flotte. Rayon retenu renvoyé dans la réponse (search_radius_km).
+GEO_EXPAND_MIN_CANDIDATES = int(os.getenv("GEO_EXPAND_MIN_CANDIDATES", 1))
+GEO_EXPAND_MAX_KM         = float(os.getenv("GEO_EXPAND_MAX_KM", 400))
+
+# RETRIEVAL_ANN=1 : index IVF (ann_index.py) construit avec chaque snapshot ;
+# retrieval_top_k ne rescore que la liste courte de l'index quand il y a au
+# moins ANN_MIN_CANDIDATES candidats (en dessous, le calcul exact est plus rapide).
+# ANN_NPROBE : cellules ouvertes par requête (rappel <-> latence, cf. bench_ann.py).
+RETRIEVAL_ANN      = os.getenv("RETRIEVAL_ANN", "0").strip().lower() in ("1", "true", "yes", "on")
+ANN_NPROBE         = int(os.getenv("ANN_NPROBE", 8))
+ANN_MIN_CANDIDATES = int(os.getenv("ANN_MIN_CANDIDATES", 5000))
+
 
 def reset_weights():
-    global _optimized_weights, _scores_history
+    global _optimized_weights
+    _weights_worker.invalidate()
     _optimized_weights = None
-    _scores_history    = []
-    for path in [WEIGHTS_PATH, FEEDBACK_PATH]:
-        if os.path.exists(path):
-            os.remove(path)
-    print("Reset complet — poids DEFAULT actifs")
+    _weights_changed()
+    _feedback_log.reset()
+    if os.path.exists(WEIGHTS_PATH):
+        os.remove(WEIGHTS_PATH)
+    logger.info("Reset complet — poids DEFAULT actifs")
 
 
 # ── GEO ───────────────────────────────────────────────────────────────────────
@@ -86,137 +126,99 @@ def max_driver_distance(trajet_distance_km: float, hours_until_departure: float)
     return min(dist_based, time_based)
 
 
-# ── PREF SCORE (scoring souple) ───────────────────────────────────────────────
-def _b(val) -> str:
-    """Normalise n'importe quelle valeur en 'yes' ou 'no'."""
-    if isinstance(val, bool):
-        return "yes" if val else "no"
-    if val is None:
-        return "no"
-    return str(val).strip().lower()
+# ── SCORING VECTORISÉ ─────────────────────────────────────────────────────────
+# Mêmes formules que haversine / score_distance / work_hour_match, appliquées
+# en une passe sur des colonnes NumPy construites une seule fois à partir de la
+# liste de candidats ; le score de préférences vient des masques (pref_score.py).
+def haversine_np(lat1: np.ndarray, lng1: np.ndarray, lat2: float, lng2: float) -> np.ndarray:
+    R    = 6371
+    dLat = np.radians(lat2 - lat1)
+    dLng = np.radians(lng2 - lng1)
+    a    = (np.sin(dLat / 2) ** 2 +
+            np.cos(np.radians(lat1)) *
+            np.cos(np.radians(lat2)) *
+            np.sin(dLng / 2) ** 2)
+    return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
 
-def _pref(val) -> Optional[str]:
-    """
-    Retourne 'yes', 'no', ou None si la préférence n'est pas spécifiée.
-    None = passager indifférent -> aucun impact sur le score.
-    """
-    if val is None:
-        return None
-    s = str(val).strip().lower()
-    if s in ("yes", "oui", "true", "1"):
-        return "yes"
-    if s in ("no", "non", "false", "0"):
-        return "no"
-    return None
-
-
-# Table des règles :
-# (pref_key, driver_key_or_special, want_driver_yes_when_pref_yes, points)
-#   want_driver_yes_when_pref_yes=True  : pref=oui -> on veut driver_field=yes
-#   want_driver_yes_when_pref_yes=False : pref=oui -> on veut driver_field=no
-#     ex: quiet_ride=oui -> talkative doit être no (driver calme)
-PREF_RULES = [
-    ("female_driver_pref", "_female",         True,  3.0),
-    ("smoking_ok",         "smoking_allowed", True,  2.0),
-    ("luggage_large",      "car_big",         True,  2.0),
-    ("pets_ok",            "pets_allowed",    True,  2.0),
-    ("quiet_ride",         "talkative",       False, 1.5),
-    ("radio_ok",           "radio_on",        True,  1.0),
-]
-
-
-def _driver_field(driver: Dict, key: str) -> str:
-    if key == "_female":
-        return "yes" if str(driver.get("sexe", "")).strip().lower() == "f" else "no"
-    return _b(driver.get(key))
-
-
-def calculate_match_score(driver: Dict, preferences: Dict) -> float:
-    """
-    Score [0, 1].
-    Pref spécifiée et respectée  -> +points
-    Pref spécifiée et violée     -> -points * 0.5 (pénalité modérée, pas d'élimination)
-    Pref absente (None)          -> ignorée
-    """
-    score      = 0.0
-    max_points = 0.0
+def score_distance_np(distance_km: np.ndarray, hours_until_departure: float) -> np.ndarray:
+    if   hours_until_departure < 2:   reference_km = 15
+    elif hours_until_departure < 24:  reference_km = 40
+    elif hours_until_departure < 168: reference_km = 80
+    else:                             reference_km = 200
+    return np.exp(-distance_km / reference_km)
 
-    for pref_key, driver_key, want_yes_when_pref_yes, points in PREF_RULES:
-        pref_val = _pref(preferences.get(pref_key))
-        if pref_val is None:
-            continue
 
-        max_points += points
-        driver_val  = _driver_field(driver, driver_key)
+def _work_shift_key(departure_hour: int) -> str:
+    """Colonne works_* testée par work_hour_match pour cette heure de départ."""
+    if 5  <= departure_hour < 12: return "works_morning"
+    if 12 <= departure_hour < 18: return "works_afternoon"
+    if 18 <= departure_hour < 22: return "works_evening"
+    return "works_night"
 
-        if pref_val == "yes":
-            wanted = "yes" if want_yes_when_pref_yes else "no"
-        else:
-            wanted = "no" if want_yes_when_pref_yes else "yes"
 
-        if driver_val == wanted:
-            score += points
-        else:
-            score -= points * 0.5
+def _is_number(val) -> bool:
+    return isinstance(val, (int, float))
 
-    if max_points == 0:
-        return 0.5
 
-    normalized = (score + max_points) / (2 * max_points)
-    return max(0.0, min(1.0, normalized))
+def _has_coords(lat, lng) -> bool:
+    """Position exploitable pour haversine : renseignée, non nulle, numérique et finie (NaN exclu)."""
+    return bool(lat and lng and _is_number(lat) and _is_number(lng)
+                and math.isfinite(lat) and math.isfinite(lng))
 
 
-def count_active_prefs(preferences: Dict) -> int:
-    return sum(
-        1 for pref_key, _, _, _ in PREF_RULES
-        if _pref(preferences.get(pref_key)) is not None
-    )
-
-
-# ── KD-TREE ───────────────────────────────────────────────────────────────────
-def build_spatial_index(drivers: List[Dict]) -> Tuple[Optional[KDTree], List[Dict], List[Dict]]:
-    geo_drivers, no_geo_drivers, coords = [], [], []
-    for driver in drivers:
-        lat, lng = driver.get("latitude"), driver.get("longitude")
-        if lat is not None and lng is not None:
-            try:
-                coords.append([float(lat), float(lng)])
-                geo_drivers.append(driver)
-            except (ValueError, TypeError):
-                no_geo_drivers.append(driver)
-        else:
-            no_geo_drivers.append(driver)
-    if not coords:
-        return None, [], no_geo_drivers
-    return KDTree(np.array(coords)), geo_drivers, no_geo_drivers
+def build_driver_columns(drivers: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Convertit la liste de drivers en colonnes NumPy (une seule passe).
+    has_geo reprend la condition du ranking (_has_coords) : lat/lng renseignées,
+    non nulles, numériques et finies (sinon la distance reste inconnue).
+    """
+    n    = len(drivers)
+    lats = [d.get("latitude")  for d in drivers]
+    lngs = [d.get("longitude") for d in drivers]
 
+    has_geo = np.fromiter(
+        (_has_coords(la, ln) for la, ln in zip(lats, lngs)),
+        dtype=bool, count=n,
+    )
+    lat = np.array([float(la) if ok else np.nan for la, ok in zip(lats, has_geo)], dtype=np.float64)
+    lng = np.array([float(ln) if ok else np.nan for ln, ok in zip(lngs, has_geo)], dtype=np.float64)
 
-def spatial_filter(tree, geo_drivers, lat, lng, max_km):
-    indices = tree.query_ball_point([lat, lng], max_km / 111.0)
-    return [geo_drivers[i] for i in indices]
+    columns = {
+        "has_geo": has_geo,
+        "lat":     lat,
+        "lng":     lng,
+        "rating":  np.array([d.get("avgRating") or 4.0 for d in drivers], dtype=np.float64),
+    }
+    for key in ("works_morning", "works_afternoon", "works_evening", "works_night"):
+        columns[key] = np.fromiter((bool(d.get(key)) for d in drivers), dtype=bool, count=n)
+    return columns
 
 
 # ── COLD START ────────────────────────────────────────────────────────────────
 def cold_start_by_preferences(
     drivers, preferences, departure_hour,
-    hours_until_departure, start_lat, start_lng, max_km, top_n=5
+    hours_until_departure, start_lat, start_lng, max_km, top_n=5,
+    candidates: Optional[List[Dict]] = None,
 ):
+    """
+    drivers    : liste de dicts ou pool (PayloadDriverPool / RegistryDriverPool).
+    candidates : drivers déjà filtrés géographiquement (batch) -> pas de 2e filtrage.
+    """
     geo_available = start_lat is not None and start_lng is not None
     scored = []
 
-    if geo_available:
-        tree, geo_drivers, no_geo_drivers = build_spatial_index(drivers)
-        candidates = (
-            spatial_filter(tree, geo_drivers, start_lat, start_lng, max_km) + no_geo_drivers
-            if tree else drivers
-        )
-    else:
-        candidates = drivers
+    pool = PayloadDriverPool(drivers) if isinstance(drivers, list) else drivers
+    if candidates is None:
+        if geo_available:
+            candidates = pool.within_radius(start_lat, start_lng, max_km)
+        else:
+            candidates = pool.all()
+    pref_all = pref_scores(pool.pref_masks(candidates), compile_preferences(preferences)).tolist()
 
-    for driver in candidates:
+    for driver, pref_score in zip(candidates, pref_all):
         dist_km = None
-        if geo_available and driver.get("latitude") and driver.get("longitude"):
+        if geo_available and _has_coords(driver.get("latitude"), driver.get("longitude")):
             try:
                 dist_km = haversine(driver["latitude"], driver["longitude"], start_lat, start_lng)
                 driver["distance_km"] = round(dist_km, 1)
@@ -225,7 +227,6 @@ def cold_start_by_preferences(
         if dist_km is not None and dist_km > max_km:
             continue
 
-        pref_score   = calculate_match_score(driver, preferences)
         dist_score   = score_distance(dist_km, hours_until_departure) if dist_km is not None else 0.5
         work_score   = work_hour_match(driver, departure_hour)
         rating_score = ((driver.get("avgRating") or 4.0) - 1) / 4
@@ -246,11 +247,15 @@ def cold_start_by_preferences(
         driver["dist_score"]  = round(dist_score, 3) if dist_km is not None else None
         scored.append(driver)
 
-    scored.sort(key=lambda d: d.get("final_score", 0), reverse=True)
+    top = top_k_items(scored, top_n, key=lambda d: d.get("final_score", 0))
     for d in scored:
         d.pop("final_score", None)
-    print(f"Cold-start: {len(scored)} drivers scorés | Top {min(top_n, len(scored))} retournés")
-    return scored[:top_n]
+    metrics.CANDIDATES.observe(len(top), stage="returned")
+    logger.info(
+        "Cold-start: %d drivers scorés | Top %d retournés", len(scored), len(top),
+        extra={"mode": "cold_start", "scored": len(scored), "returned": len(top)},
+    )
+    return top
 
 
 # ── NORMALISATION LIGHTFM ─────────────────────────────────────────────────────
@@ -275,46 +280,73 @@ WORK_HOUR_PENALTY = 0.15
 DEFAULT_WEIGHTS_GEO    = np.array([0.35, 0.45, 0.15, 0.05])
 DEFAULT_WEIGHTS_NO_GEO = np.array([0.40, 0.50, 0.00, 0.10])
 
-_scores_history: List[Dict]              = []
+MIN_FEEDBACK_SAMPLES = 50
+
+# Journal append-only + X^T X / X^T y cumulés (voir feedback_log.py)
+_feedback_log = FeedbackLog(
+    FEEDBACK_LOG_PATH, FEEDBACK_STATS_PATH, WEIGHT_KEYS,
+    legacy_path=FEEDBACK_PATH, persist=not FORCE_DEFAULT_WEIGHTS,
+)
 _optimized_weights: Optional[np.ndarray] = None
 _feedback_lock = threading.Lock()
+_weight_state_loaded = False
 
-if not FORCE_DEFAULT_WEIGHTS:
-    if os.path.exists(FEEDBACK_PATH):
-        try:
-            with open(FEEDBACK_PATH, "r") as f:
-                raw_history = json.load(f)
-            valid = [e for e in raw_history if set(WEIGHT_KEYS).issubset(set(e.keys()))]
-            _scores_history = valid
-        except Exception as e:
-            print(f"[WARNING] Feedbacks: {e}")
+# Version des poids actifs : fait partie de la clé du cache des réponses
+_weights_generation = itertools.count(1)
+_weights_version    = 0
 
-    if os.path.exists(WEIGHTS_PATH):
+
+def _weights_changed():
+    global _weights_version
+    _weights_version = next(_weights_generation)
+    response_cache.clear()
+
+
+def load_weight_state():
+    """Journal des feedbacks + poids SLSQP sauvegardés. Idempotent (import eager ou warm-up lazy)."""
+    global _optimized_weights, _weight_state_loaded
+    with _feedback_lock:
+        if _weight_state_loaded:
+            return
+        _weight_state_loaded = True
+        if FORCE_DEFAULT_WEIGHTS:
+            logger.info("FORCE_DEFAULT_WEIGHTS=True -> poids DEFAULT actifs")
+            return
         try:
-            with open(WEIGHTS_PATH, "r") as f:
-                loaded = json.load(f)
-            loaded_arr = np.array(loaded)
-            if len(loaded_arr) == len(WEIGHT_KEYS) and loaded_arr.max() <= 0.95:
-                _optimized_weights = loaded_arr
-            else:
-                print("Poids invalides -> DEFAULT utilisé")
+            _feedback_log.load()
         except Exception as e:
-            print(f"[WARNING] Poids: {e}")
-else:
-    print("FORCE_DEFAULT_WEIGHTS=True -> poids DEFAULT actifs")
+            logger.warning("Feedbacks: %s", e)
+
+        if os.path.exists(WEIGHTS_PATH):
+            try:
+                with open(WEIGHTS_PATH, "r") as f:
+                    loaded = json.load(f)
+                loaded_arr = np.array(loaded)
+                if len(loaded_arr) == len(WEIGHT_KEYS) and loaded_arr.max() <= 0.95:
+                    _optimized_weights = loaded_arr
+                    _weights_changed()
+                else:
+                    logger.warning("Poids invalides -> DEFAULT utilisé")
+            except Exception as e:
+                logger.warning("Poids: %s", e)
+
+
+if not LAZY_INIT:
+    load_weight_state()
 
 
 def _try_optimize_weights() -> Optional[np.ndarray]:
-    if len(_scores_history) < 50:
+    """SLSQP sur les statistiques suffisantes : coût indépendant de la taille d'historique."""
+    xtx, xty, yty, n = _feedback_log.sufficient_stats()
+    if n < MIN_FEEDBACK_SAMPLES:
         return None
+    from scipy.optimize import minimize      # ~0.6 s d'import : seulement au premier run
     try:
-        df = pd.DataFrame(_scores_history)
-        X  = df[WEIGHT_KEYS].values
-        y  = df["target"].values
+        # mean((X w - y)^2) développé sur X^T X, X^T y, y^T y
         result = minimize(
-            lambda w: np.mean((X @ w - y) ** 2),
+            lambda w: (w @ xtx @ w - 2 * w @ xty + yty) / n,
             DEFAULT_WEIGHTS_GEO.copy(),
-            jac=lambda w: 2 * X.T @ (X @ w - y) / len(y),
+            jac=lambda w: 2 * (xtx @ w - xty) / n,
             method="SLSQP",
             bounds=[WEIGHT_BOUNDS[k] for k in WEIGHT_KEYS],
             constraints=[
@@ -326,37 +358,101 @@ def _try_optimize_weights() -> Optional[np.ndarray]:
         if not result.success or result.x.max() > 0.95:
             return None
         w_norm = result.x
-        print(f"Poids optimisés: {dict(zip(WEIGHT_KEYS, w_norm.round(3)))}")
-        if not FORCE_DEFAULT_WEIGHTS:
-            with open(WEIGHTS_PATH, "w") as f:
-                json.dump(w_norm.tolist(), f)
+        logger.info("Poids optimisés", extra={"weights": dict(zip(WEIGHT_KEYS, w_norm.round(3).tolist()))})
         return w_norm
     except Exception as e:
-        print(f"[WARNING] Optimisation: {e}")
+        logger.warning("Optimisation: %s", e)
         return None
 
 
-def add_feedback_to_buffer(scores: Dict, real_rating: float) -> bool:
+def _publish_weights(weights: np.ndarray):
+    """
+    Appelé par le worker. Nouveau tableau figé puis swap de référence :
+    un /recommend en cours garde l'ancien vecteur, le suivant lit le nouveau.
+    """
     global _optimized_weights
+    if FORCE_DEFAULT_WEIGHTS:
+        return
+    published = np.array(weights, dtype=np.float64)
+    published.setflags(write=False)
+    _optimized_weights = published
+    _weights_changed()
+    try:
+        write_json_atomic(WEIGHTS_PATH, published.tolist())
+    except Exception as e:
+        logger.warning("Sauvegarde poids: %s", e)
+
+
+# Optimisation hors requête, regroupée par rafales (voir weights_worker.py)
+_weights_worker = WeightOptimizerWorker(_try_optimize_weights, _publish_weights)
+
+
+def weights_status() -> Dict:
+    return {
+        "source":   "optimized" if _optimized_weights is not None else "default",
+        "weights":  None if _optimized_weights is None else dict(zip(WEIGHT_KEYS, _optimized_weights.tolist())),
+        "feedback": len(_feedback_log),
+        **_weights_worker.status(),
+    }
+
+
+def add_feedback_to_buffer(scores: Dict, real_rating: float) -> bool:
+    load_weight_state()
     target = max(0.0, min(1.0, (real_rating - 1) / 4))
     entry  = {**{k: scores.get(k) or 0.0 for k in WEIGHT_KEYS}, "target": target}
     with _feedback_lock:
-        _scores_history.append(entry)
-        if not FORCE_DEFAULT_WEIGHTS:
-            try:
-                with open(FEEDBACK_PATH, "w") as f:
-                    json.dump(_scores_history, f)
-            except Exception as e:
-                print(f"[WARNING] Sauvegarde feedback: {e}")
-        print(f"Feedback | note={real_rating} -> target={target:.3f} | buffer={len(_scores_history)}/50")
-        if len(_scores_history) >= 50:
-            new_weights = _try_optimize_weights()
-            if new_weights is not None and not FORCE_DEFAULT_WEIGHTS:
-                _optimized_weights = new_weights
+        try:
+            n = _feedback_log.append(entry)
+        except Exception as e:
+            logger.warning("Sauvegarde feedback: %s", e)
+            n = len(_feedback_log)
+        logger.info(
+            "Feedback | note=%s -> target=%.3f | buffer=%d/%d", real_rating, target, n, MIN_FEEDBACK_SAMPLES,
+        )
+    if n >= MIN_FEEDBACK_SAMPLES and not FORCE_DEFAULT_WEIGHTS:
+        _weights_worker.notify()
     return True
 
 
+# ── CACHE DE SCORES LIGHTFM ───────────────────────────────────────────────────
+class RequestScoreCache:
+    """
+    Scores LightFM bruts d'UNE requête, par (version modèle, source) puis par
+    index driver. Le ranking travaille sur un sous-ensemble des candidats du
+    retrieval : il relit ces scores au lieu de relancer la prédiction, puis ne
+    normalise que sur le sous-ensemble (normalize_lightfm_scores inchangé).
+    Stockage dense (un vecteur par source, NaN = inconnu) : get / put restent
+    vectorisés, même quand /recommend/batch y dépose des centaines de colonnes.
+    """
+
+    def __init__(self, n_items: int):
+        self.n_items = n_items
+        self._scores: Dict[tuple, np.ndarray] = {}
+
+    def get(self, model_version, source, indices: List[int]) -> Optional[np.ndarray]:
+        known = self._scores.get((model_version, source))
+        if known is None:
+            return None
+        values = known[np.asarray(indices, dtype=np.intp)]
+        if np.isnan(values).any():
+            return None
+        return values.astype(np.float32)
+
+    def put(self, model_version, source, indices: List[int], scores: np.ndarray):
+        known = self._scores.get((model_version, source))
+        if known is None:
+            known = self._scores[(model_version, source)] = np.full(self.n_items, np.nan)
+        known[np.asarray(indices, dtype=np.intp)] = scores
+
+
 # ── RECOMMENDER CLASS ─────────────────────────────────────────────────────────
+_model_generation = itertools.count(1)
+
+
+def new_model_version() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_model_generation)}"
+
+
 class Recommender:
 
     PREF_COLS = [
@@ -364,17 +460,50 @@ class Recommender:
         "pets_ok", "luggage_large", "female_driver_pref",
     ]
 
-    def __init__(self):
-        self.model         = self._load(os.path.join(MODELS_DIR, "lightfm_model_real.pkl"))
-        self.dataset       = self._load(os.path.join(MODELS_DIR, "dataset_real.pkl"))
-        self.item_features = self._load(os.path.join(MODELS_DIR, "item_features_real.pkl"))
-        self.user_features = self._load(os.path.join(MODELS_DIR, "user_features_real.pkl"))
-        self._refresh_mappings()
+    def __init__(self, version: Optional[str] = None):
+        self.version          = version or new_model_version()
+        self.artifact_version = None
+        self.model = self.dataset = self.item_features = self.user_features = None
+        self.user_embeddings  = None
+
+        artifact_dir = current_artifact_dir(MODELS_DIR) if MODEL_FORMAT != "pickle" else None
+        if artifact_dir is None or not self._load_artifact(artifact_dir):
+            self._load_pickles()
+        self.loaded = self.item_repr is not None and self.user_embeddings is not None
+        self._precompute_user_embedding_table()
+        self._build_ann_index()
+
+    def _load_artifact(self, path: str) -> bool:
+        """Artefact .npy mappé en mémoire (cf. model_artifact.py) ; False -> repli sur les pickles."""
         try:
-            self.drivers_df = pd.read_csv(os.path.join(MODELS_DIR, "drivers_processed.csv"))
-            print(f"{len(self.drivers_df)} drivers chargés")
-        except Exception:
-            self.drivers_df = None
+            art = load_artifact(path)
+        except Exception as e:
+            logger.warning("Artefact %s illisible: %s", path, e)
+            return False
+        self.user_id_map        = art["user_id_map"]
+        self.user_feature_map   = art["user_feature_map"]
+        self.item_id_map        = art["item_id_map"]
+        self.item_feature_map   = art["item_feature_map"]
+        self.index_to_driver_id = {v: k for k, v in self.item_id_map.items()}
+        self.item_features      = art["item_features"]
+        self.user_features      = art["user_features"]
+        self.user_embeddings    = art["user_embeddings"]
+        self.item_repr          = art["item_repr"]
+        self.item_repr_bias     = art["item_repr_bias"]
+        self.user_repr          = art["user_repr"]
+        self.user_repr_bias     = art["user_repr_bias"]
+        self.artifact_version   = art["manifest"]["version"]
+        logger.info("Artefact modèle %s chargé (mmap)", self.artifact_version)
+        return True
+
+    def _load_pickles(self):
+        self.model           = self._load(os.path.join(MODELS_DIR, "lightfm_model_real.pkl"))
+        self.dataset         = self._load(os.path.join(MODELS_DIR, "dataset_real.pkl"))
+        self.item_features   = self._load(os.path.join(MODELS_DIR, "item_features_real.pkl"))
+        self.user_features   = self._load(os.path.join(MODELS_DIR, "user_features_real.pkl"))
+        self.user_embeddings = None if self.model is None else self.model.user_embeddings
+        self._refresh_mappings()
+        self._precompute_item_representations()
 
     def _refresh_mappings(self):
         if self.dataset:
@@ -389,6 +518,35 @@ class Recommender:
             self.user_feature_map = self.item_feature_map = {}
             self.index_to_driver_id = {}
 
+    def _precompute_item_representations(self):
+        """
+        model.item_embeddings / item_biases sont indexés par FEATURE, pas par driver :
+        un driver = combinaison (normalisée) de son identité + ses attributs via
+        item_features. On compose une fois au chargement :
+          item_repr      (n_drivers, n_components) = item_features @ item_embeddings
+          item_repr_bias (n_drivers,)              = item_features @ item_biases
+        Scorer un ensemble de candidats = un produit matrice-vecteur indexé.
+        """
+        self.item_repr      = None
+        self.item_repr_bias = None
+        self.user_repr      = None
+        self.user_repr_bias = None
+        if self.model is None:
+            return
+        try:
+            biases, embeddings  = self.model.get_item_representations(self.item_features)
+            self.item_repr      = np.ascontiguousarray(embeddings, dtype=np.float32)
+            self.item_repr_bias = np.ascontiguousarray(biases, dtype=np.float32)
+        except Exception as e:
+            logger.warning("Représentations drivers: %s", e)
+        # Idem côté passagers connus (chemin collaboratif, batch compris)
+        try:
+            biases, embeddings  = self.model.get_user_representations(self.user_features)
+            self.user_repr      = np.ascontiguousarray(embeddings, dtype=np.float32)
+            self.user_repr_bias = np.ascontiguousarray(biases, dtype=np.float32)
+        except Exception as e:
+            logger.warning("Représentations passagers: %s", e)
+
     def _load(self, path: str):
         try:
             with open(path, "rb") as f:
@@ -398,64 +556,246 @@ class Recommender:
                 import joblib
                 return joblib.load(path)
             except Exception as e:
-                print(f"[LOAD] {path}: {e}")
+                logger.warning("Chargement %s: %s", path, e)
                 return None
 
-    def reload(self):
-        self.__init__()
-        print("Modèle rechargé")
+    def _build_ann_index(self):
+        """Index IVF sur item_repr (RETRIEVAL_ANN=1 et flotte assez grande), sinon None."""
+        self.ann_index = None
+        if not RETRIEVAL_ANN or self.item_repr is None or len(self.item_repr) < ANN_MIN_CANDIDATES:
+            return
+        t0 = time.perf_counter()
+        try:
+            self.ann_index = IVFIndex(self.item_repr, self.item_repr_bias)
+        except Exception as e:
+            logger.warning("Index ANN: %s", e)
+            return
+        logger.info(
+            "Index ANN construit : %d drivers, %d cellules (%.0f ms)",
+            self.ann_index.n, self.ann_index.nlist, (time.perf_counter() - t0) * 1000,
+        )
+
+    def validate(self):
+        """Lève ValueError si le snapshot n'est pas servable ; sert aussi de warm-up."""
+        if not self.loaded or not self.item_id_map:
+            raise ValueError("modèle ou dataset introuvable")
+        if self.item_repr is None or len(self.item_repr) < len(self.item_id_map):
+            raise ValueError("représentations drivers incohérentes avec item_id_map")
+        if self.user_emb_table is None:
+            raise ValueError("table des embeddings passager absente")
+        probe = list(range(min(8, len(self.item_id_map))))
+        if probe:
+            scores = self.predict_with_dynamic_features({col: "yes" for col in self.PREF_COLS}, probe)
+            if scores is None or not np.all(np.isfinite(scores)):
+                raise ValueError("scores LightFM non finis")
+            if self.user_id_map:
+                raw = self.predict_collaborative(next(iter(self.user_id_map)), probe)
+                if raw is None or not np.all(np.isfinite(raw)):
+                    raise ValueError("predict collaboratif non fini")
+
+    # Chaque colonne de PREF_COLS vaut non spécifiée / yes / no : 3^6 = 729 états.
+    PREF_CODE_VALUES = {None: 0, "yes": 1, "no": 2}
+    N_PREF_STATES    = 3 ** len(PREF_COLS)
+
+    def pref_code(self, preferences: Dict) -> int:
+        """Préférences -> entier base 3 dans [0, 729) (chiffre i = PREF_COLS[i])."""
+        code = 0
+        for col in reversed(self.PREF_COLS):
+            code = code * 3 + self.PREF_CODE_VALUES[_pref(preferences.get(col))]
+        return code
+
+    def _precompute_user_embedding_table(self):
+        """
+        Table des 729 embeddings passager composés (moyenne des features
+        col:yes / col:no actives), construite au chargement du modèle — donc
+        reconstruite par reload(). Ligne = pref_code, nb_features = 0 -> aucune
+        feature connue (predict dynamique impossible).
+        """
+        self.user_emb_table    = None
+        self.user_emb_features = None
+        if self.user_embeddings is None:
+            return
+
+        n_rows, n_components = self.user_embeddings.shape
+        digits = np.indices((3,) * len(self.PREF_COLS)).reshape(len(self.PREF_COLS), -1)[::-1]
+        table  = np.zeros((self.N_PREF_STATES, n_components), dtype=np.float32)
+        counts = np.zeros(self.N_PREF_STATES, dtype=np.int32)
+
+        # Même ordre d'accumulation (PREF_COLS) que l'ancienne boucle par requête
+        for i, col in enumerate(self.PREF_COLS):
+            for pref_val, digit in (("yes", 1), ("no", 2)):
+                feat_idx = self.user_feature_map.get(f"{col}:{pref_val}")
+                if feat_idx is None or feat_idx >= n_rows:
+                    continue
+                rows = digits[i] == digit
+                table[rows] += self.user_embeddings[feat_idx]
+                counts[rows] += 1
+
+        active = counts > 0
+        table[active] /= counts[active, None].astype(np.float32)
+        self.user_emb_table    = table
+        self.user_emb_features = counts
+
+    def compose_user_embedding(self, preferences: Dict) -> Optional[Tuple[np.ndarray, int]]:
+        """(user_emb, nb_features) lu dans la table précalculée, ou None si aucune feature."""
+        if self.user_emb_table is None:
+            return None
+        code = self.pref_code(preferences)
+        nb_features = int(self.user_emb_features[code])
+        if nb_features == 0:
+            return None
+        return self.user_emb_table[code], nb_features
 
     def predict_with_dynamic_features(
         self,
         preferences: Dict,
         candidate_indices: List[int],
+        score_cache: Optional["RequestScoreCache"] = None,
     ) -> Optional[np.ndarray]:
         """
         Injecte les features passager dynamiquement dans l'espace LightFM.
         col:yes si pref=oui, col:no si pref=non.
         Normalise par nb features pour éviter l'effet amplitude.
+        score_cache : scores bruts déjà calculés dans la même requête (retrieval -> ranking).
         """
-        if self.model is None or not candidate_indices:
+        if not self.loaded or not candidate_indices:
             return None
 
-        n_components  = self.model.user_embeddings.shape[1]
-        user_emb      = np.zeros(n_components, dtype=np.float32)
-        features_used = []
-
-        for col in self.PREF_COLS:
-            pref_val = _pref(preferences.get(col))
-            if pref_val is None:
-                continue
-            feat_name = f"{col}:{pref_val}"
+        source = ("dynamic", self.pref_code(preferences))
+        if score_cache is not None:
+            cached = score_cache.get(self.version, source, candidate_indices)
+            if cached is not None:
+                logger.debug("predict_dynamic: scores repris du retrieval")
+                return cached
 
-            if feat_name in self.user_feature_map:
-                feat_idx = self.user_feature_map[feat_name]
-                if feat_idx < self.model.user_embeddings.shape[0]:
-                    user_emb += self.model.user_embeddings[feat_idx]
-                    features_used.append(feat_name)
+        composed = self.compose_user_embedding(preferences)
+        if composed is None:
+            logger.debug("predict_dynamic: aucune feature trouvée dans user_feature_map")
+            return None
+        user_emb, nb_features = composed
 
-        if not features_used:
-            print("   predict_dynamic: aucune feature trouvée dans user_feature_map")
+        if self.item_repr is None:
+            logger.debug("predict_dynamic: représentations drivers indisponibles")
             return None
 
-        user_emb /= len(features_used)
+        idx    = np.asarray(candidate_indices, dtype=np.intp)
+        scores = self.item_repr_bias[idx] + self.item_repr[idx] @ user_emb
+        if score_cache is not None:
+            score_cache.put(self.version, source, candidate_indices, scores)
 
-        scores = np.array([
-            float(self.model.item_biases[j]) + float(np.dot(user_emb, self.model.item_embeddings[j]))
-            for j in candidate_indices
-        ], dtype=np.float32)
+        logger.debug("predict_dynamic: %d features -> scores calculés", nb_features)
+        return scores
 
-        print(f"   predict_dynamic: {len(features_used)} features -> scores calculés")
+    def predict_collaborative(
+        self,
+        passenger_key: str,
+        candidate_indices: List[int],
+        score_cache: Optional["RequestScoreCache"] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Score collaboratif d'un passager connu : même formule que model.predict
+        (biais + produit scalaire des représentations), sur les matrices précalculées.
+        """
+        if not self.loaded or not candidate_indices or passenger_key not in self.user_id_map:
+            return None
+
+        source = ("collab", passenger_key)
+        if score_cache is not None:
+            cached = score_cache.get(self.version, source, candidate_indices)
+            if cached is not None:
+                return cached
+
+        user_index = self.user_id_map[passenger_key]
+        if self.user_repr is None or self.item_repr is None:
+            if self.model is None:
+                return None
+            scores = self.model.predict(
+                user_index,
+                np.array(candidate_indices),
+                user_features=self.user_features,
+                item_features=self.item_features,
+            )
+        else:
+            idx    = np.asarray(candidate_indices, dtype=np.intp)
+            scores = (self.item_repr_bias[idx] + self.item_repr[idx] @ self.user_repr[user_index]
+                      + self.user_repr_bias[user_index])
+        if score_cache is not None:
+            score_cache.put(self.version, source, candidate_indices, scores)
         return scores
 
+    def seed_batch_scores(
+        self,
+        score_cache: "RequestScoreCache",
+        passengers: List[Tuple[str, Dict]],
+        candidate_indices: List[int],
+    ):
+        """
+        /recommend/batch : calcule en UN produit matriciel (candidats x passagers)
+        les scores de tout le lot et les dépose dans score_cache. retrieval_top_k
+        et le ranking de chaque passager les relisent ensuite comme en mode unitaire.
+          - prefs avec features connues -> une colonne par pref_code distinct
+          - sinon passager connu        -> colonne collaborative
+        """
+        if self.item_repr is None or not candidate_indices:
+            return
+        idx      = np.asarray(candidate_indices, dtype=np.intp)
+        item_emb = self.item_repr[idx]
+        item_b   = self.item_repr_bias[idx][:, None]
+
+        codes, collab = set(), set()
+        for passenger_key, preferences in passengers:
+            code = self.pref_code(preferences)
+            if self.user_emb_features[code] > 0:
+                codes.add(code)
+            elif passenger_key in self.user_id_map:
+                collab.add(passenger_key)
+
+        if codes:
+            codes  = sorted(codes)
+            scores = item_b + item_emb @ self.user_emb_table[codes].T
+            for j, code in enumerate(codes):
+                score_cache.put(self.version, ("dynamic", code), candidate_indices, scores[:, j])
+
+        if collab and self.user_repr is not None:
+            collab = sorted(collab)
+            users  = np.array([self.user_id_map[k] for k in collab], dtype=np.intp)
+            scores = item_b + item_emb @ self.user_repr[users].T + self.user_repr_bias[users]
+            for j, passenger_key in enumerate(collab):
+                score_cache.put(self.version, ("collab", passenger_key), candidate_indices, scores[:, j])
+
+    def _ann_shortlist(
+        self,
+        passenger_key: str,
+        candidate_indices: List[int],
+        k: int,
+        preferences: Optional[Dict],
+    ) -> Optional[List[int]]:
+        """
+        Candidats des cellules IVF les plus proches de l'embedding qui scorera
+        la requête (même priorité que retrieval_top_k : dynamique puis
+        collaboratif), restreints aux candidats géo. None -> calcul exact.
+        """
+        composed = self.compose_user_embedding(preferences) if preferences is not None else None
+        if composed is not None:
+            query = composed[0]
+        elif passenger_key in self.user_id_map and self.user_repr is not None:
+            query = self.user_repr[self.user_id_map[passenger_key]]
+        else:
+            return None
+        allowed = np.zeros(self.ann_index.n, dtype=bool)
+        allowed[np.asarray(candidate_indices, dtype=np.intp)] = True
+        shortlist = self.ann_index.search(query, ANN_NPROBE, allowed, min_results=k)
+        return np.sort(shortlist).tolist()
+
     def retrieval_top_k(
         self,
         passenger_key: str,
         candidate_driver_ids: List[str],
         k: int,
         preferences: Dict = None,
+        score_cache: Optional["RequestScoreCache"] = None,
     ) -> List[str]:
-        if not self.model:
+        if not self.loaded:
             return candidate_driver_ids
 
         candidate_indices = [
@@ -466,47 +806,362 @@ class Recommender:
         if not candidate_indices:
             return candidate_driver_ids
 
+        if self.ann_index is not None and len(candidate_indices) >= ANN_MIN_CANDIDATES:
+            shortlist = self._ann_shortlist(passenger_key, candidate_indices, k, preferences)
+            if shortlist is not None:
+                metrics.CANDIDATES.observe(len(shortlist), stage="retrieval_ann")
+                logger.debug("Retrieval ANN: %d -> liste courte %d", len(candidate_indices), len(shortlist))
+                candidate_indices = shortlist
+
         try:
             raw_scores = None
 
             # Priorité 1 : content-based dynamique
             if preferences is not None:
-                raw_scores = self.predict_with_dynamic_features(preferences, candidate_indices)
+                raw_scores = self.predict_with_dynamic_features(
+                    preferences, candidate_indices, score_cache,
+                )
                 if raw_scores is not None:
-                    print("   Retrieval: content-based dynamique")
+                    logger.debug("Retrieval: content-based dynamique")
 
             # Priorité 2 : collaboratif classique
             if raw_scores is None and passenger_key in self.user_id_map:
-                user_index = self.user_id_map[passenger_key]
-                raw_scores = self.model.predict(
-                    user_index,
-                    np.array(candidate_indices),
-                    user_features=self.user_features,
-                    item_features=self.item_features,
-                )
-                print("   Retrieval: collaboratif")
+                raw_scores = self.predict_collaborative(passenger_key, candidate_indices, score_cache)
+                logger.debug("Retrieval: collaboratif")
 
             if raw_scores is None:
+                metrics.FALLBACKS.inc(kind="retrieval_unscored")
                 return candidate_driver_ids
 
         except Exception as e:
-            print(f"[WARNING] predict retrieval: {e}")
+            logger.warning("predict retrieval: %s", e)
+            metrics.FALLBACKS.inc(kind="retrieval_error")
             return candidate_driver_ids
 
-        top_k_positions  = np.argsort(raw_scores)[::-1][:k]
+        top_k_positions  = top_k_indices(raw_scores, k)
         top_k_driver_ids = [
             self.index_to_driver_id[candidate_indices[pos]]
             for pos in top_k_positions
             if candidate_indices[pos] in self.index_to_driver_id
         ]
-        print(f"   Retrieval LightFM: {len(candidate_indices)} -> top {len(top_k_driver_ids)}")
+        logger.debug("Retrieval LightFM: %d -> top %d", len(candidate_indices), len(top_k_driver_ids))
         return top_k_driver_ids
 
 
-recommender = Recommender()
+class RecommenderHandle:
+    """
+    Pointe vers le snapshot Recommender en service.
+
+    reload() charge un NOUVEAU snapshot dans un thread, le valide et le chauffe
+    (matrices précalculées + predict d'essai), puis remplace la référence en une
+    seule affectation. Les requêtes en cours gardent l'ancien snapshot jusqu'au
+    bout (get_recommendations lit `current` une seule fois) : pas de mélange
+    ancien modèle / nouveaux mappings. En cas d'échec, l'ancien reste en service.
+
+    lazy=True : rien n'est chargé à la construction. start() lance le warm-up
+    (poids + snapshot validé) en arrière-plan ; `current` attend sa fin.
+    """
+
+    def __init__(self, lazy: bool = False):
+        self._current: Optional[Recommender] = None
+        self._lock                 = threading.Lock()
+        self._ready                = threading.Event()
+        self._loading_version: Optional[str] = None
+        self.last_error: Optional[str]       = None
+        self.loaded_at: Optional[float]      = None
+        self.warmup_s: Optional[float]       = None
+        self._validated  = False
+        self._started_at = time.time()
+        if not lazy:
+            self._load_eager()
+
+    def _load_eager(self):
+        """Chargement à la construction : même validation que _load_and_swap, /ready en 503 si elle échoue."""
+        snapshot = Recommender()
+        try:
+            snapshot.validate()
+        except Exception as e:
+            self.last_error = f"{snapshot.version}: {e}"
+            logger.warning("Chargement initial %s invalide: %s", snapshot.version, e)
+            self._install(snapshot, validated=False)
+        else:
+            self._install(snapshot, validated=True)
+
+    def _install(self, snapshot: Recommender, validated: bool):
+        self._current   = snapshot
+        self._validated = validated
+        self.loaded_at  = time.time()
+        response_cache.clear()
+        self._ready.set()
+
+    @property
+    def current(self) -> Recommender:
+        if self._current is None:
+            self.wait()
+        return self._current
+
+    def __getattr__(self, name):
+        # Compatibilité : recommender.item_id_map, recommender.model, ...
+        return getattr(self.current, name)
+
+    # ── WARM-UP (mode lazy) ───────────────────────────────────────────────────
+    def start(self):
+        """Lance le premier chargement en arrière-plan s'il n'a pas déjà eu lieu."""
+        with self._lock:
+            if self._current is not None or self._loading_version is not None:
+                return
+            self._loading_version = new_model_version()
+            threading.Thread(
+                target=self._load_and_swap,
+                args=(self._loading_version,),
+                name="model-warmup",
+                daemon=True,
+            ).start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self.start()
+        return self._ready.wait(timeout)
+
+    async def wait_async(self):
+        """Attente du premier chargement sans bloquer la boucle (no-op une fois chargé)."""
+        if not self._ready.is_set():
+            await asyncio.to_thread(self.wait)
+
+    def is_ready(self) -> bool:
+        """Un snapshot chargé est en service (et validé, pour un chargement en arrière-plan)."""
+        return self._current is not None and self._current.loaded and self._validated
+
+    def reload(self) -> Dict:
+        """Lance le chargement en arrière-plan (un seul à la fois) et rend la main."""
+        with self._lock:
+            if self._loading_version is None:
+                self._loading_version = new_model_version()
+                threading.Thread(
+                    target=self._load_and_swap,
+                    args=(self._loading_version,),
+                    name=f"model-reload-{self._loading_version}",
+                    daemon=True,
+                ).start()
+            serving = None if self._current is None else self._current.version
+            return {"status": "loading", "version": self._loading_version, "serving": serving}
+
+    def _load_and_swap(self, version: str):
+        first_load = self._current is None
+        snapshot   = None
+        try:
+            load_weight_state()
+            snapshot = Recommender(version=version)
+            snapshot.validate()
+        except Exception as e:
+            self.last_error = f"{version}: {e}"
+            if not first_load:
+                logger.warning("Reload %s rejeté, %s reste en service: %s", version, self._current.version, e)
+            else:
+                # Rien en service : on sert quand même ce snapshot, comme le
+                # chargement à l'import le faisait ; /ready reste en 503.
+                logger.warning("Chargement initial %s invalide: %s", version, e)
+                if snapshot is not None:
+                    self._install(snapshot, validated=False)
+                else:
+                    self._ready.set()      # débloque les requêtes en attente (erreur 500)
+        else:
+            self._install(snapshot, validated=True)
+            self.last_error = None
+            if first_load:
+                self.warmup_s = round(self.loaded_at - self._started_at, 3)
+            recycle_process_pool()
+            logger.info("Modèle %s -> %s", "chargé" if first_load else "rechargé", version)
+        finally:
+            with self._lock:
+                self._loading_version = None
+
+    def status(self) -> Dict:
+        current = self._current
+        return {
+            "version":    None if current is None else current.version,
+            "artifact":   None if current is None else current.artifact_version,
+            "ready":      self.is_ready(),
+            "loaded_at":  None if self.loaded_at is None else time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "warmup_s":   self.warmup_s,
+            "loading":    self._loading_version,
+            "last_error": self.last_error,
+        }
+
+
+recommender = RecommenderHandle(lazy=LAZY_INIT)
+
+
+# ── RANKING FIN ───────────────────────────────────────────────────────────────
+def rank_candidates_loop(
+    drivers, preferences, lightfm_scores_map, interaction_counts, weights,
+    geo_available, start_lat, start_lng, departure_hour, hours_until_departure,
+) -> List[Dict]:
+    """Ancien chemin driver par driver — conservé derrière VECTORIZED_SCORING=0."""
+    w_lfm, w_pref, w_dist, w_rating = weights
+    retrieval_candidates = drivers
+    scored_drivers = []
+    for driver in retrieval_candidates:
+        driver_id = f"D{driver['id']}"
+        dist_km   = None
+
+        if geo_available and _has_coords(driver.get("latitude"), driver.get("longitude")):
+            try:
+                dist_km = haversine(driver["latitude"], driver["longitude"], start_lat, start_lng)
+                driver["distance_km"] = round(dist_km, 1)
+            except Exception:
+                pass
+
+        dist_score    = score_distance(dist_km, hours_until_departure) if dist_km is not None else 0.5
+        lightfm_score = lightfm_scores_map.get(driver_id, 0.5)
+        pref_score    = calculate_match_score(driver, preferences)
+        work_score    = work_hour_match(driver, departure_hour)
+        rating_score  = ((driver.get("avgRating") or 4.0) - 1) / 4
+
+        # Score hybride pondéré — cœur du système
+        final_score = (
+            w_lfm    * lightfm_score +
+            w_pref   * pref_score    +
+            w_dist   * dist_score    +
+            w_rating * rating_score
+        )
+
+        # Pénalité horaire
+        if work_score < 1.0:
+            final_score -= WORK_HOUR_PENALTY
+
+        # Pénalités pref souples — ranking bas, pas d'élimination
+        if pref_score < 0.30:
+            final_score *= 0.20
+        elif pref_score < 0.50:
+            final_score *= 0.55
+        elif pref_score < 0.70:
+            final_score *= 0.80
+
+        # Pénalité diversité
+        nb = interaction_counts.get(str(driver["id"]), 0)
+        if   nb >= 5: final_score *= 0.80
+        elif nb >= 3: final_score *= 0.90
+
+        driver["final_score"] = round(max(0.0, final_score), 4)
+        driver["work_match"]  = work_score == 1.0
+        driver["dist_score"]  = round(dist_score, 3) if dist_km is not None else None
+        driver["_scores"]     = {
+            "lightfm": round(lightfm_score, 3),
+            "pref":    round(pref_score, 3),
+            "dist":    round(dist_score, 3),
+            "work_ok": work_score == 1.0,
+            "rating":  round(rating_score, 3),
+        }
+        scored_drivers.append(driver)
+    return scored_drivers
+
+
+def rank_candidates_vectorized(
+    drivers, preferences, lightfm_scores_map, interaction_counts, weights,
+    geo_available, start_lat, start_lng, departure_hour, hours_until_departure,
+    pref_masks: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """
+    Même score hybride que rank_candidates_loop, calculé sur des colonnes NumPy.
+    Les drivers reçoivent les mêmes champs (distance_km, final_score, work_match,
+    dist_score, _scores) et sont renvoyés dans l'ordre d'entrée.
+    pref_masks : masques de préférences alignés sur drivers (sinon calculés ici).
+    """
+    if not drivers:
+        return []
+
+    w_lfm, w_pref, w_dist, w_rating = weights
+    n       = len(drivers)
+    columns = build_driver_columns(drivers)
+
+    has_dist = columns["has_geo"] if geo_available else np.zeros(n, dtype=bool)
+    dist_km  = np.full(n, np.nan)
+    if has_dist.any():
+        try:
+            dist_km[has_dist] = haversine_np(
+                columns["lat"][has_dist], columns["lng"][has_dist], start_lat, start_lng,
+            )
+        except Exception:
+            has_dist = np.zeros(n, dtype=bool)
+
+    dist_score    = np.where(
+        has_dist,
+        score_distance_np(np.where(has_dist, dist_km, 0.0), hours_until_departure),
+        0.5,
+    )
+    lightfm_score = np.array(
+        [lightfm_scores_map.get(f"D{d['id']}", 0.5) for d in drivers], dtype=np.float64,
+    )
+    if pref_masks is None:
+        pref_masks = driver_pref_masks(drivers, n)
+    pref_score    = pref_scores(pref_masks, compile_preferences(preferences))
+    work_ok       = columns[_work_shift_key(departure_hour)]
+    rating_score  = (columns["rating"] - 1) / 4
+
+    # Score hybride pondéré — cœur du système
+    final_score = (
+        w_lfm    * lightfm_score +
+        w_pref   * pref_score    +
+        w_dist   * dist_score    +
+        w_rating * rating_score
+    )
+
+    # Pénalité horaire
+    final_score = np.where(work_ok, final_score, final_score - WORK_HOUR_PENALTY)
+
+    # Pénalités pref souples — ranking bas, pas d'élimination
+    final_score = final_score * np.select(
+        [pref_score < 0.30, pref_score < 0.50, pref_score < 0.70], [0.20, 0.55, 0.80], 1.0,
+    )
+
+    # Pénalité diversité
+    nb = np.array([interaction_counts.get(str(d["id"]), 0) for d in drivers])
+    final_score = final_score * np.select([nb >= 5, nb >= 3], [0.80, 0.90], 1.0)
+    final_score = np.maximum(final_score, 0.0)
+
+    # Retour aux floats Python pour des round() et un JSON identiques à la boucle
+    for driver, geo, d_km, f, lfm, pref, dist, ok, rating in zip(
+        drivers, has_dist.tolist(), dist_km.tolist(), final_score.tolist(),
+        lightfm_score.tolist(), pref_score.tolist(), dist_score.tolist(),
+        work_ok.tolist(), rating_score.tolist(),
+    ):
+        if geo:
+            driver["distance_km"] = round(d_km, 1)
+        driver["final_score"] = round(f, 4)
+        driver["work_match"]  = ok
+        driver["dist_score"]  = round(dist, 3) if geo else None
+        driver["_scores"]     = {
+            "lightfm": round(lfm, 3),
+            "pref":    round(pref, 3),
+            "dist":    round(dist, 3),
+            "work_ok": ok,
+            "rating":  round(rating, 3),
+        }
+    return list(drivers)
 
 
 # ── POINT D'ENTRÉE PRINCIPAL ──────────────────────────────────────────────────
+def _response_cache_key(passenger_id, preferences, trajet, drivers, interaction_counts, top_n, driver_ids) -> Tuple:
+    """
+    Empreinte de la requête + versions modèle / poids qui l'ont servie, et
+    version du registre drivers quand la flotte vient de lui (sync, delta,
+    positions live) — un payload `drivers` est déjà dans l'empreinte.
+    """
+    request = None
+    if response_cache.enabled:
+        request = fingerprint(
+            passenger_id       = f"P{str(passenger_id).lstrip('P')}",
+            preferences        = preferences or {},
+            trajet             = trajet or {},
+            drivers            = drivers or None,
+            interaction_counts = interaction_counts or {},
+            top_n              = top_n,
+            driver_ids         = None if driver_ids is None else sorted({driver_key(i) for i in driver_ids}),
+        )
+    registry_version = None if drivers else driver_registry.version
+    return request, recommender.current.version, _weights_version, registry_version
+
+
 async def get_recommendations(
     passenger_id: str,
     preferences: Dict = None,
@@ -514,13 +1169,67 @@ async def get_recommendations(
     drivers: List[Dict] = None,
     interaction_counts: Dict = None,
     top_n: int = 5,
-) -> List[Dict]:
+    driver_ids: Optional[List] = None,
+) -> "Recommendations":
+    """
+    Point d'entrée async : le calcul (recommend) tourne dans l'executor configuré
+    (service/executor.py), jamais sur la boucle uvicorn.
+    En mode process, les workers ne voient ni le registre ni les poids mis à jour
+    après le fork : on leur passe la flotte éligible et les poids courants.
+    Les logs du calcul portent le request_id de la requête (cf. request_log.py).
+    Requête identique (même modèle, mêmes poids) dans les RESPONSE_CACHE_TTL_S
+    secondes : réponse servie par response_cache (cf. response_cache.py).
+    """
+    with request_context(), metrics.timed_request("recommend"):
+        await recommender.wait_async()
+        cache_key = _response_cache_key(
+            passenger_id, preferences, trajet, drivers, interaction_counts, top_n, driver_ids,
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Réponse servie par le cache")
+            return cached
+
+        if executor_mode() == "process" and not drivers:
+            drivers = RegistryDriverPool(driver_registry, driver_ids).all()
+        result = await run_blocking(
+            recommend,
+            passenger_id       = passenger_id,
+            preferences        = preferences,
+            trajet             = trajet,
+            drivers            = drivers,
+            interaction_counts = interaction_counts,
+            top_n              = top_n,
+            driver_ids         = driver_ids,
+            optimized_weights  = _optimized_weights,
+        )
+        response_cache.put(cache_key, result)
+        return result
 
-    preferences        = preferences        or {}
-    trajet             = trajet             or {}
-    all_drivers        = drivers            or []
-    interaction_counts = interaction_counts or {}
 
+async def get_recommendations_batch(
+    passengers: List[Dict],
+    trajet: Dict = None,
+    drivers: List[Dict] = None,
+    driver_ids: Optional[List] = None,
+) -> List["Recommendations"]:
+    """Version lot de get_recommendations (même executor, mêmes règles en mode process)."""
+    with request_context(), metrics.timed_request("batch"):
+        await recommender.wait_async()
+        if executor_mode() == "process" and not drivers:
+            drivers = RegistryDriverPool(driver_registry, driver_ids).all()
+        return await run_blocking(
+            recommend_batch,
+            passengers        = passengers,
+            trajet            = trajet,
+            drivers           = drivers,
+            driver_ids        = driver_ids,
+            optimized_weights = _optimized_weights,
+        )
+
+
+def parse_trajet(trajet: Dict) -> Dict:
+    """Contexte géo / horaire commun à toute une requête (unitaire ou batch)."""
     start_lat     = trajet.get("startLat")
     start_lng     = trajet.get("startLng")
     geo_available = start_lat is not None and start_lng is not None
@@ -541,198 +1250,355 @@ async def get_recommendations(
         except Exception:
             pass
 
-    max_km          = max_driver_distance(trajet_distance_km, hours_until_departure)
-    nb_active_prefs = count_active_prefs(preferences)
+    return {
+        "start_lat":             start_lat,
+        "start_lng":             start_lng,
+        "geo_available":         geo_available,
+        "departure_hour":        departure_hour,
+        "hours_until_departure": hours_until_departure,
+        "max_km":                max_driver_distance(trajet_distance_km, hours_until_departure),
+    }
+
+
+def make_driver_pool(drivers: Optional[List[Dict]], driver_ids: Optional[List]):
+    return (
+        PayloadDriverPool(drivers) if drivers
+        else RegistryDriverPool(driver_registry, driver_ids)
+    )
 
-    if not all_drivers:
-        return []
+
+class Recommendations(list):
+    """Drivers recommandés + rayon de recherche effectivement utilisé (km, None sans géo)."""
+
+    def __init__(self, drivers=(), search_radius_km: Optional[float] = None):
+        super().__init__(drivers)
+        self.search_radius_km = search_radius_km
+
+
+def geo_filter(pool, ctx: Dict) -> Tuple[List[Dict], Optional[float]]:
+    """
+    ÉTAPE 1 — drivers dans le rayon (+ sans géo) et rayon retenu.
+    Moins de GEO_EXPAND_MIN_CANDIDATES : rayon doublé, plafonné à
+    GEO_EXPAND_MAX_KM (une zone vide au plafond reste vide).
+    """
+    if not ctx["geo_available"]:
+        return pool.all(), None
+    radius     = ctx["max_km"]
+    candidates = pool.within_radius(ctx["start_lat"], ctx["start_lng"], radius)
+    while len(candidates) < GEO_EXPAND_MIN_CANDIDATES and radius < GEO_EXPAND_MAX_KM:
+        radius     = min(radius * 2, GEO_EXPAND_MAX_KM)
+        candidates = pool.within_radius(ctx["start_lat"], ctx["start_lng"], radius)
+    if radius > ctx["max_km"]:
+        metrics.FALLBACKS.inc(kind="geo_radius_expanded")
+        logger.warning(
+            "Rayon géo élargi : %s -> %s km (%d candidats)", ctx["max_km"], radius, len(candidates),
+            extra={"radius_km": ctx["max_km"], "search_radius_km": radius},
+        )
+    if not candidates:
+        metrics.FALLBACKS.inc(kind="geo_radius_cap")
+    return candidates, radius
+
+
+def recommend(
+    passenger_id: str,
+    preferences: Dict = None,
+    trajet: Dict = None,
+    drivers: List[Dict] = None,
+    interaction_counts: Dict = None,
+    top_n: int = 5,
+    driver_ids: Optional[List] = None,
+    optimized_weights: Optional[np.ndarray] = None,
+) -> "Recommendations":
+    """
+    drivers           : flotte envoyée dans le payload (ancien contrat Express).
+    driver_ids        : sinon, ids éligibles lus dans driver_registry (None = toute la flotte).
+    optimized_weights : poids SLSQP à utiliser (None -> poids DEFAULT).
+    """
+    timer              = metrics.StageTimer()
+    preferences        = preferences        or {}
+    interaction_counts = interaction_counts or {}
+    pool = make_driver_pool(drivers, driver_ids)
+    ctx  = parse_trajet(trajet or {})
+    timer.lap("parse")
+
+    if not len(pool):
+        return Recommendations([], ctx["max_km"] if ctx["geo_available"] else None)
 
     passenger_key = f"P{str(passenger_id).lstrip('P')}"
+    # Un seul snapshot pour toute la requête, même si un reload swap entre-temps
+    snapshot = recommender.current
+    metrics.CANDIDATES.observe(len(pool), stage="pool")
 
     # ── Cold start ────────────────────────────────────────────────────────────
-    if passenger_key not in recommender.user_id_map:
-        print(f"   Mode: cold-start (passager {passenger_key} inconnu du modèle)")
-        return cold_start_by_preferences(
-            all_drivers, preferences, departure_hour,
-            hours_until_departure, start_lat, start_lng, max_km, top_n,
+    if passenger_key not in snapshot.user_id_map:
+        logger.debug("Mode: cold-start (passager %s inconnu du modèle)", passenger_key)
+        metrics.REQUESTS.inc(path="cold_start")
+        result = cold_start_by_preferences(
+            pool, preferences, ctx["departure_hour"], ctx["hours_until_departure"],
+            ctx["start_lat"], ctx["start_lng"], ctx["max_km"], top_n,
         )
+        timer.lap("cold_start")
+        return Recommendations(result, ctx["max_km"] if ctx["geo_available"] else None)
+    metrics.REQUESTS.inc(path="warm")
 
     # ══════════════════════════════════════════════════════════════════════════
-    # ÉTAPE 1 — FILTRAGE GÉO
+    # ÉTAPE 1 — FILTRAGE GÉO (rayon élargi progressivement si vide)
     # ══════════════════════════════════════════════════════════════════════════
-    if geo_available:
-        tree, geo_drivers, no_geo_drivers = build_spatial_index(all_drivers)
-        if tree is not None:
-            geo_candidates = spatial_filter(tree, geo_drivers, start_lat, start_lng, max_km)
-            geo_candidates = [
-                d for d in geo_candidates
-                if haversine(d["latitude"], d["longitude"], start_lat, start_lng) <= max_km
-            ]
-            all_candidates = geo_candidates + no_geo_drivers
-        else:
-            all_candidates = all_drivers
-    else:
-        all_candidates = all_drivers
-
-    print(f"   Geo-filtre: {len(all_drivers)} -> {len(all_candidates)} candidats (rayon {max_km} km)")
+    all_candidates, radius = geo_filter(pool, ctx)
+    logger.debug("Geo-filtre: %d -> %d candidats (rayon %s km)", len(pool), len(all_candidates), radius)
+    metrics.CANDIDATES.observe(len(all_candidates), stage="geo")
+    timer.lap("geo_filter")
 
     if not all_candidates:
-        print("   [WARN] Aucun candidat géo — fallback tous les drivers")
-        all_candidates = all_drivers
+        logger.warning("Aucun candidat géo à %s km", radius, extra={"search_radius_km": radius})
+        return Recommendations([], radius)
+
+    return Recommendations(rank_known_passenger(
+        snapshot, passenger_key, preferences, all_candidates, ctx,
+        interaction_counts, top_n, optimized_weights,
+        pref_masks=pool.pref_masks(all_candidates),
+    ), radius)
+
+
+def recommend_batch(
+    passengers: List[Dict],
+    trajet: Dict = None,
+    drivers: List[Dict] = None,
+    driver_ids: Optional[List] = None,
+    optimized_weights: Optional[np.ndarray] = None,
+) -> List["Recommendations"]:
+    """
+    N passagers (passenger_id, preferences, interaction_counts, top_n) contre
+    la même flotte et le même trajet : filtrage géo fait une fois, scores
+    LightFM de tout le lot en un produit matriciel (seed_batch_scores), puis
+    retrieval / ranking par passager sur des copies des drivers.
+    """
+    timer = metrics.StageTimer()
+    pool  = make_driver_pool(drivers, driver_ids)
+    ctx   = parse_trajet(trajet or {})
+    timer.lap("parse")
+    if not len(pool) or not passengers:
+        base_radius = ctx["max_km"] if ctx["geo_available"] else None
+        return [Recommendations([], base_radius) for _ in passengers]
+
+    snapshot           = recommender.current
+    candidates, radius = geo_filter(pool, ctx)
+    base_radius        = ctx["max_km"] if ctx["geo_available"] else None
+    metrics.CANDIDATES.observe(len(pool), stage="pool")
+    metrics.CANDIDATES.observe(len(candidates), stage="geo")
+    timer.lap("geo_filter")
+    logger.debug(
+        "Batch: %d passagers | Geo-filtre: %d -> %d candidats (rayon %s km)",
+        len(passengers), len(pool), len(candidates), radius,
+    )
+
+    requests = [
+        (f"P{str(p['passenger_id']).lstrip('P')}", p.get("preferences") or {}, p)
+        for p in passengers
+    ]
+    score_cache = RequestScoreCache(len(snapshot.item_id_map))
+    warm_masks  = pool.pref_masks(candidates)  # encodés une fois pour tout le lot
+    snapshot.seed_batch_scores(
+        score_cache,
+        [(key, prefs) for key, prefs, _ in requests if key in snapshot.user_id_map],
+        [snapshot.item_id_map[f"D{d['id']}"] for d in candidates if f"D{d['id']}" in snapshot.item_id_map],
+    )
+    timer.lap("batch_seed")
+
+    results = []
+    for passenger_key, preferences, p in requests:
+        top_n = p.get("top_n") or 5
+        if passenger_key not in snapshot.user_id_map:
+            metrics.REQUESTS.inc(path="cold_start")
+            # Chrono propre au passager : ne pas écraser les étapes du batch
+            passenger_timer = metrics.StageTimer()
+            # Cold-start : filtre au rayon de base, comme recommend()
+            results.append(Recommendations(cold_start_by_preferences(
+                pool, preferences, ctx["departure_hour"], ctx["hours_until_departure"],
+                ctx["start_lat"], ctx["start_lng"], ctx["max_km"], top_n,
+                candidates=[dict(d) for d in candidates],
+            ), base_radius))
+            passenger_timer.lap("cold_start")
+        elif not candidates:
+            metrics.REQUESTS.inc(path="warm")
+            results.append(Recommendations([], radius))
+        else:
+            metrics.REQUESTS.inc(path="warm")
+            results.append(Recommendations(rank_known_passenger(
+                snapshot, passenger_key, preferences, candidates, ctx,
+                p.get("interaction_counts") or {}, top_n, optimized_weights,
+                score_cache=score_cache, copy_drivers=True, pref_masks=warm_masks,
+            ), radius))
+    return results
+
+
+def rank_known_passenger(
+    snapshot: "Recommender",
+    passenger_key: str,
+    preferences: Dict,
+    all_candidates: List[Dict],
+    ctx: Dict,
+    interaction_counts: Dict,
+    top_n: int,
+    optimized_weights: Optional[np.ndarray],
+    score_cache: Optional[RequestScoreCache] = None,
+    copy_drivers: bool = False,
+    pref_masks: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """
+    ÉTAPES 2-3 pour un passager connu du modèle.
+    copy_drivers : annoter des copies (batch : les candidats sont partagés).
+    pref_masks   : masques de préférences alignés sur all_candidates (pref_score.py).
+    """
+    start_lat, start_lng  = ctx["start_lat"], ctx["start_lng"]
+    geo_available         = ctx["geo_available"]
+    departure_hour        = ctx["departure_hour"]
+    hours_until_departure = ctx["hours_until_departure"]
+    compiled_prefs        = compile_preferences(preferences)
+    nb_active_prefs       = compiled_prefs.active
+    if pref_masks is None:
+        pref_masks = driver_pref_masks(all_candidates, len(all_candidates))
+    timer                 = metrics.StageTimer()
 
     # ══════════════════════════════════════════════════════════════════════════
     # ÉTAPE 2 — RETRIEVAL LIGHTFM (content-based + collaboratif)
     # ══════════════════════════════════════════════════════════════════════════
     candidate_driver_ids = [f"D{d['id']}" for d in all_candidates]
 
-    top_k_lfm_ids = set(recommender.retrieval_top_k(
+    # Scores LightFM bruts partagés entre retrieval et ranking (même requête)
+    if score_cache is None:
+        score_cache = RequestScoreCache(len(snapshot.item_id_map))
+    top_k_lfm_ids = set(snapshot.retrieval_top_k(
         passenger_key,
         candidate_driver_ids,
         k=RETRIEVAL_TOP_K,
         preferences=preferences,
+        score_cache=score_cache,
     ))
+    metrics.CANDIDATES.observe(len(top_k_lfm_ids), stage="retrieval_lightfm")
+    timer.lap("retrieval")
 
     # Union LightFM + top pref_score pour garantir les meilleurs matchs de prefs
     if nb_active_prefs > 0:
-        pref_scored = sorted(
-            all_candidates,
-            key=lambda d: calculate_match_score(d, preferences),
-            reverse=True,
-        )
-        top_k_pref_ids = {f"D{d['id']}" for d in pref_scored[:PREF_TOP_K]}
-        print(f"   Pref top-{PREF_TOP_K} ajoutés au pool")
+        pref_top = top_k_indices(pref_scores(pref_masks, compiled_prefs), PREF_TOP_K)
+        top_k_pref_ids = {f"D{all_candidates[i]['id']}" for i in pref_top}
+        logger.debug("Pref top-%d ajoutés au pool", PREF_TOP_K)
     else:
         top_k_pref_ids = set()
 
     merged_ids           = top_k_lfm_ids | top_k_pref_ids
-    retrieval_candidates = [d for d in all_candidates if f"D{d['id']}" in merged_ids]
+    kept                 = [i for i, d in enumerate(all_candidates) if f"D{d['id']}" in merged_ids]
+    retrieval_candidates = [all_candidates[i] for i in kept]
+    retrieval_masks      = pref_masks[kept]
 
     if not retrieval_candidates:
         retrieval_candidates = all_candidates
-        print("   [FALLBACK] Retrieval vide -> tous les candidats géo")
+        retrieval_masks      = pref_masks
+        logger.info("Retrieval vide -> tous les candidats géo")
+        metrics.FALLBACKS.inc(kind="retrieval_empty")
 
-    print(f"   Retrieval final: {len(retrieval_candidates)} candidats")
+    logger.debug("Retrieval final: %d candidats", len(retrieval_candidates))
+    metrics.CANDIDATES.observe(len(retrieval_candidates), stage="retrieval")
+    if copy_drivers:
+        retrieval_candidates = [dict(d) for d in retrieval_candidates]
+    timer.lap("pref_topk")
 
     # ══════════════════════════════════════════════════════════════════════════
     # ÉTAPE 3 — RANKING FIN (score hybride pondéré)
     # ══════════════════════════════════════════════════════════════════════════
-    global _optimized_weights
-    if FORCE_DEFAULT_WEIGHTS or _optimized_weights is None:
+    if FORCE_DEFAULT_WEIGHTS or optimized_weights is None:
         w = DEFAULT_WEIGHTS_GEO if geo_available else DEFAULT_WEIGHTS_NO_GEO
         weight_source = "DEFAULT"
     else:
-        w = _optimized_weights
+        w = optimized_weights
         weight_source = "SLSQP optimisé"
 
-    w_lfm, w_pref, w_dist, w_rating = w
-
     candidate_indices_ret = [
-        recommender.item_id_map[f"D{d['id']}"]
+        snapshot.item_id_map[f"D{d['id']}"]
         for d in retrieval_candidates
-        if f"D{d['id']}" in recommender.item_id_map
+        if f"D{d['id']}" in snapshot.item_id_map
     ]
 
     lightfm_scores_map = {}
-    if candidate_indices_ret and recommender.model:
+    if candidate_indices_ret and snapshot.loaded:
         try:
-            raw = recommender.predict_with_dynamic_features(preferences, candidate_indices_ret)
+            raw = snapshot.predict_with_dynamic_features(
+                preferences, candidate_indices_ret, score_cache,
+            )
             if raw is None:
                 raise ValueError("predict_dynamic retourne None")
             norm = normalize_lightfm_scores(raw)
             lightfm_scores_map = {
-                recommender.index_to_driver_id[candidate_indices_ret[i]]: float(norm[i])
+                snapshot.index_to_driver_id[candidate_indices_ret[i]]: float(norm[i])
                 for i in range(len(candidate_indices_ret))
-                if candidate_indices_ret[i] in recommender.index_to_driver_id
+                if candidate_indices_ret[i] in snapshot.index_to_driver_id
             }
-            print("   Ranking: content-based dynamique")
+            logger.debug("Ranking: content-based dynamique")
         except Exception as e:
-            print(f"   Ranking: content-based échoué ({e}) -> fallback collaboratif")
+            logger.debug("Ranking: content-based échoué (%s) -> fallback collaboratif", e)
             try:
-                user_index = recommender.user_id_map[passenger_key]
-                raw = recommender.model.predict(
-                    user_index,
-                    np.array(candidate_indices_ret),
-                    user_features=recommender.user_features,
-                    item_features=recommender.item_features,
+                raw = snapshot.predict_collaborative(
+                    passenger_key, candidate_indices_ret, score_cache,
                 )
+                if raw is None:
+                    raise ValueError("passager inconnu du modèle")
                 norm = normalize_lightfm_scores(raw)
                 lightfm_scores_map = {
-                    recommender.index_to_driver_id[candidate_indices_ret[i]]: float(norm[i])
+                    snapshot.index_to_driver_id[candidate_indices_ret[i]]: float(norm[i])
                     for i in range(len(candidate_indices_ret))
-                    if candidate_indices_ret[i] in recommender.index_to_driver_id
+                    if candidate_indices_ret[i] in snapshot.index_to_driver_id
                 }
-                print("   Ranking: collaboratif")
+                logger.debug("Ranking: collaboratif")
+                metrics.FALLBACKS.inc(kind="ranking_collaborative")
             except Exception as e2:
-                print(f"[WARNING] Fallback ranking échoué: {e2}")
-
-    scored_drivers = []
-    for driver in retrieval_candidates:
-        driver_id = f"D{driver['id']}"
-        dist_km   = None
-
-        if geo_available and driver.get("latitude") and driver.get("longitude"):
-            try:
-                dist_km = haversine(driver["latitude"], driver["longitude"], start_lat, start_lng)
-                driver["distance_km"] = round(dist_km, 1)
-            except Exception:
-                pass
-
-        dist_score    = score_distance(dist_km, hours_until_departure) if dist_km is not None else 0.5
-        lightfm_score = lightfm_scores_map.get(driver_id, 0.5)
-        pref_score    = calculate_match_score(driver, preferences)
-        work_score    = work_hour_match(driver, departure_hour)
-        rating_score  = ((driver.get("avgRating") or 4.0) - 1) / 4
-
-        # Score hybride pondéré — cœur du système
-        final_score = (
-            w_lfm    * lightfm_score +
-            w_pref   * pref_score    +
-            w_dist   * dist_score    +
-            w_rating * rating_score
-        )
-
-        # Pénalité horaire
-        if work_score < 1.0:
-            final_score -= WORK_HOUR_PENALTY
-
-        # Pénalités pref souples — ranking bas, pas d'élimination
-        if pref_score < 0.30:
-            final_score *= 0.20
-        elif pref_score < 0.50:
-            final_score *= 0.55
-        elif pref_score < 0.70:
-            final_score *= 0.80
-
-        # Pénalité diversité
-        nb = interaction_counts.get(str(driver["id"]), 0)
-        if   nb >= 5: final_score *= 0.80
-        elif nb >= 3: final_score *= 0.90
-
-        driver["final_score"] = round(max(0.0, final_score), 4)
-        driver["work_match"]  = work_score == 1.0
-        driver["dist_score"]  = round(dist_score, 3) if dist_km is not None else None
-        driver["_scores"]     = {
-            "lightfm": round(lightfm_score, 3),
-            "pref":    round(pref_score, 3),
-            "dist":    round(dist_score, 3),
-            "work_ok": work_score == 1.0,
-            "rating":  round(rating_score, 3),
-        }
-        scored_drivers.append(driver)
+                logger.warning("Fallback ranking échoué: %s", e2)
+                metrics.FALLBACKS.inc(kind="ranking_no_lightfm")
+    timer.lap("ranking_lightfm")
+
+    ranking_inputs = dict(
+        drivers               = retrieval_candidates,
+        preferences           = preferences,
+        lightfm_scores_map    = lightfm_scores_map,
+        interaction_counts    = interaction_counts,
+        weights               = w,
+        geo_available         = geo_available,
+        start_lat             = start_lat,
+        start_lng             = start_lng,
+        departure_hour        = departure_hour,
+        hours_until_departure = hours_until_departure,
+    )
+    if VECTORIZED_SCORING:
+        scored_drivers = rank_candidates_vectorized(**ranking_inputs, pref_masks=retrieval_masks)
+    else:
+        scored_drivers = rank_candidates_loop(**ranking_inputs)
+    timer.lap("ranking")
+
+    # Sélection des top_n (partition, cf. topk.py) au lieu d'un tri complet
+    top = top_k_items(scored_drivers, top_n, key=lambda d: d.get("final_score", 0))
+    timer.lap("sort")
+
+    # Dump détaillé : LOG_RANKING_DUMP=1 + LOG_LEVEL=DEBUG uniquement
+    if ranking_dump_enabled(logger):
+        logger.debug("Ranking détaillé", extra={
+            "weights_source": weight_source,
+            "weights":        dict(zip(("lfm", "pref", "dist", "rating"), np.round(w, 2).tolist())),
+            "active_prefs":   nb_active_prefs,
+            "top": [
+                {"id": d["id"], "lfm": round(d["_scores"]["lightfm"], 3), "pref": round(d["_scores"]["pref"], 3),
+                 "dist": round(d["_scores"]["dist"], 3), "work_ok": d["_scores"]["work_ok"],
+                 "score": round(d["final_score"], 4)}
+                for d in top
+            ],
+        })
+        timer.lap("ranking_dump")
 
-    print(f"\nPoids [{weight_source}]: lfm={w_lfm:.2f} pref={w_pref:.2f} dist={w_dist:.2f} rating={w_rating:.2f}")
-    print(f"   Prefs actives: {nb_active_prefs}")
-    print("-" * 60)
-    for d in sorted(scored_drivers, key=lambda x: x.get("final_score", 0), reverse=True)[:top_n]:
-        s = d["_scores"]
-        work_flag = "OK" if s["work_ok"] else f"NON -{WORK_HOUR_PENALTY}"
-        print(f"   Driver {d['id']} | lfm={s['lightfm']:.3f} pref={s['pref']:.3f} "
-              f"dist={s['dist']:.3f} work={work_flag} -> {d['final_score']:.4f}")
-    print("-" * 60 + "\n")
-
-    scored_drivers.sort(key=lambda d: d.get("final_score", 0), reverse=True)
     for driver in scored_drivers:
         driver.pop("final_score", None)
+    metrics.CANDIDATES.observe(len(top), stage="returned")
 
-    print(f"{len(scored_drivers)} drivers rankés | Top {min(top_n, len(scored_drivers))} retournés")
-    return scored_drivers[:top_n]
+    logger.info(
+        "%d drivers rankés | Top %d retournés", len(scored_drivers), len(top),
+        extra={"mode": "ranking", "passenger": passenger_key, "weights_source": weight_source,
+               "ranked": len(scored_drivers), "returned": len(top)},
+    )
+    return top
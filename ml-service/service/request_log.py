@@ -0,0 +1,207 @@
+"""
+request_log.py — LOGS STRUCTURÉS, ÉCHANTILLONNÉS, AVEC ID DE CORRÉLATION
+
+Avant : get_recommendations, retrieval_top_k, predict_with_dynamic_features,
+cold_start_by_preferences et les routes faisaient une dizaine de print() par
+requête, dont un dump trié du top-N. Chaque print écrit sur stdout depuis le
+thread de la requête : sous charge, un stdout lent (pipe docker, journald)
+bloque le calcul.
+
+Maintenant :
+  - logging standard, un logger par module ; traces d'étapes en DEBUG, un
+    résumé par requête en INFO, anomalies en WARNING ;
+  - chaque requête porte un request_id (header X-Request-ID, sinon généré),
+    propagé aux workers de l'executor et ajouté à chaque ligne ;
+  - LOG_SAMPLE_RATE : fraction des requêtes dont les lignes < WARNING sont
+    émises. Tirage une fois par requête : une requête retenue est tracée en
+    entier, les WARNING passent toujours ;
+  - LOG_RANKING_DUMP=1 : dump détaillé du classement (DEBUG, désactivé par défaut) ;
+  - le thread de la requête ne fait que poser l'enregistrement dans une file,
+    l'écriture sur stdout se fait dans un thread dédié (QueueListener).
+
+LOG_FORMAT=json (défaut) : une ligne JSON par événement, champs `extra` inclus.
+LOG_FORMAT=text          : lisible en développement.
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from typing import Callable, Optional, Tuple
+
+LOG_LEVEL        = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT       = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_SAMPLE_RATE  = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+LOG_RANKING_DUMP = os.getenv("LOG_RANKING_DUMP", "0").strip().lower() in ("1", "true", "yes", "on")
+
+# Loggers du service (propagate=False : pas de doublon si l'hôte configure la racine)
+NAMESPACES = ("service", "routes", "app")
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+_sampled:    contextvars.ContextVar = contextvars.ContextVar("log_sampled", default=True)
+
+_settings = {"sample_rate": LOG_SAMPLE_RATE, "ranking_dump": LOG_RANKING_DUMP}
+_handler:  Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_sink:     Optional[logging.Handler] = None
+
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts":         self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level":      record.levelname,
+            "logger":     record.name,
+            "request_id": getattr(record, "request_id", None),
+            "msg":        record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line   = super().format(record)
+        fields = _extra_fields(record)
+        return line + "".join(f" {k}={v}" for k, v in fields.items()) if fields else line
+
+
+class _RequestFilter(logging.Filter):
+    """Exécuté dans le thread appelant : lit le contexte de la requête et échantillonne."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or "-"
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+# ── CONFIGURATION ─────────────────────────────────────────────────────────────
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    ranking_dump: Optional[bool] = None,
+    stream=None,
+    async_write: bool = True,
+):
+    """(Re)configure les loggers du service. Sans argument : variables d'environnement."""
+    global _handler, _listener, _sink
+    if sample_rate is not None:
+        _settings["sample_rate"] = float(sample_rate)
+    if ranking_dump is not None:
+        _settings["ranking_dump"] = bool(ranking_dump)
+
+    _stop_listener()
+    sink = logging.StreamHandler(stream or sys.stdout)
+    sink.setFormatter(TextFormatter() if (fmt or LOG_FORMAT) == "text" else JsonFormatter())
+
+    if async_write:
+        log_queue = queue.SimpleQueue()
+        handler   = logging.handlers.QueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, sink)
+        _listener.start()
+    else:
+        handler = sink
+    handler.addFilter(_RequestFilter())
+
+    for name in NAMESPACES:
+        log = logging.getLogger(name)
+        if _handler is not None:
+            log.removeHandler(_handler)
+        log.addHandler(handler)
+        log.setLevel(level or LOG_LEVEL)
+        log.propagate = False
+    _handler, _sink = handler, sink
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()          # vide la file avant de rendre la main
+        _listener = None
+
+
+def _after_fork_in_child():
+    # Le thread d'écriture n'existe pas dans un worker forké : écriture directe.
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging(
+            level=logging.getLogger(NAMESPACES[0]).level,
+            fmt="text" if isinstance(_sink.formatter, TextFormatter) else "json",
+            stream=_sink.stream,
+            async_write=False,
+        )
+
+
+atexit.register(_stop_listener)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger du service ; configure la sortie au premier appel."""
+    if _handler is None:
+        configure_logging()
+    return logging.getLogger(name)
+
+
+# ── CONTEXTE DE REQUÊTE ───────────────────────────────────────────────────────
+@contextlib.contextmanager
+def request_context(request_id: Optional[str] = None):
+    """
+    Ouvre le contexte d'une requête (id + tirage d'échantillonnage).
+    Imbriqué (id absent ou identique) : réutilise le contexte en cours
+    (middleware -> route -> service), même tirage d'échantillonnage.
+    """
+    current = _request_id.get()
+    if current is not None and request_id in (None, current):
+        yield current
+        return
+    request_id = request_id or uuid.uuid4().hex[:12]
+    tokens = (
+        _request_id.set(request_id),
+        _sampled.set(random.random() < _settings["sample_rate"]),
+    )
+    try:
+        yield request_id
+    finally:
+        _sampled.reset(tokens[1])
+        _request_id.reset(tokens[0])
+
+
+def current_context() -> Tuple[Optional[str], bool]:
+    return _request_id.get(), _sampled.get()
+
+
+def run_in_context(context: Tuple[Optional[str], bool], fn: Callable, *args, **kwargs):
+    """Rejoue le contexte de la requête dans un worker (thread ou process) puis appelle fn."""
+    tokens = (_request_id.set(context[0]), _sampled.set(context[1]))
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _sampled.reset(tokens[1])
+        _request_id.reset(tokens[0])
+
+
+def ranking_dump_enabled(logger: logging.Logger) -> bool:
+    return _settings["ranking_dump"] and _sampled.get() and logger.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,119 @@
+"""
+response_cache.py — CACHE DES RÉPONSES /recommend
+
+Avant : un passager qui rafraîchit l'écran de recommandation fait re-poster
+par Express exactement le même payload (passenger_id + preferences + trajet)
+à quelques secondes d'intervalle, et chaque appel refait tout le pipeline.
+
+Maintenant : get_recommendations consulte d'abord un cache en mémoire.
+  - clé = empreinte canonique de la requête (JSON trié, blake2b) + version
+    du snapshot modèle + version des poids + version du registre drivers :
+    un reload, de nouveaux poids ou une écriture du registre (sync, delta,
+    position live) ne peuvent pas servir une ancienne réponse ;
+  - RESPONSE_CACHE_TTL_S : durée de vie courte (positions drivers et heure
+    de départ bougent) ; 0 désactive le cache ;
+  - RESPONSE_CACHE_MAX_BYTES : LRU borné en mémoire (taille des réponses
+    sérialisées) ;
+  - vidé dès qu'un modèle est installé ou que les poids changent ;
+  - reco_response_cache_total{result=hit|miss} et
+    reco_response_cache_evictions_total{reason=ttl|lru|invalidate} dans /metrics.
+Les réponses sont stockées picklées : chaque hit rend une copie (l'appelant
+peut annoter les dicts sans toucher au cache).
+"""
+
+import collections
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from service import metrics
+
+RESPONSE_CACHE_TTL_S     = float(os.getenv("RESPONSE_CACHE_TTL_S", 10))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+
+ENTRY_OVERHEAD_BYTES = 200      # clé + tuple + noeud de l'OrderedDict, approximatif
+
+
+def fingerprint(**request) -> str:
+    """Empreinte canonique : ordre des clés indifférent, types non JSON via str()."""
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, ttl_s: float = RESPONSE_CACHE_TTL_S, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl_s     = ttl_s
+        self.max_bytes = max_bytes
+        self._lock     = threading.Lock()
+        self._entries: "collections.OrderedDict[Tuple, Tuple[float, bytes]]" = collections.OrderedDict()
+        self._bytes    = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0 and self.max_bytes > 0
+
+    def get(self, key: Tuple):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key, "ttl")
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            metrics.RESPONSE_CACHE.inc(result="miss")
+            return None
+        metrics.RESPONSE_CACHE.inc(result="hit")
+        return pickle.loads(entry[1])
+
+    def put(self, key: Tuple, value):
+        if not self.enabled:
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) + ENTRY_OVERHEAD_BYTES > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_s, blob)
+            self._bytes += len(blob) + ENTRY_OVERHEAD_BYTES
+            self._purge_expired()
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)), "lru")
+
+    def _purge_expired(self):
+        """Entrées expirées en tête de LRU (les moins récemment lues), sans tout parcourir."""
+        now = time.monotonic()
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._drop(key, "ttl")
+
+    def clear(self):
+        """Invalidation complète (reload modèle, nouveaux poids)."""
+        with self._lock:
+            if self._entries:
+                metrics.RESPONSE_CACHE_EVICTIONS.inc(len(self._entries), reason="invalidate")
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: Tuple, reason: Optional[str]):
+        _, blob = self._entries.pop(key)
+        self._bytes -= len(blob) + ENTRY_OVERHEAD_BYTES
+        if reason is not None:
+            metrics.RESPONSE_CACHE_EVICTIONS.inc(reason=reason)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "ttl_s": self.ttl_s}
+
+
+response_cache = ResponseCache()
@@ -13,16 +13,72 @@ CHANGEMENTS PAR RAPPORT À LA VERSION PRÉCÉDENTE :
 
   ✅ Diagnostic post-entraînement : vérifie que les violations strictes
      ont bien créé du contraste dans les embeddings.
+
+  ✅ Préparation vectorisée : plus aucun iterrows() ni boucle par passager.
+     Les profils pondérés sont un groupby-sum, les matrices d'interactions et
+     de features sont construites directement en COO/CSR à partir des mappings
+     du Dataset (même contenu que build_interactions / build_*_features,
+     identités incluses, lignes normalisées L1).
+
+  ✅ Mode incrémental (--mode incremental | auto, défaut auto) :
+     reprend lightfm_model_real.pkl + dataset_real.pkl, étend les mappings
+     aux nouveaux passagers / drivers (lignes d'embeddings ajoutées au modèle)
+     et lance fit_partial quelques epochs sur les seules interactions nouvelles
+     (+ un échantillon d'anciennes pour limiter l'oubli). Les interactions déjà
+     apprises sont reconnues par hash (trained_interactions.npy).
+     En mode auto, un full retrain reste déclenché si aucun modèle n'existe,
+     si le dernier full date de plus de FULL_RETRAIN_EVERY_DAYS jours ou si
+     la part d'interactions nouvelles dépasse INCREMENTAL_MAX_NEW_RATIO.
+
+  ✅ Early stopping (full retrain) : VALIDATION_RATIO des paires
+     (passager, driver) est mis de côté, le modèle avance par tranches de
+     EPOCH_CHUNK epochs (fit_partial) et precision@k / AUC sont mesurés sur
+     les interactions positives mises de côté après chaque tranche. Arrêt
+     après PATIENCE tranches sans gain ; le modèle servi est ensuite
+     réentraîné sur toutes les interactions pendant le nombre d'epochs du
+     meilleur checkpoint (aucune paire n'est laissée de côté).
+     L'ancien barème (150 → 400 epochs) ne sert plus que de plafond, et de
+     nombre d'epochs fixe quand la validation serait trop petite.
+
+  ✅ Sweep d'hyperparamètres : `python service/retrain.py sweep` évalue
+     SWEEP_GRID (grille complète ou --trials tirages aléatoires) dans un pool
+     de processus. Les matrices préparées sont écrites une fois en .npy et
+     ouvertes en mmap copy-on-write par chaque worker (pages partagées). Le
+     rapport croise precision@k / AUC, temps d'entraînement et taille du
+     modèle, et marque les configurations Pareto-optimales.
+
+  ✅ Export d'un artefact versionné (.npy + manifest, cf. model_artifact.py)
+     à côté des pickles : c'est lui que le ml-service charge en mmap.
 """
 
+import argparse
+import copy
+import itertools
+import json
+import multiprocessing
+import tempfile
+import time
 import pandas as pd
 import numpy as np
 import os
+import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 import joblib
 import urllib.request
+import scipy.sparse as sp
 from lightfm import LightFM
 from lightfm.data import Dataset
+from lightfm.evaluation import auc_score, precision_at_k
+from pathlib import Path
+from typing import Optional
+
+# Lancé en script (python service/retrain.py) : dossier ml-service dans le path,
+# mêmes imports `service.` que le reste du ml-service
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from service.model_artifact import export_artifact
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s — %(message)s")
 logger = logging.getLogger(__name__)
@@ -31,117 +87,51 @@ BASE_DIR   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR   = os.path.join(BASE_DIR, "lightfm_data")
 MODELS_DIR = os.path.join(BASE_DIR, "model_real")
 
-
-# ── 1. CHARGEMENT ─────────────────────────────────────────────────────────────
-t_df = pd.read_csv(os.path.join(DATA_DIR, "trajets.csv"))
-d_df = pd.read_csv(os.path.join(DATA_DIR, "drivers.csv"))
-i_df = pd.read_csv(os.path.join(DATA_DIR, "interactions.csv"))
-
-logger.info(f"Trajets     : {len(t_df)}")
-logger.info(f"Drivers     : {len(d_df)}")
-logger.info(f"Interactions: {len(i_df)}")
-
-
-# ── 2. NETTOYAGE ──────────────────────────────────────────────────────────────
-yes_no_cols = [
+STATE_FILE = "train_state.json"
+SEEN_FILE  = "trained_interactions.npy"
+
+FULL_RETRAIN_EVERY_DAYS   = int(os.getenv("FULL_RETRAIN_EVERY_DAYS", 28))
+INCREMENTAL_EPOCHS        = int(os.getenv("INCREMENTAL_EPOCHS", 10))
+INCREMENTAL_MAX_NEW_RATIO = 0.5    # au-delà, le modèle précédent n'apporte plus grand-chose
+REPLAY_RATIO              = 0.5    # anciennes interactions rejouées / nouvelle interaction
+
+VALIDATION_RATIO   = 0.10
+EPOCH_CHUNK        = 10
+PATIENCE           = 3       # tranches sans amélioration avant arrêt
+MIN_DELTA          = 1e-3    # gain minimal de precision@k pour compter comme amélioration
+EVAL_K             = 5
+POSITIVE_WEIGHT    = 0.60    # interaction "pertinente" pour la validation (cf. diagnostic weights)
+MIN_VALIDATION     = 50      # interactions positives en validation, sinon epochs fixes
+
+SWEEP_GRID = {
+    "no_components": [16, 32, 64],
+    "learning_rate": [0.01, 0.03, 0.05],
+    "item_alpha":    [1e-6, 1e-5, 1e-4],
+    "user_alpha":    [1e-6, 1e-5],
+}
+
+YES_NO_COLS = [
     "quiet_ride", "radio_ok", "smoking_ok", "pets_ok",
     "luggage_large", "female_driver_pref",
     "talkative", "radio_on", "smoking_allowed", "pets_allowed", "car_big",
     "works_morning", "works_afternoon", "works_evening", "works_night",
 ]
-for col in yes_no_cols:
-    if col in t_df.columns: t_df[col] = t_df[col].fillna("no")
-    if col in d_df.columns: d_df[col] = d_df[col].fillna("no")
 
-t_df["distance_km"]     = pd.to_numeric(t_df["distance_km"],     errors="coerce").fillna(50.0)
-t_df["score_distance"]  = pd.to_numeric(t_df["score_distance"],  errors="coerce").fillna(0.5)
-t_df["work_hour_match"] = pd.to_numeric(t_df["work_hour_match"], errors="coerce").fillna(0)
-d_df["avg_rating"]      = pd.to_numeric(d_df["avg_rating"],      errors="coerce").fillna(4.0)
-i_df["weight"]          = pd.to_numeric(i_df["weight"],          errors="coerce").fillna(0.0)
-
-if "driver_gender" in d_df.columns:
-    d_df["driver_gender"] = d_df["driver_gender"].str.strip().str.lower().fillna("male")
-
-def rating_bucket(r):
-    if   r >= 4.5: return "rating:excellent"
-    elif r >= 4.0: return "rating:good"
-    elif r >= 3.0: return "rating:average"
-    else:          return "rating:poor"
-
-d_df["rating_bucket"] = d_df["avg_rating"].apply(rating_bucket)
-
-# ── 3. DIAGNOSTIC WEIGHTS ─────────────────────────────────────────────────────
-logger.info(f"\nDistribution weights (exclusion stricte) :")
-w = i_df["weight"]
-nb_zero = (w == 0.0).sum()
-logger.info(f"  0.0 (violation stricte)  : {nb_zero}  ({100*nb_zero/len(w):.1f}%)")
-logger.info(f"  0.01–0.30 (négatif)      : {((w > 0.00) & (w < 0.30)).sum()}")
-logger.info(f"  0.30–0.60 (neutre)       : {((w >= 0.30) & (w < 0.60)).sum()}")
-logger.info(f"  >= 0.60 (positif)        : {(w >= 0.60).sum()}")
-logger.info(f"  Contraste max-min        : {w.max() - w.min():.3f}  (> 0.50 = bon signal)")
-
-if nb_zero < len(w) * 0.05:
-    logger.warning("⚠️  Peu de violations strictes (< 5%) — les prefs sont peut-être trop permissives dans le seed")
-elif nb_zero > len(w) * 0.70:
-    logger.warning("⚠️  Trop de violations (> 70%) — les drivers et passagers ne matchent presque jamais")
-else:
-    logger.info(f"  ✅ {nb_zero/len(w)*100:.0f}% de violations strictes — contraste suffisant")
-
-# ✅ Les interactions à weight=0.0 sont gardées dans la matrice WARP.
-# LightFM interprète weight=0 comme "pas d'intérêt" dans WARP — c'est exactement
-# le signal qu'on veut pour les violations strictes.
-# On ne les supprime PAS : leur présence avec weight=0 aide le modèle à apprendre
-# "ce type de driver n'est pas apprécié par ce passager".
-i_df["weight_final"] = i_df["weight"].clip(lower=0.0, upper=1.0)
-
-# ── 4. MERGE interactions + prefs du trajet ───────────────────────────────────
 PREF_COLS = [
     "quiet_ride", "radio_ok", "smoking_ok",
     "pets_ok", "luggage_large", "female_driver_pref",
 ]
 
-if "trajet_id" in i_df.columns and "trajet_id" in t_df.columns:
-    logger.info("\n✅ trajet_id trouvé → merge exact trajet par trajet")
-    i_merged = i_df.merge(
-        t_df[["trajet_id", "passenger_id"] + PREF_COLS],
-        on=["trajet_id", "passenger_id"],
-        how="left",
-    )
-    nb_ok = i_merged[PREF_COLS[0]].notna().sum()
-    logger.info(f"   {nb_ok}/{len(i_merged)} interactions matchées avec leurs prefs")
-else:
-    logger.warning("⚠️  trajet_id absent → fallback sur le dernier trajet par passager")
-    last_trajet = t_df.sort_values("trajet_id").drop_duplicates("passenger_id", keep="last")
-    i_merged = i_df.merge(
-        last_trajet[["passenger_id"] + PREF_COLS],
-        on="passenger_id",
-        how="left",
-    )
-
-for col in PREF_COLS:
-    i_merged[col] = i_merged[col].fillna("no")
-
-all_interactions = i_merged.copy()
-
-# ── 5. USER FEATURES ─────────────────────────────────────────────────────────
-for col in PREF_COLS:
-    t_df[f"{col}_bin"] = (t_df[col].str.lower() == "yes").astype(float)
-
-passenger_agg = (
-    t_df.groupby("passenger_id")[[f"{c}_bin" for c in PREF_COLS]]
-    .mean()
-    .reset_index()
-)
-logger.info(f"\nPassagers uniques : {len(passenger_agg)}")
-
-# ── 6. DATASET LIGHTFM ───────────────────────────────────────────────────────
-dataset = Dataset()
+# Colonnes drivers -> feature "{col}:{valeur}" (+ rating_bucket tel quel)
+DRIVER_FEATURE_COLS = [
+    "talkative", "radio_on", "smoking_allowed", "pets_allowed", "car_big",
+    "driver_gender",
+    "works_morning", "works_afternoon", "works_evening", "works_night",
+]
 
-user_features_list = []
-for col in PREF_COLS:
-    user_features_list += [f"{col}:yes", f"{col}:no"]
+USER_FEATURES_LIST = [f"{col}:{v}" for col in PREF_COLS for v in ("yes", "no")]
 
-item_features_list = [
+ITEM_FEATURES_LIST = [
     "talkative:yes",       "talkative:no",
     "radio_on:yes",        "radio_on:no",
     "smoking_allowed:yes", "smoking_allowed:no",
@@ -156,196 +146,788 @@ item_features_list = [
     "rating:average",      "rating:poor",
 ]
 
-dataset.fit(
-    users=t_df["passenger_id"].unique(),
-    items=d_df["driver_id"].unique(),
-    user_features=user_features_list,
-    item_features=item_features_list,
-)
+
+# ── 1. CHARGEMENT ─────────────────────────────────────────────────────────────
+def load_raw(data_dir: str = DATA_DIR):
+    t_df = pd.read_csv(os.path.join(data_dir, "trajets.csv"))
+    d_df = pd.read_csv(os.path.join(data_dir, "drivers.csv"))
+    i_df = pd.read_csv(os.path.join(data_dir, "interactions.csv"))
+
+    logger.info(f"Trajets     : {len(t_df)}")
+    logger.info(f"Drivers     : {len(d_df)}")
+    logger.info(f"Interactions: {len(i_df)}")
+    return t_df, d_df, i_df
+
+
+# ── 2. NETTOYAGE ──────────────────────────────────────────────────────────────
+def rating_bucket(avg_rating: pd.Series) -> np.ndarray:
+    r = avg_rating.to_numpy()
+    return np.select(
+        [r >= 4.5, r >= 4.0, r >= 3.0],
+        ["rating:excellent", "rating:good", "rating:average"],
+        default="rating:poor",
+    )
+
+
+def clean(t_df: pd.DataFrame, d_df: pd.DataFrame, i_df: pd.DataFrame):
+    for col in YES_NO_COLS:
+        if col in t_df.columns: t_df[col] = t_df[col].fillna("no")
+        if col in d_df.columns: d_df[col] = d_df[col].fillna("no")
+
+    t_df["distance_km"]     = pd.to_numeric(t_df["distance_km"],     errors="coerce").fillna(50.0)
+    t_df["score_distance"]  = pd.to_numeric(t_df["score_distance"],  errors="coerce").fillna(0.5)
+    t_df["work_hour_match"] = pd.to_numeric(t_df["work_hour_match"], errors="coerce").fillna(0)
+    d_df["avg_rating"]      = pd.to_numeric(d_df["avg_rating"],      errors="coerce").fillna(4.0)
+    i_df["weight"]          = pd.to_numeric(i_df["weight"],          errors="coerce").fillna(0.0)
+
+    if "driver_gender" in d_df.columns:
+        d_df["driver_gender"] = d_df["driver_gender"].str.strip().str.lower().fillna("male")
+
+    d_df["rating_bucket"] = rating_bucket(d_df["avg_rating"])
+
+    # ✅ Les interactions à weight=0.0 sont gardées dans la matrice WARP.
+    # LightFM interprète weight=0 comme "pas d'intérêt" dans WARP — c'est exactement
+    # le signal qu'on veut pour les violations strictes.
+    # On ne les supprime PAS : leur présence avec weight=0 aide le modèle à apprendre
+    # "ce type de driver n'est pas apprécié par ce passager".
+    i_df["weight_final"] = i_df["weight"].clip(lower=0.0, upper=1.0)
+    return t_df, d_df, i_df
+
+
+# ── 3. DIAGNOSTIC WEIGHTS ─────────────────────────────────────────────────────
+def log_weight_distribution(i_df: pd.DataFrame):
+    logger.info(f"\nDistribution weights (exclusion stricte) :")
+    w = i_df["weight"]
+    nb_zero = (w == 0.0).sum()
+    logger.info(f"  0.0 (violation stricte)  : {nb_zero}  ({100*nb_zero/len(w):.1f}%)")
+    logger.info(f"  0.01–0.30 (négatif)      : {((w > 0.00) & (w < 0.30)).sum()}")
+    logger.info(f"  0.30–0.60 (neutre)       : {((w >= 0.30) & (w < 0.60)).sum()}")
+    logger.info(f"  >= 0.60 (positif)        : {(w >= 0.60).sum()}")
+    logger.info(f"  Contraste max-min        : {w.max() - w.min():.3f}  (> 0.50 = bon signal)")
+
+    if nb_zero < len(w) * 0.05:
+        logger.warning("⚠️  Peu de violations strictes (< 5%) — les prefs sont peut-être trop permissives dans le seed")
+    elif nb_zero > len(w) * 0.70:
+        logger.warning("⚠️  Trop de violations (> 70%) — les drivers et passagers ne matchent presque jamais")
+    else:
+        logger.info(f"  ✅ {nb_zero/len(w)*100:.0f}% de violations strictes — contraste suffisant")
+
+
+# ── 4. MERGE interactions + prefs du trajet ───────────────────────────────────
+def merge_interaction_prefs(i_df: pd.DataFrame, t_df: pd.DataFrame) -> pd.DataFrame:
+    if "trajet_id" in i_df.columns and "trajet_id" in t_df.columns:
+        logger.info("\n✅ trajet_id trouvé → merge exact trajet par trajet")
+        i_merged = i_df.merge(
+            t_df[["trajet_id", "passenger_id"] + PREF_COLS],
+            on=["trajet_id", "passenger_id"],
+            how="left",
+        )
+        nb_ok = i_merged[PREF_COLS[0]].notna().sum()
+        logger.info(f"   {nb_ok}/{len(i_merged)} interactions matchées avec leurs prefs")
+    else:
+        logger.warning("⚠️  trajet_id absent → fallback sur le dernier trajet par passager")
+        last_trajet = t_df.sort_values("trajet_id").drop_duplicates("passenger_id", keep="last")
+        i_merged = i_df.merge(
+            last_trajet[["passenger_id"] + PREF_COLS],
+            on="passenger_id",
+            how="left",
+        )
+
+    for col in PREF_COLS:
+        i_merged[col] = i_merged[col].fillna("no")
+    return i_merged
+
+
+# ── 5. USER FEATURES ─────────────────────────────────────────────────────────
+def is_yes(values: pd.Series) -> np.ndarray:
+    """values.str.lower() == 'yes', évalué sur les modalités distinctes (2-3 par colonne) et non ligne à ligne."""
+    cat   = values.astype("category")
+    yes   = np.asarray(cat.cat.categories.astype(str).str.lower() == "yes")
+    codes = cat.cat.codes.to_numpy()
+    return (codes >= 0) & yes[np.maximum(codes, 0)] if len(yes) else np.zeros(len(values), dtype=bool)
+
+
+def aggregate_passenger_prefs(t_df: pd.DataFrame) -> pd.DataFrame:
+    for col in PREF_COLS:
+        t_df[f"{col}_bin"] = is_yes(t_df[col]).astype(float)
+
+    passenger_agg = (
+        t_df.groupby("passenger_id")[[f"{c}_bin" for c in PREF_COLS]]
+        .mean()
+        .reset_index()
+    )
+    logger.info(f"\nPassagers uniques : {len(passenger_agg)}")
+    return passenger_agg
+
+
+# ── 6. DATASET LIGHTFM ───────────────────────────────────────────────────────
+def build_dataset(t_df: pd.DataFrame, d_df: pd.DataFrame, dataset: Dataset = None) -> Dataset:
+    """
+    Sans dataset : mappings neufs. Avec le dataset du modèle précédent :
+    fit_partial ajoute les nouveaux ids à la suite, les indices existants
+    (et donc les lignes d'embeddings apprises) ne bougent pas.
+    """
+    if dataset is None:
+        dataset = Dataset()
+        dataset.fit(
+            users=t_df["passenger_id"].unique(),
+            items=d_df["driver_id"].unique(),
+            user_features=USER_FEATURES_LIST,
+            item_features=ITEM_FEATURES_LIST,
+        )
+    else:
+        dataset.fit_partial(
+            users=t_df["passenger_id"].unique(),
+            items=d_df["driver_id"].unique(),
+            user_features=USER_FEATURES_LIST,
+            item_features=ITEM_FEATURES_LIST,
+        )
+    return dataset
+
+
+def interaction_keys(interactions_df: pd.DataFrame) -> np.ndarray:
+    """Hash uint64 par interaction (passager, driver, trajet, poids) pour repérer les nouvelles."""
+    cols = [c for c in ("passenger_id", "driver_id", "trajet_id", "weight_final") if c in interactions_df.columns]
+    return pd.util.hash_pandas_object(interactions_df[cols], index=False).to_numpy()
+
+
+def _lookup(mapping: dict, values, kind: str) -> np.ndarray:
+    """ids / noms de features -> indices internes, en bloc (ValueError si inconnu, comme LightFM)."""
+    keys    = pd.Index(list(mapping.keys()))
+    targets = np.fromiter(mapping.values(), dtype=np.int32, count=len(mapping))
+    pos     = keys.get_indexer(pd.Index(values))
+    if (pos < 0).any():
+        unknown = pd.Index(values)[pos < 0][0]
+        raise ValueError(f"{kind} {unknown} absent du mapping du Dataset")
+    return targets[pos]
+
+
+def _feature_matrix(n_rows: int, n_features: int, rows: np.ndarray, cols: np.ndarray) -> sp.csr_matrix:
+    """COO de poids 1 -> CSR (doublons sommés) normalisée L1 par ligne, comme _FeatureBuilder."""
+    data = np.ones(len(rows), dtype=np.float32)
+    mat  = sp.coo_matrix((data, (rows, cols)), shape=(n_rows, n_features)).tocsr()
+    row_sums = np.asarray(mat.sum(axis=1)).ravel()
+    if (row_sums == 0).any():
+        raise ValueError("Normalisation impossible : certaines lignes n'ont aucune feature")
+    mat.data /= np.repeat(row_sums, np.diff(mat.indptr)).astype(np.float32)
+    return mat
+
 
 # ── 7. MATRICES ───────────────────────────────────────────────────────────────
-(interactions_matrix, weights_matrix) = dataset.build_interactions(
-    [
-        (row["passenger_id"], row["driver_id"], float(row["weight_final"]))
-        for _, row in all_interactions.iterrows()
-    ]
-)
+def build_interaction_matrices(dataset: Dataset, interactions_df: pd.DataFrame):
+    """(interactions, weights) en COO, une entrée par ligne d'interaction (doublons conservés)."""
+    user_id_map, _, item_id_map, _ = dataset.mapping()
+    rows  = _lookup(user_id_map, interactions_df["passenger_id"].to_numpy(), "passenger_id")
+    cols  = _lookup(item_id_map, interactions_df["driver_id"].to_numpy(), "driver_id")
+    shape = (len(user_id_map), len(item_id_map))
+
+    interactions = sp.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=shape)
+    weights      = sp.coo_matrix(
+        (interactions_df["weight_final"].to_numpy(dtype=np.float32), (rows, cols)), shape=shape,
+    )
+    return interactions, weights
+
 
 # ── 8. USER FEATURES pondérées par weight ────────────────────────────────────
 # ✅ On exclut les interactions avec weight=0.0 du calcul du profil passager.
 # Un trajet où une pref a été violée ne doit pas influencer le profil LightFM.
+def build_weighted_pref_features(interactions_df: pd.DataFrame, pref_cols: list) -> pd.DataFrame:
+    """
+    Une ligne par passager : part du poids (weight_final) portée par les trajets
+    où la pref valait 'yes'. Les passagers sans interaction > 0 sont absents.
+    """
+    valid = interactions_df[interactions_df["weight_final"] > 0.0]
+    w     = valid["weight_final"]
+    yes_w = pd.DataFrame(
+        {col: w.where(is_yes(valid[col]), 0.0) for col in pref_cols},
+        index=valid.index,
+    )
+    yes_w["_total"] = w
+    sums = yes_w.groupby(valid["passenger_id"], sort=False).sum()
+    sums = sums[sums["_total"] != 0]
+    return sums[pref_cols].div(sums["_total"], axis=0)
+
+
+def build_user_feature_matrix(
+    dataset: Dataset,
+    passenger_agg: pd.DataFrame,
+    weighted_prefs: pd.DataFrame,
+) -> sp.csr_matrix:
+    """
+    Profil pondéré si disponible, sinon moyenne des trajets (passenger_agg).
+    Par pref : >= 0.6 -> ':yes', <= 0.4 -> ':no', entre les deux -> les deux.
+    """
+    user_id_map, user_feature_map, _, _ = dataset.mapping()
+
+    avg    = passenger_agg.set_index("passenger_id")[[f"{c}_bin" for c in PREF_COLS]]
+    avg.columns = PREF_COLS
+    scores = avg.astype(float)
+    has_weighted = scores.index.isin(weighted_prefs.index)
+    scores.loc[has_weighted] = weighted_prefs.reindex(scores.index[has_weighted])[PREF_COLS].to_numpy()
+
+    user_idx = _lookup(user_id_map, scores.index.to_numpy(), "passenger_id")
+    rows, cols = [], []
+
+    # Identité de chaque passager du mapping
+    identity_ids = list(user_id_map.keys())
+    rows.append(np.fromiter(user_id_map.values(), dtype=np.int32, count=len(user_id_map)))
+    cols.append(_lookup(user_feature_map, identity_ids, "feature"))
 
-def build_weighted_pref_features(interactions_df: pd.DataFrame, pref_cols: list) -> dict:
-    passenger_features = {}
-    grouped = interactions_df.groupby("passenger_id")
+    for col in PREF_COLS:
+        val = scores[col].to_numpy()
+        for suffix, mask in (("yes", ~(val <= 0.4)), ("no", ~(val >= 0.6))):
+            rows.append(user_idx[mask])
+            cols.append(np.full(mask.sum(), user_feature_map[f"{col}:{suffix}"], dtype=np.int32))
 
-    for passenger_id, group in grouped:
-        # ✅ Exclure les interactions à weight=0.0 (violations strictes)
-        valid_group = group[group["weight_final"] > 0.0]
-        if valid_group.empty:
-            continue
+    return _feature_matrix(len(user_id_map), len(user_feature_map), np.concatenate(rows), np.concatenate(cols))
 
-        total_weight = valid_group["weight_final"].sum()
-        if total_weight == 0:
-            continue
 
-        pref_scores = {}
-        for col in pref_cols:
-            yes_weight = valid_group.loc[valid_group[col].str.lower() == "yes", "weight_final"].sum()
-            pref_scores[col] = yes_weight / total_weight
+def build_item_feature_matrix(dataset: Dataset, d_df: pd.DataFrame) -> sp.csr_matrix:
+    _, _, item_id_map, item_feature_map = dataset.mapping()
 
-        passenger_features[passenger_id] = pref_scores
+    item_idx = _lookup(item_id_map, d_df["driver_id"].to_numpy(), "driver_id")
+    rows = [np.fromiter(item_id_map.values(), dtype=np.int32, count=len(item_id_map))]
+    cols = [_lookup(item_feature_map, list(item_id_map.keys()), "feature")]
 
-    return passenger_features
+    for col in DRIVER_FEATURE_COLS:
+        names = col + ":" + d_df[col].astype(str).str.lower()
+        rows.append(item_idx)
+        cols.append(_lookup(item_feature_map, names.to_numpy(), "feature"))
+    rows.append(item_idx)
+    cols.append(_lookup(item_feature_map, d_df["rating_bucket"].to_numpy(), "feature"))
 
-passenger_weighted_prefs = build_weighted_pref_features(all_interactions, PREF_COLS)
-logger.info(f"\nUser features pondérées calculées pour {len(passenger_weighted_prefs)} passagers")
-logger.info(f"(interactions à weight=0.0 exclues du profil)")
+    return _feature_matrix(len(item_id_map), len(item_feature_map), np.concatenate(rows), np.concatenate(cols))
 
-def prefs_to_features_weighted(passenger_id: str, pref_scores: dict) -> list:
-    features = []
-    for col in PREF_COLS:
-        val = pref_scores.get(col, 0.5)
-        if   val >= 0.6: features.append(f"{col}:yes")
-        elif val <= 0.4: features.append(f"{col}:no")
+
+def prepare(data_dir: str = DATA_DIR, dataset: Dataset = None) -> dict:
+    """Étapes 1 à 8 : CSV bruts -> Dataset + matrices prêtes pour LightFM."""
+    t_df, d_df, i_df = clean(*load_raw(data_dir))
+    log_weight_distribution(i_df)
+
+    all_interactions = merge_interaction_prefs(i_df, t_df)
+    passenger_agg    = aggregate_passenger_prefs(t_df)
+    dataset          = build_dataset(t_df, d_df, dataset)
+
+    interactions_matrix, weights_matrix = build_interaction_matrices(dataset, all_interactions)
+
+    passenger_weighted_prefs = build_weighted_pref_features(all_interactions, PREF_COLS)
+    logger.info(f"\nUser features pondérées calculées pour {len(passenger_weighted_prefs)} passagers")
+    logger.info(f"(interactions à weight=0.0 exclues du profil)")
+
+    user_features = build_user_feature_matrix(dataset, passenger_agg, passenger_weighted_prefs)
+    item_features = build_item_feature_matrix(dataset, d_df)
+
+    logger.info(f"\nMatrices construites — {interactions_matrix.nnz} interactions")
+    logger.info(f"  dont {(i_df['weight_final'] == 0.0).sum()} à weight=0.0 (signal négatif strict)")
+
+    return {
+        "t_df":             t_df,
+        "d_df":             d_df,
+        "passenger_agg":    passenger_agg,
+        "all_interactions": all_interactions,
+        "interaction_keys": interaction_keys(all_interactions),
+        "dataset":          dataset,
+        "interactions":     interactions_matrix,
+        "weights":          weights_matrix,
+        "user_features":    user_features,
+        "item_features":    item_features,
+    }
+
+
+# ── 9. MODÈLE ────────────────────────────────────────────────────────────────
+MODEL_PARAMS = {
+    "loss":          "warp",
+    "no_components": 64,
+    "learning_rate": 0.03,
+    "item_alpha":    1e-6,
+    "user_alpha":    1e-6,
+}
+
+
+def make_model(**params) -> LightFM:
+    return LightFM(**{**MODEL_PARAMS, **params}, random_state=42)
+
+
+def max_epochs_for(n_train: int) -> int:
+    if   n_train < 500:   return 150
+    elif n_train < 2000:  return 200
+    elif n_train < 5000:  return 350
+    else:                 return 400
+
+
+def split_validation(interactions_df: pd.DataFrame, ratio: float = VALIDATION_RATIO, seed: int = 42):
+    """
+    Découpe par paire (passager, driver) : une paire est entièrement en train
+    ou en validation (predict_rank refuse les recouvrements train / test).
+    """
+    pair_keys = pd.util.hash_pandas_object(interactions_df[["passenger_id", "driver_id"]], index=False).to_numpy()
+    pairs     = np.unique(pair_keys)
+    held_out  = np.random.default_rng(seed).choice(pairs, size=int(len(pairs) * ratio), replace=False)
+    is_val    = np.isin(pair_keys, held_out)
+    return interactions_df[~is_val], interactions_df[is_val]
+
+
+def train(prepared: dict, early_stopping: bool = True) -> LightFM:
+    """
+    Modèle de production, toujours entraîné sur TOUTES les interactions
+    (trained_interactions.npy les marque toutes comme apprises) ; l'early
+    stopping ne fait que choisir le nombre d'epochs.
+    """
+    n_train = prepared["interactions"].nnz
+    epochs  = train_with_early_stopping(prepared) if early_stopping else None
+    if epochs is None:
+        epochs = max_epochs_for(n_train)
+    model = make_model()
+    logger.info(f"{n_train} interactions → {epochs} epochs\n")
+
+    model.fit(
+        prepared["interactions"],
+        user_features=prepared["user_features"],
+        item_features=prepared["item_features"],
+        sample_weight=prepared["weights"],
+        epochs=epochs,
+        num_threads=4,
+        verbose=False,
+    )
+
+    logger.info("Entraînement terminé.")
+    return model
+
+
+def fit_with_early_stopping(
+    model: LightFM,
+    train_i: sp.coo_matrix,
+    train_w: sp.coo_matrix,
+    val_i: sp.csr_matrix,
+    user_features: sp.csr_matrix,
+    item_features: sp.csr_matrix,
+    max_epochs: int,
+    num_threads: int = 4,
+    verbose: bool = True,
+) -> dict:
+    """Boucle fit_partial par tranches + évaluation ; renvoie le meilleur checkpoint et ses métriques."""
+    train_csr   = train_i.tocsr()
+    eval_kwargs = dict(
+        train_interactions=train_csr, user_features=user_features,
+        item_features=item_features, num_threads=num_threads, check_intersections=False,
+    )
+    best = {"model": None, "precision": -np.inf, "auc": None, "best_epoch": 0, "epochs_run": 0}
+    stale, epoch = 0, 0
+    while epoch < max_epochs:
+        n = min(EPOCH_CHUNK, max_epochs - epoch)
+        model.fit_partial(
+            train_i,
+            user_features=user_features,
+            item_features=item_features,
+            sample_weight=train_w,
+            epochs=n,
+            num_threads=num_threads,
+            verbose=False,
+        )
+        epoch += n
+
+        precision = float(precision_at_k(model, val_i, k=EVAL_K, **eval_kwargs).mean())
+        auc       = float(auc_score(model, val_i, **eval_kwargs).mean())
+        if verbose:
+            logger.info(f"  epoch {epoch:4d} — precision@{EVAL_K}={precision:.4f}  AUC={auc:.4f}")
+
+        if precision > best["precision"] + MIN_DELTA:
+            best.update(model=copy.deepcopy(model), precision=precision, auc=auc, best_epoch=epoch)
+            stale = 0
         else:
-            features.append(f"{col}:yes")
-            features.append(f"{col}:no")
-    return features
+            stale += 1
+            if stale >= PATIENCE:
+                break
+    best["epochs_run"] = epoch
+    return best
+
+
+def validation_matrices(prepared: dict):
+    """(train_i, train_w, val_i) ou None si la validation est trop petite."""
+    train_df, val_df = split_validation(prepared["all_interactions"])
+    val_pos = val_df[val_df["weight_final"] >= POSITIVE_WEIGHT]
+    if len(val_pos) < MIN_VALIDATION:
+        logger.info(f"Validation trop petite ({len(val_pos)} positives) → epochs fixes")
+        return None
+    train_i, train_w = build_interaction_matrices(prepared["dataset"], train_df)
+    val_i, _         = build_interaction_matrices(prepared["dataset"], val_pos)
+    return train_i, train_w, val_i.tocsr()
+
+
+def train_with_early_stopping(prepared: dict) -> Optional[int]:
+    """
+    Nombre d'epochs retenu par la validation (meilleur checkpoint), ou None si
+    la validation est trop petite. Le checkpoint lui-même n'est pas servi : il
+    n'a jamais vu les paires mises de côté.
+    """
+    matrices = validation_matrices(prepared)
+    if matrices is None:
+        return None
+    train_i, train_w, val_i = matrices
+    max_epochs = max_epochs_for(train_i.nnz)
+    logger.info(
+        f"Early stopping : {train_i.nnz} train / {val_i.nnz} validation positives — "
+        f"tranches de {EPOCH_CHUNK}, max {max_epochs} epochs, patience {PATIENCE}\n"
+    )
 
-def prefs_to_features_avg(row):
-    features = []
-    for col in PREF_COLS:
-        val = float(row[f"{col}_bin"])
-        if   val >= 0.6: features.append(f"{col}:yes")
-        elif val <= 0.4: features.append(f"{col}:no")
+    best = fit_with_early_stopping(
+        make_model(), train_i, train_w, val_i,
+        prepared["user_features"], prepared["item_features"], max_epochs,
+    )
+    logger.info(
+        f"Validation terminée — meilleur checkpoint : epoch {best['best_epoch']} "
+        f"(precision@{EVAL_K}={best['precision']:.4f}, arrêt à {best['epochs_run']}/{max_epochs})"
+    )
+    return best["best_epoch"] or None
+
+
+# ── 9 bis. MODE INCRÉMENTAL ──────────────────────────────────────────────────
+def grow_model(model: LightFM, n_item_features: int, n_user_features: int):
+    """
+    Ajoute les lignes des nouvelles features (identités des nouveaux drivers /
+    passagers) à tous les paramètres du modèle, initialisées comme
+    LightFM._initialize : fit_partial exige des dimensions inchangées.
+    """
+    grad_init = 1.0 if model.learning_schedule == "adagrad" else 0.0
+    k = model.no_components
+    for side, n_features in (("item", n_item_features), ("user", n_user_features)):
+        emb   = getattr(model, f"{side}_embeddings")
+        extra = n_features - emb.shape[0]
+        if extra < 0:
+            raise ValueError(f"{side}_features plus petit que le modèle précédent ({n_features} < {emb.shape[0]})")
+        if extra == 0:
+            continue
+        new_emb = ((model.random_state.rand(extra, k) - 0.5) / k).astype(np.float32)
+        setattr(model, f"{side}_embeddings",          np.vstack([emb, new_emb]))
+        setattr(model, f"{side}_embedding_gradients", np.vstack([getattr(model, f"{side}_embedding_gradients"), np.full((extra, k), grad_init, dtype=np.float32)]))
+        setattr(model, f"{side}_embedding_momentum",  np.vstack([getattr(model, f"{side}_embedding_momentum"),  np.zeros((extra, k), dtype=np.float32)]))
+        setattr(model, f"{side}_biases",         np.concatenate([getattr(model, f"{side}_biases"),         np.zeros(extra, dtype=np.float32)]))
+        setattr(model, f"{side}_bias_gradients", np.concatenate([getattr(model, f"{side}_bias_gradients"), np.full(extra, grad_init, dtype=np.float32)]))
+        setattr(model, f"{side}_bias_momentum",  np.concatenate([getattr(model, f"{side}_bias_momentum"),  np.zeros(extra, dtype=np.float32)]))
+        logger.info(f"  +{extra} {side} features (nouvelles identités)")
+
+
+def select_incremental_rows(prepared: dict, seen_keys: np.ndarray, replay_ratio: float = REPLAY_RATIO, seed: int = 42) -> np.ndarray:
+    """Positions des interactions à rejouer : toutes les nouvelles + un échantillon des anciennes."""
+    is_new  = ~np.isin(prepared["interaction_keys"], seen_keys)
+    new_idx = np.flatnonzero(is_new)
+    old_idx = np.flatnonzero(~is_new)
+    n_replay = min(len(old_idx), int(len(new_idx) * replay_ratio))
+    replay  = np.random.default_rng(seed).choice(old_idx, size=n_replay, replace=False) if n_replay else old_idx[:0]
+    return np.sort(np.concatenate([new_idx, replay]))
+
+
+def train_incremental(model: LightFM, prepared: dict, rows: np.ndarray, epochs: int = INCREMENTAL_EPOCHS) -> LightFM:
+    if model.random_state is None:        # retiré à la sauvegarde
+        model.random_state = np.random.RandomState(42)
+    grow_model(model, prepared["item_features"].shape[1], prepared["user_features"].shape[1])
+
+    subset = prepared["all_interactions"].iloc[rows]
+    interactions, weights = build_interaction_matrices(prepared["dataset"], subset)
+    logger.info(f"fit_partial : {interactions.nnz} interactions → {epochs} epochs\n")
+
+    model.fit_partial(
+        interactions,
+        user_features=prepared["user_features"],
+        item_features=prepared["item_features"],
+        sample_weight=weights,
+        epochs=epochs,
+        num_threads=4,
+        verbose=False,
+    )
+
+    logger.info("Entraînement incrémental terminé.")
+    return model
+
+
+# ── 10. DIAGNOSTIC POST-ENTRAÎNEMENT ─────────────────────────────────────────
+def log_embedding_diagnostics(model: LightFM, dataset: Dataset):
+    try:
+        item_biases = model.item_biases
+        item_emb    = model.item_embeddings
+        user_emb    = model.user_embeddings
+
+        logger.info(f"\nDiagnostic embeddings :")
+        logger.info(f"  item_biases std     : {item_biases.std():.4f}  (> 0.10 = collab ok)")
+        logger.info(f"  item_embeddings std : {item_emb.std():.4f}   (> 0.05 = content-based ok)")
+        logger.info(f"  user_embeddings std : {user_emb.std():.4f}   (> 0.05 = prefs bien encodées)")
+
+        if item_emb.std() < 0.02:
+            logger.warning("⚠️  item_embeddings uniformes → content-based pas appris")
         else:
-            features.append(f"{col}:yes")
-            features.append(f"{col}:no")
-    return features
-
-user_feature_rows = []
-for _, row in passenger_agg.iterrows():
-    pid = row["passenger_id"]
-    if pid in passenger_weighted_prefs:
-        feats = prefs_to_features_weighted(pid, passenger_weighted_prefs[pid])
+            logger.info("  ✅ Content-based appris correctement")
+
+        # Vérifie que les embeddings pour :yes et :no sont bien opposés
+        logger.info(f"\n  Diagnostic cohérence yes/no :")
+        _, user_feature_map, item_id_map, _ = dataset.mapping()
+        for col in PREF_COLS[:3]:
+            yes_feat = f"{col}:yes"
+            no_feat  = f"{col}:no"
+            if yes_feat in user_feature_map and no_feat in user_feature_map:
+                yes_emb = user_emb[user_feature_map[yes_feat]]
+                no_emb  = user_emb[user_feature_map[no_feat]]
+                cosine  = np.dot(yes_emb, no_emb) / (np.linalg.norm(yes_emb) * np.linalg.norm(no_emb) + 1e-8)
+                status  = "✅ opposés" if cosine < -0.1 else ("⚠️  neutres" if cosine < 0.3 else "❌ similaires")
+                logger.info(f"  {col}: cosine(yes, no) = {cosine:.3f}  {status}")
+
+        logger.info(f"\n  Top 5 biais drivers :")
+        biases_by_driver = {k: item_biases[v] for k, v in item_id_map.items()}
+        top5 = sorted(biases_by_driver.items(), key=lambda x: x[1], reverse=True)[:5]
+        bot5 = sorted(biases_by_driver.items(), key=lambda x: x[1])[:5]
+        logger.info(f"  Positifs : {[(k, round(v,3)) for k,v in top5]}")
+        logger.info(f"  Négatifs : {[(k, round(v,3)) for k,v in bot5]}")
+
+    except Exception as e:
+        logger.warning(f"Diagnostic échoué : {e}")
+
+
+# ── 11. SAUVEGARDE ────────────────────────────────────────────────────────────
+def save(model: LightFM, prepared: dict, models_dir: str = MODELS_DIR, mode: str = "full"):
+    model.random_state = None
+    os.makedirs(models_dir, exist_ok=True)
+
+    joblib.dump(model,                     os.path.join(models_dir, "lightfm_model_real.pkl"))
+    joblib.dump(prepared["dataset"],       os.path.join(models_dir, "dataset_real.pkl"))
+    joblib.dump(prepared["user_features"], os.path.join(models_dir, "user_features_real.pkl"))
+    joblib.dump(prepared["item_features"], os.path.join(models_dir, "item_features_real.pkl"))
+    prepared["t_df"].to_csv(os.path.join(models_dir, "trajets_processed.csv"), index=False)
+    prepared["d_df"].to_csv(os.path.join(models_dir, "drivers_processed.csv"), index=False)
+    prepared["passenger_agg"].to_csv(os.path.join(models_dir, "passenger_agg.csv"), index=False)
+
+    # Format servi par le ml-service (mmap) ; les pickles restent la base du mode incrémental
+    artifact = export_artifact(
+        model, prepared["dataset"], prepared["user_features"], prepared["item_features"], models_dir,
+        extra={"mode": mode, "model_params": {k: getattr(model, k) for k in MODEL_PARAMS}},
+    )
+
+    logger.info(f"\n✅ Modèle sauvegardé dans {models_dir} (artefact {os.path.basename(artifact)})")
+
+
+def load_state(models_dir: str = MODELS_DIR) -> dict:
+    path = os.path.join(models_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(prepared: dict, mode: str, n_trained: int, previous: dict, models_dir: str = MODELS_DIR):
+    now   = datetime.now().isoformat(timespec="seconds")
+    state = {
+        "mode":           mode,
+        "trained_at":     now,
+        "last_full_at":   now if mode == "full" else previous.get("last_full_at"),
+        "n_interactions": int(len(prepared["interaction_keys"])),
+        "n_trained":      int(n_trained),
+    }
+    np.save(os.path.join(models_dir, SEEN_FILE), np.unique(prepared["interaction_keys"]))
+    with open(os.path.join(models_dir, STATE_FILE), "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def load_previous(models_dir: str = MODELS_DIR):
+    """(model, dataset, clés déjà apprises) du dernier entraînement, ou None."""
+    paths = [os.path.join(models_dir, n) for n in ("lightfm_model_real.pkl", "dataset_real.pkl", SEEN_FILE)]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    return joblib.load(paths[0]), joblib.load(paths[1]), np.load(paths[2])
+
+
+def full_retrain_due(state: dict) -> bool:
+    last_full = state.get("last_full_at")
+    if not last_full:
+        return True
+    return datetime.now() - datetime.fromisoformat(last_full) > timedelta(days=FULL_RETRAIN_EVERY_DAYS)
+
+
+def signal_reload():
+    try:
+        urllib.request.urlopen("http://localhost:8000/reload-model", data=b"")
+        logger.info("✅ Reload signal envoyé")
+    except Exception as e:
+        logger.warning(f"Reload signal échoué (non bloquant): {e}")
+
+
+# ── 12. SWEEP HYPERPARAMÈTRES ────────────────────────────────────────────────
+_SWEEP_SHARED: dict = {}
+
+
+def _save_sparse(directory: str, name: str, mat) -> dict:
+    """Une matrice creuse -> fichiers .npy bruts (np.savez ne se mappe pas en mémoire)."""
+    if sp.isspmatrix_coo(mat):
+        parts = {"row": mat.row, "col": mat.col, "data": mat.data.astype(np.float32)}
     else:
-        feats = prefs_to_features_avg(row)
-    user_feature_rows.append((pid, feats))
-
-user_features = dataset.build_user_features(user_feature_rows)
-
-item_features = dataset.build_item_features(
-    [
-        (
-            row["driver_id"],
-            [
-                f"talkative:{str(row['talkative']).lower()}",
-                f"radio_on:{str(row['radio_on']).lower()}",
-                f"smoking_allowed:{str(row['smoking_allowed']).lower()}",
-                f"pets_allowed:{str(row['pets_allowed']).lower()}",
-                f"car_big:{str(row['car_big']).lower()}",
-                f"driver_gender:{str(row['driver_gender']).lower()}",
-                f"works_morning:{str(row['works_morning']).lower()}",
-                f"works_afternoon:{str(row['works_afternoon']).lower()}",
-                f"works_evening:{str(row['works_evening']).lower()}",
-                f"works_night:{str(row['works_night']).lower()}",
-                row["rating_bucket"],
-            ],
+        mat   = mat.tocsr()
+        parts = {"indptr": mat.indptr, "indices": mat.indices, "data": mat.data.astype(np.float32)}
+    for part, arr in parts.items():
+        np.save(os.path.join(directory, f"{name}.{part}.npy"), np.ascontiguousarray(arr))
+    return {"format": "coo" if "row" in parts else "csr", "shape": list(mat.shape)}
+
+
+def _load_sparse(directory: str, name: str, meta: dict):
+    # mmap 'c' (copy-on-write) : pages partagées entre workers, et buffers
+    # inscriptibles comme l'exigent les memoryviews Cython de LightFM.
+    load = lambda part: np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode="c")
+    if meta["format"] == "coo":
+        return sp.coo_matrix((load("data"), (load("row"), load("col"))), shape=meta["shape"])
+    return sp.csr_matrix((load("data"), load("indices"), load("indptr")), shape=meta["shape"])
+
+
+def _sweep_worker_init(directory: str, manifest: dict):
+    _SWEEP_SHARED.update({name: _load_sparse(directory, name, meta) for name, meta in manifest.items()})
+
+
+def _sweep_trial(params: dict, max_epochs: int) -> dict:
+    shared = _SWEEP_SHARED
+    t0     = time.perf_counter()
+    best   = fit_with_early_stopping(
+        make_model(**params), shared["train_i"], shared["train_w"], shared["val_i"],
+        shared["user_features"], shared["item_features"], max_epochs,
+        num_threads=1, verbose=False,
+    )
+    model = best["model"]
+    size  = sum(a.nbytes for a in (model.item_embeddings, model.user_embeddings, model.item_biases, model.user_biases))
+    return {
+        "params":     params,
+        "precision":  round(best["precision"], 5),
+        "auc":        round(best["auc"], 5),
+        "best_epoch": best["best_epoch"],
+        "epochs_run": best["epochs_run"],
+        "train_s":    round(time.perf_counter() - t0, 2),
+        "model_kb":   round(size / 1024, 1),
+    }
+
+
+def sweep_configs(grid: dict, trials: int = None, seed: int = 42) -> list:
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if trials and trials < len(configs):
+        rng     = np.random.default_rng(seed)
+        configs = [configs[i] for i in sorted(rng.choice(len(configs), size=trials, replace=False))]
+    return configs
+
+
+def mark_pareto(results: list):
+    """Pareto sur (precision ↑, train_s ↓, model_kb ↓) : aucune autre config n'est meilleure partout."""
+    for r in results:
+        r["pareto"] = not any(
+            o is not r
+            and o["precision"] >= r["precision"] and o["train_s"] <= r["train_s"] and o["model_kb"] <= r["model_kb"]
+            and (o["precision"], -o["train_s"], -o["model_kb"]) != (r["precision"], -r["train_s"], -r["model_kb"])
+            for o in results
         )
-        for _, row in d_df.iterrows()
-    ]
-)
 
-logger.info(f"\nMatrices construites — {interactions_matrix.nnz} interactions")
-logger.info(f"  dont {(i_df['weight_final'] == 0.0).sum()} à weight=0.0 (signal négatif strict)")
 
-# ── 9. MODÈLE ────────────────────────────────────────────────────────────────
-model = LightFM(
-    loss="warp",
-    no_components=64,
-    learning_rate=0.03,
-    item_alpha=1e-6,
-    user_alpha=1e-6,
-    random_state=42,
-)
-
-n_train = interactions_matrix.nnz
-if   n_train < 500:   epochs = 150
-elif n_train < 2000:  epochs = 200
-elif n_train < 5000:  epochs = 350
-else:                 epochs = 400
-
-logger.info(f"{n_train} interactions → {epochs} epochs\n")
-
-model.fit(
-    interactions_matrix,
-    user_features=user_features,
-    item_features=item_features,
-    sample_weight=weights_matrix,
-    epochs=epochs,
-    num_threads=4,
-    verbose=False,
-)
-
-logger.info("Entraînement terminé.")
+def run_sweep(data_dir: str, out_path: str, trials: int = None, workers: int = None) -> list:
+    prepared = prepare(data_dir)
+    matrices = validation_matrices(prepared)
+    if matrices is None:
+        raise SystemExit("Sweep impossible : validation trop petite")
+    train_i, train_w, val_i = matrices
+    max_epochs = max_epochs_for(train_i.nnz)
+    configs    = sweep_configs(SWEEP_GRID, trials)
+    workers    = workers or min(len(configs), os.cpu_count() or 1)
+    logger.info(f"\nSweep : {len(configs)} configurations, {workers} processus, max {max_epochs} epochs")
+
+    with tempfile.TemporaryDirectory(prefix="lightfm_sweep_") as shared_dir:
+        manifest = {
+            name: _save_sparse(shared_dir, name, mat)
+            for name, mat in (
+                ("train_i", train_i), ("train_w", train_w), ("val_i", val_i),
+                ("user_features", prepared["user_features"]), ("item_features", prepared["item_features"]),
+            )
+        }
+        ctx = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_sweep_worker_init, initargs=(shared_dir, manifest)) as pool:
+            futures = [pool.submit(_sweep_trial, params, max_epochs) for params in configs]
+            results = []
+            for i, future in enumerate(futures, 1):
+                results.append(future.result())
+                r = results[-1]
+                logger.info(f"  [{i}/{len(configs)}] {r['params']} → precision@{EVAL_K}={r['precision']:.4f} AUC={r['auc']:.4f} {r['train_s']}s {r['model_kb']}KB")
+
+    mark_pareto(results)
+    results.sort(key=lambda r: (-r["precision"], r["train_s"]))
+
+    logger.info(f"\n{'precision':>9} {'AUC':>7} {'epochs':>6} {'train_s':>8} {'KB':>8}  pareto  params")
+    for r in results:
+        logger.info(
+            f"{r['precision']:9.4f} {r['auc']:7.4f} {r['best_epoch']:6d} {r['train_s']:8.2f} {r['model_kb']:8.1f}"
+            f"  {'  ★   ' if r['pareto'] else '      '}  {r['params']}"
+        )
 
-# ── 10. DIAGNOSTIC POST-ENTRAÎNEMENT ─────────────────────────────────────────
-try:
-    item_biases = model.item_biases
-    item_emb    = model.item_embeddings
-    user_emb    = model.user_embeddings
-
-    logger.info(f"\nDiagnostic embeddings :")
-    logger.info(f"  item_biases std     : {item_biases.std():.4f}  (> 0.10 = collab ok)")
-    logger.info(f"  item_embeddings std : {item_emb.std():.4f}   (> 0.05 = content-based ok)")
-    logger.info(f"  user_embeddings std : {user_emb.std():.4f}   (> 0.05 = prefs bien encodées)")
-
-    if item_emb.std() < 0.02:
-        logger.warning("⚠️  item_embeddings uniformes → content-based pas appris")
+    with open(out_path, "w") as f:
+        json.dump({"metric": f"precision@{EVAL_K}", "max_epochs": max_epochs, "results": results}, f, indent=2)
+    logger.info(f"\n✅ Rapport du sweep : {out_path}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Réentraînement LightFM")
+    parser.add_argument("command", nargs="?", choices=("train", "sweep"), default="train")
+    parser.add_argument("--mode", choices=("auto", "full", "incremental"), default="auto")
+    parser.add_argument("--epochs", type=int, default=INCREMENTAL_EPOCHS, help="epochs fit_partial (mode incrémental)")
+    parser.add_argument("--data-dir",   default=DATA_DIR)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--no-early-stopping", action="store_true", help="full retrain sur le barème d'epochs fixe")
+    parser.add_argument("--no-reload", action="store_true", help="ne pas notifier le ml-service")
+    parser.add_argument("--trials",  type=int, default=None, help="sweep : tirages aléatoires dans la grille (défaut : grille complète)")
+    parser.add_argument("--workers", type=int, default=None, help="sweep : nombre de processus")
+    parser.add_argument("--out", default=None, help="sweep : chemin du rapport JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args  = parse_args(argv)
+    if args.command == "sweep":
+        out = args.out or os.path.join(args.models_dir, "sweep_report.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        run_sweep(args.data_dir, out, trials=args.trials, workers=args.workers)
+        return
+
+    state = load_state(args.models_dir)
+    mode  = args.mode
+
+    previous = load_previous(args.models_dir) if mode != "full" else None
+    if mode != "full" and previous is None:
+        logger.info("Pas de modèle / d'historique précédent → full retrain")
+        mode = "full"
+    elif mode == "auto" and full_retrain_due(state):
+        logger.info(f"Dernier full retrain > {FULL_RETRAIN_EVERY_DAYS} jours (ou inconnu) → full retrain")
+        mode = "full"
+
+    if mode == "full":
+        prepared = prepare(args.data_dir)
+        model    = train(prepared, early_stopping=not args.no_early_stopping)
+        n_trained = prepared["interactions"].nnz
     else:
-        logger.info("  ✅ Content-based appris correctement")
-
-    # Vérifie que les embeddings pour :yes et :no sont bien opposés
-    logger.info(f"\n  Diagnostic cohérence yes/no :")
-    _, _, _, user_feature_map = dataset.mapping()
-    for col in PREF_COLS[:3]:
-        yes_feat = f"{col}:yes"
-        no_feat  = f"{col}:no"
-        if yes_feat in user_feature_map and no_feat in user_feature_map:
-            yes_emb = user_emb[user_feature_map[yes_feat]]
-            no_emb  = user_emb[user_feature_map[no_feat]]
-            cosine  = np.dot(yes_emb, no_emb) / (np.linalg.norm(yes_emb) * np.linalg.norm(no_emb) + 1e-8)
-            status  = "✅ opposés" if cosine < -0.1 else ("⚠️  neutres" if cosine < 0.3 else "❌ similaires")
-            logger.info(f"  {col}: cosine(yes, no) = {cosine:.3f}  {status}")
-
-    logger.info(f"\n  Top 5 biais drivers :")
-    _, _, item_id_map, _ = dataset.mapping()
-    biases_by_driver = {k: item_biases[v] for k, v in item_id_map.items()}
-    top5 = sorted(biases_by_driver.items(), key=lambda x: x[1], reverse=True)[:5]
-    bot5 = sorted(biases_by_driver.items(), key=lambda x: x[1])[:5]
-    logger.info(f"  Positifs : {[(k, round(v,3)) for k,v in top5]}")
-    logger.info(f"  Négatifs : {[(k, round(v,3)) for k,v in bot5]}")
-
-except Exception as e:
-    logger.warning(f"Diagnostic échoué : {e}")
+        model, dataset, seen_keys = previous
+        prepared = prepare(args.data_dir, dataset=dataset)
+        rows     = select_incremental_rows(prepared, seen_keys)
+        n_new    = int((~np.isin(prepared["interaction_keys"][rows], seen_keys)).sum())
+        new_ratio = n_new / max(1, len(prepared["interaction_keys"]))
+        logger.info(f"\nInteractions nouvelles : {n_new} ({100*new_ratio:.1f}%) — rejouées : {len(rows) - n_new}")
+
+        if n_new == 0:
+            logger.info("Aucune interaction nouvelle — modèle inchangé.")
+            return
+        if args.mode == "auto" and new_ratio > INCREMENTAL_MAX_NEW_RATIO:
+            logger.info(f"Plus de {INCREMENTAL_MAX_NEW_RATIO:.0%} d'interactions nouvelles → full retrain")
+            mode      = "full"
+            prepared  = prepare(args.data_dir)
+            model     = train(prepared, early_stopping=not args.no_early_stopping)
+            n_trained = prepared["interactions"].nnz
+        else:
+            mode      = "incremental"
+            model     = train_incremental(model, prepared, rows, epochs=args.epochs)
+            n_trained = len(rows)
 
-# ── 11. SAUVEGARDE ────────────────────────────────────────────────────────────
-model.random_state = None
-os.makedirs(MODELS_DIR, exist_ok=True)
-
-joblib.dump(model,         os.path.join(MODELS_DIR, "lightfm_model_real.pkl"))
-joblib.dump(dataset,       os.path.join(MODELS_DIR, "dataset_real.pkl"))
-joblib.dump(user_features, os.path.join(MODELS_DIR, "user_features_real.pkl"))
-joblib.dump(item_features, os.path.join(MODELS_DIR, "item_features_real.pkl"))
-t_df.to_csv(os.path.join(MODELS_DIR, "trajets_processed.csv"), index=False)
-d_df.to_csv(os.path.join(MODELS_DIR, "drivers_processed.csv"), index=False)
-passenger_agg.to_csv(os.path.join(MODELS_DIR, "passenger_agg.csv"), index=False)
-
-logger.info(f"\n✅ Modèle sauvegardé dans {MODELS_DIR}")
-
-try:
-    urllib.request.urlopen("http://localhost:8000/reload-model", data=b"")
-    logger.info("✅ Reload signal envoyé")
-except Exception as e:
-    logger.warning(f"Reload signal échoué (non bloquant): {e}")
+    log_embedding_diagnostics(model, prepared["dataset"])
+    save(model, prepared, args.models_dir, mode)
+    save_state(prepared, mode, n_trained, state, args.models_dir)
+    if not args.no_reload:
+        signal_reload()
+
+
+if __name__ == "__main__":
+    main()
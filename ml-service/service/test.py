@@ -1,6 +1,11 @@
 # test_recommender.py
 import asyncio
-from recommender import get_recommendations
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from service.recommender import get_recommendations
 
 async def test():
     result = await get_recommendations(
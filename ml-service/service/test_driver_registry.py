@@ -0,0 +1,70 @@
+# test_driver_registry.py
+# Écritures du registre drivers (deltas partiels, positions live, positions en attente)
+#   python service/test_driver_registry.py     ou     python -m pytest service/test_driver_registry.py
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from service.driver_registry import DriverRegistry, RegistryDriverPool
+from service.geo_index import DriverGeoIndex
+
+
+def make_registry() -> DriverRegistry:
+    registry = DriverRegistry(DriverGeoIndex())
+    registry.upsert({"id": 1, "latitude": 36.75, "longitude": 3.05, "talkative": True})
+    registry.upsert({"id": 2, "latitude": 36.70, "longitude": 3.00, "avgRating": 4.2})
+    return registry
+
+
+def test_delta_without_coords_keeps_position():
+    registry = make_registry()
+    registry.update_location(2, 36.76, 3.06)
+    registry.upsert({"id": 2, "avgRating": 4.8, "note": 5})     # delta profil seul
+
+    assert registry.no_geo_keys() == set()
+    assert registry.geo_index.position("D2") == (36.76, 3.06)
+    record = registry.records(["D2"])[0]
+    assert (record["latitude"], record["longitude"], record["avgRating"]) == (36.76, 3.06, 4.8)
+    # Loin de tout driver : ni D2 ni aucun autre ne doit remonter
+    assert RegistryDriverPool(registry).within_radius(35.0, 0.0, 5) == []
+
+
+def test_delta_with_coords_moves_driver():
+    registry = make_registry()
+    registry.upsert({"id": 1, "latitude": None, "longitude": None})
+
+    assert registry.no_geo_keys() == {"D1"}
+    assert "D1" not in registry.geo_index
+    assert registry.records(["D1"])[0]["talkative"] is True
+
+
+def test_pending_position_applied_on_upsert():
+    registry = make_registry()
+    assert registry.update_location(3, 36.74, 3.04) is False
+    assert "D3" not in registry.geo_index                        # jamais indexée avant l'upsert
+    assert registry.has_position("D3")
+
+    registry.upsert({"id": 3, "avgRating": 4.0})
+    assert registry.geo_index.position("D3") == (36.74, 3.04)
+    assert [d["id"] for d in RegistryDriverPool(registry).within_radius(36.74, 3.04, 1)] == [3]
+
+
+def test_pending_position_removed():
+    registry = make_registry()
+    registry.update_location(3, 36.74, 3.04)
+    assert registry.remove(3) is True
+    registry.upsert({"id": 3})
+    assert registry.no_geo_keys() == {"D3"}
+
+    registry.update_location(4, 36.74, 3.04)
+    registry.sync([{"id": 1, "latitude": 36.75, "longitude": 3.05}], replace=True)
+    assert not registry.has_position("D4")
+
+
+if __name__ == "__main__":
+    test_delta_without_coords_keeps_position()
+    test_delta_with_coords_moves_driver()
+    test_pending_position_applied_on_upsert()
+    test_pending_position_removed()
+    print("✅ registre drivers : deltas partiels, positions en attente")
@@ -0,0 +1,77 @@
+# test_ranking_parity.py
+# Parité rank_candidates_vectorized / rank_candidates_loop (VECTORIZED_SCORING=1 / 0)
+#   python service/test_ranking_parity.py     ou     python -m pytest service/test_ranking_parity.py
+import copy
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("RECO_LAZY_INIT", "1")      # pas besoin du modèle ici
+
+from service.recommender import Recommender, rank_candidates_loop, rank_candidates_vectorized
+
+PREF_VALUES = (None, "yes", "no", "oui", "non", "peut-être")
+COORDS = (
+    (36.75, 3.05), (36.9, 2.9), (35.7, -0.6),       # positions normales
+    (None, None), (0, 3.05), ("36.7", "3.0"),      # absentes, nulle, chaînes
+    (float("nan"), 3.05), (36.75, float("nan")),   # non finies
+    (float("inf"), 3.05),
+)
+
+
+def make_drivers(rng: random.Random, n: int):
+    drivers = []
+    for i in range(n):
+        lat, lng = rng.choice(COORDS)
+        drivers.append({
+            "id":              i + 1,
+            "sexe":            rng.choice(["F", "M", None]),
+            "avgRating":       rng.choice([None, 0, 3.2, 4.8]),
+            "latitude":        lat,
+            "longitude":       lng,
+            "talkative":       rng.choice([True, False, None, "yes"]),
+            "radio_on":        rng.choice([True, False]),
+            "smoking_allowed": rng.choice([True, False]),
+            "pets_allowed":    rng.choice([True, False, "no"]),
+            "car_big":         rng.choice([True, False]),
+            "works_morning":   rng.choice([True, False]),
+            "works_afternoon": rng.choice([True, False]),
+            "works_evening":   rng.choice([True, False]),
+            "works_night":     rng.choice([True, False]),
+        })
+    return drivers
+
+
+def check_parity(seed: int):
+    rng         = random.Random(seed)
+    drivers     = make_drivers(rng, 60)
+    preferences = {col: rng.choice(PREF_VALUES) for col in Recommender.PREF_COLS}
+    lfm_scores  = {f"D{d['id']}": rng.random() for d in drivers if rng.random() < 0.8}
+    counts      = {str(d["id"]): rng.choice([0, 3, 5]) for d in drivers}
+    weights     = (0.35, 0.45, 0.15, 0.05)
+    args        = (
+        rng.random() < 0.8, 36.7538, 3.0588, rng.randrange(24), rng.choice([0.5, 10.0, 100.0, 500.0]),
+    )
+
+    loop       = rank_candidates_loop(copy.deepcopy(drivers), preferences, lfm_scores, counts, weights, *args)
+    vectorized = rank_candidates_vectorized(copy.deepcopy(drivers), preferences, lfm_scores, counts, weights, *args)
+
+    assert len(loop) == len(vectorized)
+    for a, b in zip(loop, vectorized):
+        assert set(a) == set(b), (a, b)
+        for key in a:
+            if key in ("latitude", "longitude"):
+                continue                          # entrées recopiées telles quelles (NaN != NaN)
+            assert a[key] == b[key], (seed, a["id"], key, a[key], b[key])
+
+
+def test_ranking_parity():
+    for seed in range(200):
+        check_parity(seed)
+
+
+if __name__ == "__main__":
+    test_ranking_parity()
+    print("✅ rank_candidates_vectorized == rank_candidates_loop (200 tirages)")
@@ -0,0 +1,46 @@
+"""
+topk.py — SÉLECTION TOP-K (partition + petit tri)
+
+Avant : retrieval (np.argsort complet), pref pooling (sorted de tous les
+candidats), ranking (deux tris complets de scored_drivers : dump + résultat)
+et cold-start triaient n éléments pour n'en garder que k : O(n log n).
+
+Maintenant top_k_indices trouve le k-ième score par partition (O(n)), garde
+les éléments au-dessus, puis ne trie que ces k : O(n + k log k).
+
+Ordre identique à sorted(..., reverse=True) (tri stable) : score décroissant,
+ex aequo dans l'ordre d'origine — y compris pour départager les ex aequo au
+seuil (les premiers arrivés sont retenus).
+"""
+
+import numpy as np
+from typing import Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# En dessous, sorted() sur la liste reste plus rapide que fromiter + partition
+SMALL_N = 512
+
+
+def top_k_indices(scores, k: int) -> np.ndarray:
+    """Indices des k meilleurs scores, du meilleur au moins bon (ordre stable)."""
+    scores = np.asarray(scores)
+    n      = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+
+    kth      = np.partition(scores, n - k)[n - k]
+    above    = np.flatnonzero(scores > kth)
+    tied     = np.flatnonzero(scores == kth)[: k - len(above)]
+    selected = np.concatenate((above, tied))
+    return selected[np.argsort(-scores[selected], kind="stable")]
+
+
+def top_k_items(items: Sequence[T], k: int, key: Callable[[T], float]) -> List[T]:
+    """Équivalent de sorted(items, key=key, reverse=True)[:k]."""
+    if len(items) <= SMALL_N:
+        return sorted(items, key=key, reverse=True)[:max(k, 0)]
+    scores = np.fromiter((key(item) for item in items), dtype=np.float64, count=len(items))
+    return [items[i] for i in top_k_indices(scores, k)]
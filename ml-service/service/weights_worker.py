@@ -0,0 +1,170 @@
+"""
+weights_worker.py — RÉ-OPTIMISATION DES POIDS EN TÂCHE DE FOND
+
+Avant : /feedback lançait SLSQP puis réécrivait optimized_weights.json à
+chaque feedback (passé 50 échantillons), verrou feedback tenu : la latence
+de /feedback dépendait du coût de l'optimiseur.
+
+Maintenant /feedback se contente de notify() ; un thread unique décide quand
+optimiser :
+  - au moins WEIGHTS_OPTIMIZE_EVERY nouveaux feedbacks, puis
+    WEIGHTS_OPTIMIZE_DEBOUNCE_S sans nouveau feedback (une rafale = un seul run) ;
+  - ou WEIGHTS_OPTIMIZE_INTERVAL_S écoulées depuis le premier feedback en
+    attente (les petits volumes finissent par être pris en compte).
+
+Le résultat est transmis à publish_fn (swap de référence côté recommender),
+hors du verrou de notify() : /feedback n'attend jamais l'écriture disque.
+invalidate() (reset des poids) fait ignorer un run déjà en cours.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from service.request_log import get_logger
+
+logger = get_logger(__name__)
+
+OPTIMIZE_EVERY      = int(os.getenv("WEIGHTS_OPTIMIZE_EVERY", 10))
+OPTIMIZE_DEBOUNCE_S = float(os.getenv("WEIGHTS_OPTIMIZE_DEBOUNCE_S", 2.0))
+OPTIMIZE_INTERVAL_S = float(os.getenv("WEIGHTS_OPTIMIZE_INTERVAL_S", 60.0))
+
+
+class WeightOptimizerWorker:
+
+    def __init__(
+        self,
+        optimize_fn: Callable[[], Optional[np.ndarray]],
+        publish_fn: Callable[[np.ndarray], None],
+        min_new: int = OPTIMIZE_EVERY,
+        debounce_s: float = OPTIMIZE_DEBOUNCE_S,
+        max_delay_s: float = OPTIMIZE_INTERVAL_S,
+    ):
+        self.optimize_fn = optimize_fn
+        self.publish_fn  = publish_fn
+        self.min_new     = max(1, int(min_new))
+        self.debounce_s  = debounce_s
+        self.max_delay_s = max_delay_s
+
+        self._cond       = threading.Condition()
+        # Vérification de génération + publish_fn, ordonnés avec invalidate()
+        # (ordre des verrous : _publish_lock puis _cond ; notify ne prend que _cond)
+        self._publish_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping   = False
+        self._pending    = 0
+        self._first_at   = 0.0     # premier feedback en attente (monotonic)
+        self._last_at    = 0.0     # dernier feedback reçu (monotonic)
+        self._generation = 0
+
+        self.runs           = 0
+        self.published      = 0
+        self.last_run_at: Optional[float]  = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str]     = None
+
+    # ── CÔTÉ /feedback (non bloquant) ─────────────────────────────────────────
+    def notify(self, count: int = 1):
+        with self._cond:
+            now = time.monotonic()
+            if self._pending == 0:
+                self._first_at = now
+            self._pending += count
+            self._last_at  = now
+            self._ensure_started()
+            self._cond.notify()
+
+    def invalidate(self):
+        """
+        Oublie les feedbacks en attente et le run éventuellement en cours.
+        Attend la fin d'une publication déjà commencée : aucun poids périmé
+        ne peut être publié après le retour.
+        """
+        with self._publish_lock, self._cond:
+            self._pending     = 0
+            self._generation += 1
+
+    def run_now(self) -> Optional[np.ndarray]:
+        """Optimisation synchrone (scripts / tests manuels), publiée comme un run normal."""
+        with self._cond:
+            self._pending = 0
+            generation = self._generation
+        return self._run(generation)
+
+    # ── THREAD ────────────────────────────────────────────────────────────────
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread   = threading.Thread(target=self._loop, name="weights-optimizer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _wait_until_due(self) -> bool:
+        """Bloque (verrou tenu par l'appelant) jusqu'au prochain run. False si arrêt."""
+        while True:
+            if self._stopping:
+                return False
+            if self._pending == 0:
+                self._cond.wait()
+                continue
+            now    = time.monotonic()
+            by_age = self._first_at + self.max_delay_s
+            if self._pending >= self.min_new:
+                due = min(by_age, self._last_at + self.debounce_s)
+            else:
+                due = by_age
+            if now >= due:
+                return True
+            self._cond.wait(due - now)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._wait_until_due():
+                    return
+                self._pending = 0
+                generation    = self._generation
+            self._run(generation)
+
+    def _run(self, generation: int) -> Optional[np.ndarray]:
+        t0 = time.perf_counter()
+        try:
+            weights = self.optimize_fn()
+            self.last_error = None
+        except Exception as e:
+            weights = None
+            self.last_error = str(e)
+            logger.warning("Optimisation des poids: %s", e)
+        self.runs            += 1
+        self.last_run_at      = time.time()
+        self.last_duration_ms = (time.perf_counter() - t0) * 1000
+        if weights is None:
+            return None
+        with self._publish_lock:
+            with self._cond:
+                if generation != self._generation:
+                    return None           # reset pendant le run : résultat périmé
+            self.publish_fn(weights)      # écriture disque (fsync) : _cond libéré
+            self.published += 1
+        return weights
+
+    def status(self) -> Dict:
+        with self._cond:
+            pending = self._pending
+        return {
+            "pending":          pending,
+            "runs":             self.runs,
+            "published":        self.published,
+            "last_run_at":      self.last_run_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error":       self.last_error,
+        }